@@ -21,12 +21,18 @@
 # appropriately sorted, in that a diff only occurs when the shared libraries
 # in the package themselves actually change too.
 
+import concurrent.futures
+import functools
+import hashlib
+import json
 import os
 import re
 import shutil
 import subprocess
 import sys
 
+import elf
+import rpmpayload
 import util
 
 valid_dirs = ["/usr/lib", "/usr/lib64"]
@@ -42,6 +48,11 @@ shared_lib = re.compile(r".*Shared library: \[(.*)\].*")
 
 wanted_symbol_types = ["A", "T"]
 
+# What was found in each ELF object of a package, by digest, so that the
+# objects a rebuild leaves unchanged are not parsed again
+ABI_CACHE_DIR = os.path.expanduser("~/.cache/autospec/abi")
+ABI_CACHE_VERSION = 1
+
 ignored_symbols = [
     "__bss_start",
     "_edata",
@@ -60,8 +71,25 @@ def get_output(cmd):
         print("Error: %s" % e)
 
 
+def read_elf(path, method):
+    """Call method on the ElfFile for path.
+
+    Return the result, or raise ElfError if path cannot be read natively, in
+    which case callers ask the binutils tools instead.
+    """
+    try:
+        with elf.ElfFile(path) as obj:
+            return method(obj)
+    except OSError as e:
+        raise elf.ElfError(str(e))
+
+
 def get_soname(path):
-    """Use objdump to find the SONAME of a file."""
+    """Find the SONAME of a file."""
+    try:
+        return read_elf(path, elf.ElfFile.soname)
+    except elf.ElfError:
+        pass
     cmd = 'objdump -p "{}"|grep SONAME'.format(path)
     try:
         line = get_output(cmd)
@@ -76,6 +104,10 @@ def get_soname(path):
 
 def get_shared_dependencies(path):
     """Return the shared dependencies for a given path."""
+    try:
+        return set(read_elf(path, elf.ElfFile.needed))
+    except elf.ElfError:
+        pass
     ret = set()
     cmd = "readelf -d {}".format(path)
 
@@ -89,30 +121,57 @@ def get_shared_dependencies(path):
     return ret
 
 
+def map_files(func, paths):
+    """Return func(path) for each of paths, in order, computed in a process pool.
+
+    The files are independent of each other, so they are spread across one
+    worker per core.
+    """
+    paths = list(paths)
+    if len(paths) < 2:
+        return [func(path) for path in paths]
+    workers = min(len(paths), os.cpu_count() or 1)
+    # hand out files in batches; a single file is very little work
+    chunksize = max(1, len(paths) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, paths, chunksize=chunksize))
+
+
+def inspect_binary(fpath):
+    """Return (soname, dependencies) of a file.
+
+    soname is None unless the file is a shared object with one, and
+    dependencies is None unless the file is a dynamic binary.
+    """
+    # is_dynamic_binary and is_file_valid, reading the file magic once
+    if not os.path.isfile(fpath):
+        return None, None
+    mg = get_file_magic(fpath)
+    if not mg or not valid_dyn.match(mg):
+        return None, None
+    soname = None
+    # Encountered a valid dynamic linked object
+    if reg.match(mg) and not os.path.islink(fpath):
+        soname = get_soname(fpath)
+    return soname, get_shared_dependencies(fpath)
+
+
 def get_all_dependencies(path):
     """Determine all dependencies in the given path."""
     deps = set()
-
     sonames = set()
-    examine = set()
 
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            fpath = os.path.join(root, file)
-            if not is_dynamic_binary(fpath):
-                continue
-            # Encountered a valid dynamic linked object
-            if is_file_valid(fpath):
-                # We must account for *all* internal symbols due to rpaths and
-                # overriding of LD_LIBRARY_PATH
-                soname = get_soname(fpath)
-                if soname is not None:
-                    sonames.add(soname)
-            if is_dynamic_binary(fpath):
-                examine.add(fpath)
-
-    for path in examine:
-        current_deps = get_shared_dependencies(path)
+    paths = [os.path.join(root, file) for root, dirs, files in os.walk(path) for file in files]
+    results = map_files(inspect_binary, paths)
+    for soname, _ in results:
+        # We must account for *all* internal symbols due to rpaths and
+        # overriding of LD_LIBRARY_PATH
+        if soname is not None:
+            sonames.add(soname)
+
+    for _, current_deps in results:
+        if current_deps is None:
+            continue
         # Ensure we don't add a dependency on an internally provided symbol
         deps.update(set(filter(lambda s: s not in sonames, current_deps)))
 
@@ -120,7 +179,19 @@ def get_all_dependencies(path):
 
 
 def get_file_magic(path):
-    """Return the 'magic' for a given path."""
+    """Return the 'magic' for a given path.
+
+    ELF objects are described natively, in the words of file(1); anything
+    else gets an empty string, as file would not call it ELF either.
+    """
+    if os.path.islink(path):
+        return ""
+    try:
+        return "{}: {}".format(path, elf.describe_file(path))
+    except elf.NotElfError:
+        return ""
+    except (OSError, elf.ElfError):
+        pass
     cmd = 'file "{}"'.format(path)
     try:
         line = get_output(cmd).split("\n")[0]
@@ -153,8 +224,26 @@ def is_file_valid(path):
     return False
 
 
+def wanted_symbols(symbols):
+    """Return the names of the (name, type) symbols the ABI report lists."""
+    ret = set()
+    for sym_id, sym_type in symbols:
+        if sym_type not in wanted_symbol_types:
+            continue
+        # nm output that does not split into three fields is skipped
+        if len(sym_id.split()) != 1 or sym_id in ignored_symbols:
+            continue
+        ret.add(sym_id)
+    return ret
+
+
 def dump_symbols(path):
     """Get symbols from a file."""
+    try:
+        return wanted_symbols(read_elf(path, elf.ElfFile.dynamic_symbols))
+    except elf.ElfError:
+        pass
+
     cmd = 'nm --defined-only -g --dynamic "{}"'.format(path)
     lines = None
 
@@ -182,6 +271,11 @@ def dump_symbols(path):
     return ret
 
 
+def inspect_library(path):
+    """Return the (soname, symbols) of a shared library."""
+    return get_soname(path), dump_symbols(path)
+
+
 def purge_tree(tree):
     """Run rm -fr."""
     if not os.path.exists(tree):
@@ -237,21 +331,113 @@ def examine_abi_host(download_path, results_dir, name):
         util.print_fatal("Error invoking abireport: {}".format(e))
 
 
-def examine_abi_fallback(download_path, results_dir, name):
-    """Missing abireport so fallback to internal scanning."""
-    old_dir = os.getcwd()
-
-    rpms = set()
-    for item in os.listdir(results_dir):
-        namelen = len(name)
-        if item.find("-extras-", namelen) >= namelen:
+def load_abi_cache(name):
+    """Return the ABI cache of package name, by object digest."""
+    try:
+        with open(os.path.join(ABI_CACHE_DIR, "{}.json".format(name))) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != ABI_CACHE_VERSION:
+        return {}
+    return cache.get("objects", {})
+
+
+def save_abi_cache(name, objects):
+    """Write objects as the ABI cache of package name."""
+    path = os.path.join(ABI_CACHE_DIR, "{}.json".format(name))
+    try:
+        os.makedirs(ABI_CACHE_DIR, exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump({"version": ABI_CACHE_VERSION, "objects": objects}, f)
+        os.replace(tmp, path)
+    except OSError:
+        # the cache only saves work, the next run is still correct without it
+        pass
+
+
+def scan_elf(name, data, symbols):
+    """Return the ABI cache entry for the ELF object data, installed at name.
+
+    The entry holds what file(1) says about the object and, for dynamic
+    binaries, the NEEDED list. Shared objects also get their soname and,
+    with symbols, the symbols the report lists for them.
+    """
+    entry = {"magic": "", "soname": None, "needed": [], "symbols": None}
+    try:
+        obj = elf.ElfFile(name, data)
+    except elf.NotElfError:
+        return entry
+    entry["magic"] = obj.describe()
+    magic = "{}: {}".format(name, entry["magic"])
+    if not valid_dyn.match(magic):
+        return entry
+    entry["needed"] = obj.needed()
+    if reg.match(magic):
+        entry["soname"] = obj.soname()
+        if symbols:
+            entry["symbols"] = sorted(wanted_symbols(obj.dynamic_symbols()))
+    return entry
+
+
+def read_rpm(path, known=None):
+    """Inspect the ELF objects in an RPM without extracting it.
+
+    known is an ABI cache; objects found in it are not parsed again. Return
+    a dict from the path each dynamic binary is installed at to its
+    (soname, dependencies, symbols), and the ABI cache entries of all ELF
+    objects in the RPM. soname is as for inspect_binary, and symbols is None
+    unless the file is a shared library in valid_dirs.
+    """
+    known = known or {}
+    found = {}
+    scanned = {}
+    for name, data in rpmpayload.read_files(path, elf.ELFMAG):
+        digest = hashlib.sha1(data).hexdigest()
+        want_symbols = os.path.dirname(name) in valid_dirs
+        entry = scanned.get(digest) or known.get(digest)
+        magic = "{}: {}".format(name, entry["magic"]) if entry else ""
+        if entry is None or (want_symbols and reg.match(magic) and entry["symbols"] is None):
+            entry = scan_elf(name, data, want_symbols)
+            magic = "{}: {}".format(name, entry["magic"])
+        scanned[digest] = entry
+        if not valid_dyn.match(magic):
             continue
-        if item.endswith(".rpm") and not item.endswith(".src.rpm"):
-            rpms.add(os.path.basename(item))
+        symbols = None
+        if want_symbols and entry["symbols"] is not None:
+            symbols = set(entry["symbols"])
+        found[name] = (entry["soname"], set(entry["needed"]), symbols)
+    return found, scanned
+
+
+def scan_rpms(rpms, known=None):
+    """Collect the libraries and dependencies for the ABI report from rpms.
+
+    Return a list of (library, soname, symbols), sorted by library, the set
+    of libraries the rpms need but do not provide, and the ABI cache
+    entries of the objects in the rpms. Objects in the known ABI cache are
+    not parsed again.
+    """
+    objects = {}
+    cache = {}
+    for found, scanned in map_files(functools.partial(read_rpm, known=known), rpms):
+        cache.update(scanned)
+        for path, info in found.items():
+            # as with cpio -i, the first copy of a file extracted stays
+            objects.setdefault(path, info)
+
+    sonames = set(soname for soname, _, _ in objects.values() if soname is not None)
+    deps = set()
+    for _, needed, _ in objects.values():
+        deps.update(needed - sonames)
+    libraries = [(path, soname, symbols) for path, (soname, _, symbols) in sorted(objects.items()) if symbols is not None]
+    return libraries, deps, cache
 
-    if len(rpms) == 0:
-        util.print_fatal("No usable rpms found, aborting")
-        sys.exit(1)
+
+def extract_rpms(download_path, rpms):
+    """Collect the libraries and dependencies like scan_rpms, extracting the rpms with rpm2cpio."""
+    old_dir = os.getcwd()
 
     extract_dir = os.path.abspath(os.path.join(download_path, "__extraction"))
     purge_tree(extract_dir)
@@ -267,7 +453,7 @@ def examine_abi_fallback(download_path, results_dir, name):
     # Extract all those rpms to our current directory
     try:
         for rpm in rpms:
-            cmd = 'rpm2cpio "{}" | cpio -imd 2>/dev/null'.format(os.path.join(results_dir, rpm))
+            cmd = 'rpm2cpio "{}" | cpio -imd 2>/dev/null'.format(rpm)
             subprocess.check_call(cmd, shell=True)
     except Exception as e:
         util.print_fatal("Error extracting RPMS: {}".format(e))
@@ -292,16 +478,47 @@ def examine_abi_fallback(download_path, results_dir, name):
                 continue
             collected_files.add(clean_path)
 
+    # Now examine these libraries
+    libraries = sorted(collected_files)
+    libraries = [(library, soname, symbols)
+                 for library, (soname, symbols) in zip(libraries, map_files(inspect_library, libraries))]
+    lib_deps = get_all_dependencies(extract_dir)
+
+    os.chdir(old_dir)
+    purge_tree(extract_dir)
+    return libraries, lib_deps
+
+
+def examine_abi_fallback(download_path, results_dir, name):
+    """Missing abireport so fallback to internal scanning."""
+    rpms = set()
+    for item in os.listdir(results_dir):
+        namelen = len(name)
+        if item.find("-extras-", namelen) >= namelen:
+            continue
+        if item.endswith(".rpm") and not item.endswith(".src.rpm"):
+            rpms.add(os.path.join(results_dir, os.path.basename(item)))
+
+    if len(rpms) == 0:
+        util.print_fatal("No usable rpms found, aborting")
+        sys.exit(1)
+
+    rpms = sorted(rpms)
+    try:
+        libraries, lib_deps, cache = scan_rpms(rpms, load_abi_cache(name))
+    except (rpmpayload.RpmError, elf.ElfError, OSError) as e:
+        util.print_warning("Cannot read the RPMS directly, extracting them instead: {}".format(e))
+        libraries, lib_deps = extract_rpms(download_path, rpms)
+    else:
+        save_abi_cache(name, cache)
+
     abi_report = dict()
 
-    # Now examine these libraries
-    for library in sorted(collected_files):
-        soname = get_soname(library)
+    for library, soname, symbols in libraries:
         if not soname:
             warn = "Failed to determine soname of: {}".format(library)
             util.print_warning(warn)
             soname = os.path.basename(library)
-        symbols = dump_symbols(library)
         if symbols and len(symbols) > 0:
             if soname not in abi_report:
                 abi_report[soname] = set()
@@ -321,7 +538,6 @@ def examine_abi_fallback(download_path, results_dir, name):
         truncate_file(report_file)
 
     # Write the library report
-    lib_deps = get_all_dependencies(extract_dir)
     report_file = os.path.join(download_path, "used_libs")
     if len(lib_deps) > 0:
         report = util.open_auto(report_file, "w")
@@ -330,6 +546,3 @@ def examine_abi_fallback(download_path, results_dir, name):
         report.close()
     else:
         truncate_file(report_file)
-
-    os.chdir(old_dir)
-    purge_tree(extract_dir)
@@ -29,14 +29,16 @@ import buildreq
 import check
 import commitmessage
 import config
+import download
 import files
 import git
 import license
-from logcheck import logcheck
+from logcheck import LogChecker, logcheck
 import pkg_integrity
 import pkg_scan
 import specdescription
 import specfiles
+import srctree
 import tarball
 import util
 import shutil
@@ -316,6 +318,59 @@ def main():
     parser.add_argument(
         "-dfr", "--do_file_restart", action="store_false", dest="do_file_restart", default=True, help="Disable file_restart mechanism",
     )
+    parser.add_argument(
+        "-er", "--early_restart", action="store_true", dest="early_restart", default=False, help="Stop mock as soon as build.log shows a missing build requirement",
+    )
+    parser.add_argument(
+        "-ec",
+        "--extract_cache",
+        action="store",
+        dest="extract_cache",
+        default=None,
+        nargs="?",
+        const=os.path.expanduser("~/.cache/autospec/extract"),
+        help="Reuse source trees extracted by earlier runs, kept in the given"
+        " directory (default ~/.cache/autospec/extract) by archive sha1",
+    )
+    parser.add_argument(
+        "-dj",
+        "--download_jobs",
+        action="store",
+        dest="download_jobs",
+        type=int,
+        default=download.MAX_PARALLEL_DOWNLOADS,
+        help="Number of archives to download at the same time",
+    )
+    parser.add_argument(
+        "-dr",
+        "--download_retries",
+        action="store",
+        dest="download_retries",
+        type=int,
+        default=download.RETRIES,
+        help="Number of times a failed archive download is retried, resuming"
+        " from what was already downloaded",
+    )
+    parser.add_argument(
+        "-dc",
+        "--download_cache",
+        action="store",
+        dest="download_cache",
+        default=None,
+        nargs="?",
+        const=os.path.expanduser("~/.cache/autospec/downloads"),
+        help="Share downloaded sources between packages through the given"
+        " directory (default ~/.cache/autospec/downloads), keyed by url and sha1",
+    )
+    parser.add_argument(
+        "-dcs",
+        "--download_cache_size",
+        action="store",
+        dest="download_cache_size",
+        type=int,
+        default=download.CACHE_SIZE >> 20,
+        help="Size in MiB the download cache is trimmed to, least recently used first",
+    )
     parser.add_argument(
         "-dbg", "--debug", action="store_true", dest="debug", default=False, help="Enable debugging",
     )
@@ -328,6 +383,7 @@ def main():
     archives = args.archives or a_archives
     archives_from_git = args.archives_from_git or a_archives_from_git
     util.debugging = args.debug
+    util.keep_digest_memo()
     args.integrity = False
     if os.path.exists(f"{name}.license") == False:
         write_out(f"{name}.license", "GPL-2.0\n")
@@ -510,6 +566,9 @@ def package(
     """Entry point for building a package with autospec."""
     conf = config.Config(args.target)
     conf.parse_config_files_early()
+    download_cache = None
+    if args.download_cache:
+        download_cache = download.DownloadCache(args.download_cache, args.download_cache_size << 20)
 
     if util.debugging:
         print_debug(f"url 1: {url}")
@@ -540,7 +599,9 @@ def package(
                         print_debug(f"found old package_path 21: {download_file_full_path}")
                     break
             if not found_file or redownload_from_git is True:
-                download_file_full_path = git.git_archive_all(path=package_path, name=name, url=url, branch=branch, force_module=force_module, force_fullclone=force_fullclone, conf=conf)
+                download_file_full_path = git.git_archive_all(path=package_path, name=name, url=url, branch=branch,
+                                                              force_module=force_module, force_fullclone=force_fullclone,
+                                                              conf=conf, download_cache=download_cache)
             url = download_file_full_path
             if util.debugging:
                 print_debug(f"download_file_full_path 11: {download_file_full_path}")
@@ -559,7 +620,9 @@ def package(
                         print_debug(f"found old package_path 22: {download_file_full_path}")
                     break
             if not found_file or redownload_from_git is True:
-                download_file_full_path = git.git_archive_all(path=package_path, name=name, url=url, branch=branch, force_module=force_module, force_fullclone=force_fullclone, conf=conf)
+                download_file_full_path = git.git_archive_all(path=package_path, name=name, url=url, branch=branch,
+                                                              force_module=force_module, force_fullclone=force_fullclone,
+                                                              conf=conf, download_cache=download_cache)
             url = download_file_full_path
             if util.debugging:
                 print_debug(f"download_file_full_path 12: {download_file_full_path}")
@@ -628,7 +691,11 @@ def package(
                         print_debug(f"Index: {index}")
                         print_debug(f"Destination: {arch_destination[index]} - Branch: {arch_branch[index]}")
                         print_debug(f"Fazer download archive 1: {arch_name} - {new_arch_url}")
-                    download_file_full_path = git.git_archive_all(path=package_path, name=arch_name, url=new_arch_url, branch=arch_branch[index], force_module=str_to_bool(arch_submodule[index]), force_fullclone=str_to_bool(arch_forcefullclone[index]), conf=conf)
+                    download_file_full_path = git.git_archive_all(path=package_path, name=arch_name, url=new_arch_url,
+                                                                  branch=arch_branch[index],
+                                                                  force_module=str_to_bool(arch_submodule[index]),
+                                                                  force_fullclone=str_to_bool(arch_forcefullclone[index]),
+                                                                  conf=conf, download_cache=download_cache)
                 if util.debugging:
                     print_debug(f"archive download_file_full_path 1: {download_file_full_path}")
                 if download_file_full_path in archives or arch_destination[index] in archives:
@@ -661,7 +728,11 @@ def package(
                         print_debug(f"Index: {index}")
                         print_debug(f"Destination: {arch_destination[index]} - Branch: {arch_branch[index]}")
                         print_debug(f"Fazer download archive 2: {arch_name} - {new_arch_url}")
-                    download_file_full_path = git.git_archive_all(path=package_path, name=arch_name, url=new_arch_url, branch=arch_branch[index], force_module=str_to_bool(arch_submodule[index]), force_fullclone=str_to_bool(arch_forcefullclone[index]), conf=conf)
+                    download_file_full_path = git.git_archive_all(path=package_path, name=arch_name, url=new_arch_url,
+                                                                  branch=arch_branch[index],
+                                                                  force_module=str_to_bool(arch_submodule[index]),
+                                                                  force_fullclone=str_to_bool(arch_forcefullclone[index]),
+                                                                  conf=conf, download_cache=download_cache)
                 if util.debugging:
                     print_debug(f"archive download_file_full_path 2: {download_file_full_path}")
                 if download_file_full_path in archives or arch_destination[index] in archives:
@@ -681,6 +752,11 @@ def package(
     check_requirements(args.git)
     conf.detect_build_from_url(url)
     package = build.Build()
+    package.early_restart = args.early_restart
+    # logcheck results are collected while the final build.log is parsed
+    package.add_log_consumer("logcheck", LogChecker)
+    # enable together with check.check_regression below
+    # package.add_log_consumer("testcount", count.ResultCounter)
 
     #
     # First, download the tarball, extract it and then do a set
@@ -690,6 +766,10 @@ def package(
     if util.debugging:
         print_debug(f"url 4: {url}")
     content = tarball.Content(url, name, args.version, archives, conf, workingdir, giturl, download_from_git, branch, new_archives_from_git, force_module, force_fullclone)
+    content.extract_cache = args.extract_cache
+    content.download_jobs = args.download_jobs
+    content.download_retries = args.download_retries
+    content.download_cache = download_cache
     content.process(filemanager)
     conf.create_versions(content.multi_version)
     conf.content = content  # hack to avoid recursive dependency on init
@@ -720,14 +800,17 @@ def package(
         license.scan_for_licenses(os.path.dirname(_dir), conf, name)
         exit(0)
 
+    # The license scan covers all of the parent, so index that once for
+    # every scanner
+    tree = srctree.SourceTreeIndex(os.path.dirname(_dir))
     if short_circuit == "prep" or short_circuit is None:
-        requirements.scan_for_configure(_dir, content.name, conf)
-    specdescription.scan_for_description(content.name, _dir, conf.license_translations, conf.license_blacklist)
+        requirements.scan_for_configure(_dir, content.name, conf, tree)
+    specdescription.scan_for_description(content.name, _dir, conf.license_translations, conf.license_blacklist, tree)
     # Start one directory higher so we scan *all* versions for licenses
-    license.scan_for_licenses(os.path.dirname(_dir), conf, content.name)
-    commitmessage.scan_for_changes(conf.download_path, _dir, conf.transforms)
+    license.scan_for_licenses(os.path.dirname(_dir), conf, content.name, tree)
+    commitmessage.scan_for_changes(conf.download_path, _dir, conf.transforms, tree)
     conf.add_sources(archives, content)
-    check.scan_for_tests(_dir, conf, requirements, content)
+    check.scan_for_tests(_dir, conf, requirements, content, tree)
 
     #
     # Now, we have enough to write out a specfile, and try to build it.
@@ -795,7 +878,7 @@ def package(
         save_mock_logs(conf.download_path, package.round)
 
     #if short_circuit is None or short_circuit == "install":
-        #check.check_regression(conf.download_path, conf.config_opts["skip_tests"])
+        #check.check_regression(conf.download_path, conf.config_opts["skip_tests"], package.log_consumers.get("testcount"))
 
     #conf.create_buildreq_cache(content.version, requirements.buildreqs_cache)
     #conf.create_reqs_cache(content.version, requirements.reqs_cache)
@@ -824,7 +907,7 @@ def package(
             write_out(conf.download_path + "/release", content.release + "\n")
 
             # record logcheck output
-            logcheck(conf.download_path)
+            logcheck(conf.download_path, package.log_consumers.get("logcheck"))
 
             if args.git:
                 print("\nTrying to guess the commit message\n")
@@ -836,7 +919,7 @@ def package(
 
         elif (short_circuit == "build"):
             # record logcheck output
-            logcheck(conf.download_path)
+            logcheck(conf.download_path, package.log_consumers.get("logcheck"))
 
         #elif (short_circuit == "install"):
             ## record logcheck output
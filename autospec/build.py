@@ -21,9 +21,12 @@
 
 import os
 import re
+import shlex
 import shutil
 import sys
 import subprocess
+import time
+import buildlog
 import util
 from util import call, write_out, print_fatal, print_debug, print_info, scantree
 
@@ -81,6 +84,97 @@ def get_mock_cmd():
     return 'sudo PYTHONMALLOC=malloc MIMALLOC_PAGE_RESET=0 MIMALLOC_LARGE_OS_PAGES=1 LD_PRELOAD=/usr/lib64/libmimalloc.so /usr/bin/mock'
 
 
+class BuildLogParser(object):
+    """Learn from build.log lines fed one at a time, see Build.parse_build_results."""
+
+    def __init__(self, build, returncode, filemanager, config, requirements, content):
+        """Set up parsing of one build.log for build."""
+        self.build = build
+        self.returncode = returncode
+        self.filemanager = filemanager
+        self.config = config
+        self.requirements = requirements
+        self.content = content
+        self.matcher = config.get_pattern_matcher()
+        self.infiles = 0
+        self.unpackaged = []
+
+    def feed(self, line):
+        """Handle a single build.log line."""
+        if (self.build.short_circuit != "prep" and self.build.short_circuit != "binary"):
+            self.build.match_patterns(line, self.matcher, self.config, self.requirements)
+
+        # check_for_warning_pattern(line)
+
+        # Search for files to add to the %files section.
+        # * infiles == 0 before we reach the files listing
+        # * infiles == 1 for the "Installed (but unpackaged) file(s) found" header
+        #     and for the entirety of the files listing
+        # * infiles == 2 after the files listing has ended
+        if self.infiles == 1:
+            for search in ["RPM build errors", "Childreturncodewas",
+                           "Child returncode", "Empty %files file"]:
+                if search in line:
+                    self.infiles = 2
+            for start in ["Building", "Child return code was"]:
+                if line.startswith(start):
+                    self.infiles = 2
+            if self.infiles == 2:
+                self.push_unpackaged()
+
+        if self.infiles == 0 and "Installed (but unpackaged) file(s) found:" in line:
+            self.infiles = 1
+            self.filemanager.fix_broken_pkg_config_versioning(self.content.name)
+            if self.config.config_opts["altcargo1"]:
+                self.filemanager.write_cargo_find_install_assets(self.content.name)
+        # elif self.infiles == 1 and "not matching the package arch" not in line:
+        elif self.infiles == 1:
+            # exclude blank lines from consideration...
+            file = line.strip()
+            if file and file[0] == "/":
+                self.unpackaged.append(file)
+
+        if line.startswith("Sorry: TabError: inconsistent use of tabs and spaces in indentation"):
+            print(line)
+            self.returncode = 99
+
+        match = f"File not found: /builddir/build/BUILDROOT/{self.content.name}-{self.content.version}-{self.content.release}.x86_64/"
+        if match in line:
+            missing_file = "/" + line.split(match)[1].strip()
+            self.filemanager.remove_file(missing_file)
+
+        if line.startswith("Executing(%clean") and self.returncode == 0:
+            if self.build.short_circuit == "binary":
+                print("RPM binary build successful")
+                self.build.success = 1
+            elif self.build.short_circuit is None:
+                print("RPM build successful")
+                self.build.success = 1
+
+        if line.startswith("Child return code was: 0") and self.returncode == 0:
+            if self.build.short_circuit == "prep":
+                print("RPM short circuit prep build successful")
+                self.build.success = 1
+            elif self.build.short_circuit == "build":
+                print("RPM build build successful")
+                self.build.success = 1
+            elif self.build.short_circuit == "install":
+                print("RPM install build successful")
+                self.build.success = 1
+
+    def push_unpackaged(self):
+        """Push the unpackaged files listed so far to the file manager in one batch."""
+        if not self.unpackaged:
+            return
+        print("".join(f"file: {file}\n" for file in self.unpackaged), end="")
+        self.filemanager.push_files(self.unpackaged, self.content.name)
+        self.unpackaged = []
+
+    def finish(self):
+        """Handle the end of the build.log."""
+        self.push_unpackaged()
+
+
 class Build(object):
     """Manage package builds."""
 
@@ -95,6 +189,9 @@ class Build(object):
         self.mock_dir = ""
         self.short_circuit = ""
         self.do_file_restart = True
+        self.early_restart = False
+        self.log_consumer_factories = {}
+        self.log_consumers = {}
 
     def write_normal_bashrc(self, mock_dir, content_name, config):
         """Write normal bashrc to package builddir home directory."""
@@ -344,6 +441,18 @@ class Build(object):
                 util.print_warning(f"Unknown pattern match: {s}")
                 self.warned_about.add(s)
 
+    def match_patterns(self, line, matcher, config, requirements):
+        """Run line through every build.log pattern that may match it."""
+        for kind, pat in matcher.candidates(line):
+            if kind == "pkgconfig":
+                self.simple_pattern_pkgconfig(line, *pat, config.config_opts.get('32bit'), requirements)
+            elif kind == "simple":
+                self.simple_pattern(line, *pat, requirements)
+            elif kind == "failed":
+                self.failed_pattern(line, config, requirements, *pat)
+            else:
+                self.failed_exit_pattern(line, config, requirements, *pat)
+
     def parse_buildroot_log(self, filename, returncode):
         """Handle buildroot log contents."""
         if returncode == 0:
@@ -351,97 +460,37 @@ class Build(object):
         self.must_restart = 0
         is_clean = True
         util.call("sync")
-        with util.open_auto(filename, "r") as rootlog:
-            loglines = rootlog.readlines()
         missing_pat = re.compile(r"^.*No matching package to install: '(.*)'$")
-        for line in loglines:
+        for line in util.iter_lines(filename):
             match = missing_pat.match(line)
             if match is not None:
                 util.print_fatal("Cannot resolve dependency name: {}".format(match.group(1)))
                 is_clean = False
         return is_clean
 
+    def add_log_consumer(self, key, factory):
+        """Feed each parsed build.log to a new factory() consumer.
+
+        The consumers of the most recent round are kept in self.log_consumers
+        by key, so their results can be used without reading the log again.
+        """
+        self.log_consumer_factories[key] = factory
+
     def parse_build_results(self, filename, returncode, filemanager, config, requirements, content):
         """Handle build log contents."""
         requirements.verbose = 1
         self.must_restart = 0
         self.file_restart = 0
-        infiles = 0
 
         # Flush the build-log to disk, before reading it
         util.call("sync")
-        with util.open_auto(filename, "r") as buildlog:
-            loglines = buildlog.readlines()
-        for line in loglines:
-            if (self.short_circuit != "prep" and self.short_circuit != "binary"):
-                for pat in config.pkgconfig_pats:
-                    self.simple_pattern_pkgconfig(line, *pat, config.config_opts.get('32bit'), requirements)
-
-                for pat in config.simple_pats:
-                    self.simple_pattern(line, *pat, requirements)
-
-                for pat in config.failed_pats:
-                    self.failed_pattern(line, config, requirements, *pat)
-
-                for pat in config.failed_exit_pats:
-                    self.failed_exit_pattern(line, config, requirements, *pat)
-
-            # check_for_warning_pattern(line)
-
-            # Search for files to add to the %files section.
-            # * infiles == 0 before we reach the files listing
-            # * infiles == 1 for the "Installed (but unpackaged) file(s) found" header
-            #     and for the entirety of the files listing
-            # * infiles == 2 after the files listing has ended
-            if infiles == 1:
-                for search in ["RPM build errors", "Childreturncodewas",
-                               "Child returncode", "Empty %files file"]:
-                    if search in line:
-                        infiles = 2
-                for start in ["Building", "Child return code was"]:
-                    if line.startswith(start):
-                        infiles = 2
-
-            if infiles == 0 and "Installed (but unpackaged) file(s) found:" in line:
-                infiles = 1
-                filemanager.fix_broken_pkg_config_versioning(content.name)
-                if config.config_opts["altcargo1"]:
-                    filemanager.write_cargo_find_install_assets(content.name)
-            # elif infiles == 1 and "not matching the package arch" not in line:
-            elif infiles == 1:
-                # exclude blank lines from consideration...
-                file = line.strip()
-                if file and file[0] == "/":
-                    filemanager.push_file(file, content.name)
-                    print(f"file: {file}")
-
-            if line.startswith("Sorry: TabError: inconsistent use of tabs and spaces in indentation"):
-                print(line)
-                returncode = 99
-
-            match = f"File not found: /builddir/build/BUILDROOT/{content.name}-{content.version}-{content.release}.x86_64/"
-            if match in line:
-                missing_file = "/" + line.split(match)[1].strip()
-                filemanager.remove_file(missing_file)
-
-            if line.startswith("Executing(%clean") and returncode == 0:
-                if self.short_circuit == "binary":
-                    print("RPM binary build successful")
-                    self.success = 1
-                elif self.short_circuit is None:
-                    print("RPM build successful")
-                    self.success = 1
-
-            if line.startswith("Child return code was: 0") and returncode == 0:
-                if self.short_circuit == "prep":
-                    print("RPM short circuit prep build successful")
-                    self.success = 1
-                elif self.short_circuit == "build":
-                    print("RPM build build successful")
-                    self.success = 1
-                elif self.short_circuit == "install":
-                    print("RPM install build successful")
-                    self.success = 1
+        parser = BuildLogParser(self, returncode, filemanager, config, requirements, content)
+        self.log_consumers = {key: factory() for key, factory in self.log_consumer_factories.items()}
+        pipeline = buildlog.LogPipeline([parser])
+        for consumer in self.log_consumers.values():
+            pipeline.register(consumer)
+        pipeline.run(filename)
+        parser.finish()
 
         if (self.success == 1 and self.short_circuit == "build" and config.config_opts.get("altflags_pgo_ext")):
             if config.config_opts.get("altflags_pgo_ext_phase"):
@@ -449,6 +498,36 @@ class Build(object):
             #else:
                 #self.copy_to_system_pgo(self.mock_dir, content.name)
 
+    def call_mock_tailing(self, command, logfile, build_log, config, requirements, cwd):
+        """Run the mock build command while following its build.log.
+
+        Lines are matched against the build.log patterns as soon as mock
+        writes them, and mock is stopped as soon as a new build requirement
+        makes a restart necessary. Return the mock return code.
+        """
+        self.must_restart = 0
+        matcher = config.get_pattern_matcher()
+        tailer = buildlog.LogTailer(build_log)
+        with open(logfile, "w") as logf:
+            proc = subprocess.Popen(shlex.split(command), stdout=logf, stderr=subprocess.STDOUT,
+                                    universal_newlines=True, cwd=cwd)
+            try:
+                while proc.poll() is None:
+                    for line in tailer.read_lines():
+                        self.match_patterns(line, matcher, config, requirements)
+                    if self.must_restart > 0:
+                        print_info("New build requirements found, stopping mock early")
+                        try:
+                            proc.terminate()
+                        except PermissionError:
+                            # mock runs under sudo
+                            util.call(f"sudo kill -TERM {proc.pid}", check=False)
+                        break
+                    time.sleep(buildlog.TAIL_INTERVAL)
+                return proc.wait()
+            finally:
+                tailer.close()
+
     def package(self, filemanager, mockconfig, mockopts, config, requirements, content, mock_dir, short_circuit, do_file_restart, cleanup=False):
         """Run main package build routine."""
         self.do_file_restart = do_file_restart
@@ -456,6 +535,7 @@ class Build(object):
         self.short_circuit = short_circuit
         self.round += 1
         self.success = 0
+        self.log_consumers = {}
         mock_cmd = get_mock_cmd()
         print("Building package " + content.name + " round", self.round)
 
@@ -515,10 +595,20 @@ class Build(object):
                 cmd_args.append("--short-circuit=binary")
                 print_info("Will --short-circuit=binary")
 
-        ret = util.call(" ".join(cmd_args),
-                        logfile=f"{config.download_path}/results/mock_build.log",
-                        check=False,
-                        cwd=config.download_path)
+        # Patterns only add restarts in full builds, so that is the only case
+        # where following the log can stop mock early
+        early_restart = 0
+        if self.early_restart and self.short_circuit is None:
+            ret = self.call_mock_tailing(" ".join(cmd_args),
+                                         f"{config.download_path}/results/mock_build.log",
+                                         f"{config.download_path}/results/build.log",
+                                         config, requirements, config.download_path)
+            early_restart = self.must_restart
+        else:
+            ret = util.call(" ".join(cmd_args),
+                            logfile=f"{config.download_path}/results/mock_build.log",
+                            check=False,
+                            cwd=config.download_path)
 
         if self.short_circuit == "prep":
             self.write_normal_bashrc(self.mock_dir, content.name, config)
@@ -535,6 +625,9 @@ class Build(object):
         is_clean = self.parse_buildroot_log(config.download_path + "/results/root.log", ret)
         if is_clean:
             self.parse_build_results(config.download_path + "/results/build.log", ret, filemanager, config, requirements, content)
+            # requirements learned while following the log are already known
+            # by now, so they no longer count as new in parse_build_results
+            self.must_restart += early_restart
         if filemanager.has_banned:
             util.print_fatal("Content in banned paths found, aborting build")
             exit(1)
@@ -0,0 +1,191 @@
+#!/bin/true
+#
+# buildlog.py - part of autospec
+# Copyright (C) 2015 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Helpers for scanning mock build logs
+#
+
+import re
+
+import util
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Seconds between reads of a log that is still being written
+TAIL_INTERVAL = 0.5
+
+# Literals shorter than this make a poor prefilter key, patterns whose
+# longest required literal is shorter are always run
+MIN_KEY_LEN = 3
+
+
+def required_literal(pattern):
+    """Return the longest literal substring every match of pattern must contain.
+
+    Only literals at the top level of the pattern are considered, since those
+    are guaranteed to be part of any match. Return None if there is no usable
+    literal (or the pattern is case-insensitive).
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+
+    best = ""
+    run = []
+    for op, arg in list(parsed) + [(None, None)]:
+        if op is sre_parse.LITERAL:
+            run.append(chr(arg))
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+
+    if len(best) < MIN_KEY_LEN:
+        return None
+    return best
+
+
+def _trie_regex(words):
+    """Build an alternation regex for words, factored by common prefixes."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def _build(node):
+        if "" in node and len(node) == 1:
+            return ""
+        alts = []
+        optional = False
+        for char in sorted(node):
+            if char == "":
+                optional = True
+                continue
+            alts.append(re.escape(char) + _build(node[char]))
+        if len(alts) == 1 and not optional:
+            return alts[0]
+        result = "(?:" + "|".join(alts) + ")"
+        if optional:
+            result += "?"
+        return result
+
+    return _build(trie)
+
+
+class PatternMatcher(object):
+    """Precompiled matcher for the build.log failure pattern tables.
+
+    Every pattern from the pkgconfig, simple, failed and failed_exit tables is
+    compiled once. A combined regex built from the literal substrings each
+    pattern requires is used as a prefilter, so that most log lines are
+    rejected with a single search and only lines that may match reach the
+    individual patterns.
+    """
+
+    def __init__(self, pkgconfig_pats, simple_pats, failed_pats, failed_exit_pats):
+        """Compile the pattern tables, preserving their order."""
+        self.entries = []
+        for kind, pats in (("pkgconfig", pkgconfig_pats),
+                           ("simple", simple_pats),
+                           ("failed", failed_pats),
+                           ("failed_exit", failed_exit_pats)):
+            for pat in pats:
+                compiled = (re.compile(pat[0]),) + tuple(pat[1:])
+                self.entries.append((required_literal(pat[0]), kind, compiled))
+
+        self.unkeyed = [(kind, pat) for key, kind, pat in self.entries if key is None]
+        keys = set(key for key, _, _ in self.entries if key is not None)
+        if keys:
+            self.prefilter = re.compile(_trie_regex(keys))
+        else:
+            self.prefilter = None
+
+    def candidates(self, line):
+        """Return (kind, pattern) pairs that may match line, in table order.
+
+        The pattern tuple has the same layout as the config table entry, with
+        the pattern string replaced by its compiled form.
+        """
+        if self.prefilter is None or not self.prefilter.search(line):
+            return self.unkeyed
+        return [(kind, pat) for key, kind, pat in self.entries if key is None or key in line]
+
+
+class LogPipeline(object):
+    """Read a log once and feed each line to every registered consumer.
+
+    A consumer is any object with a feed(line) method. Consumers are fed in
+    registration order, and whatever they collect is read back by the caller
+    once run() returns.
+    """
+
+    def __init__(self, consumers=None):
+        """Create a pipeline with an optional initial list of consumers."""
+        self.consumers = list(consumers) if consumers else []
+
+    def register(self, consumer):
+        """Add consumer to the end of the pipeline."""
+        self.consumers.append(consumer)
+
+    def run(self, filename):
+        """Stream filename through all consumers."""
+        feeds = [consumer.feed for consumer in self.consumers]
+        for line in util.iter_lines(filename):
+            for feed in feeds:
+                feed(line)
+
+
+class LogTailer(object):
+    """Incrementally read a log while another process is still writing it."""
+
+    def __init__(self, filename):
+        """Follow filename, which does not need to exist yet."""
+        self.filename = filename
+        self.file = None
+        self.partial = ""
+
+    def read_lines(self):
+        """Return the complete lines appended since the previous call.
+
+        A trailing line without its newline is held back until the rest of it
+        has been written.
+        """
+        if self.file is None:
+            try:
+                self.file = util.open_auto(self.filename, "r")
+            except FileNotFoundError:
+                return []
+        data = self.file.read()
+        if not data:
+            return []
+        parts = (self.partial + data).split("\n")
+        self.partial = parts.pop()
+        return [part + "\n" for part in parts]
+
+    def close(self):
+        """Stop following the log."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
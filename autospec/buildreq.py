@@ -27,6 +27,7 @@ import re
 
 import pypidata
 import specdescription
+import srctree
 import toml
 import util
 
@@ -36,8 +37,8 @@ def is_qmake_pro(f):
     return f.endswith(".pro") and not f.startswith(".")
 
 
-def clean_python_req(req):
-    """Strip version information from req."""
+def strip_python_req(req):
+    """Strip version information from req, without the pypi name lookup."""
     if not req:
         return ""
     if req[0] == "#":
@@ -76,7 +77,12 @@ def clean_python_req(req):
 
     ret = ret.strip()
     # use the dictionary to translate funky names to our current pgk names
-    ret = util.translate(ret)
+    return util.translate(ret)
+
+
+def clean_python_req(req):
+    """Strip version information from req."""
+    ret = strip_python_req(req)
     if ret:
         # normalize to pypi name
         ret = pypidata.get_pypi_name(ret, miss=True)
@@ -87,6 +93,18 @@ def clean_python_req(req):
     return ret
 
 
+def prefetch_python_reqs(reqs):
+    """Resolve the pypi names of reqs in one batch, ahead of clean_python_req."""
+    names = []
+    for req in reqs:
+        try:
+            names.append(strip_python_req(req))
+        except Exception:
+            # clean_python_req will fail on it the same way
+            pass
+    pypidata.prefetch_pypi_names(names)
+
+
 def python_req_in_filtered_path(path):
     """Return True if the python requirement file is in a path we don't want to look at."""
     if "/demo/" in path:
@@ -677,9 +695,14 @@ class Requirements(object):
         with util.open_auto(descfile, "r") as f:
             lines = f.readlines()
 
+        reqs = []
         for line in lines:
             if '[' in line:
                 break
+            reqs.append(line)
+        prefetch_python_reqs(reqs)
+
+        for line in reqs:
             clean_line = clean_python_req(line)
             if 'pytest' in line:
                 continue
@@ -697,6 +720,7 @@ class Requirements(object):
         if not (requires := buildsys.get("requires")):
             return
 
+        prefetch_python_reqs(requires)
         for require in requires:
             if dep := clean_python_req(require):
                 self.add_buildreq(f"pypi({dep})")
@@ -706,6 +730,7 @@ class Requirements(object):
         setup_f = configparser.ConfigParser(interpolation=None, allow_no_value=True)
         setup_f.read(filename)
         if 'options' in setup_f.sections() and (install_reqs := setup_f['options'].get('install_requires')):
+            prefetch_python_reqs(install_reqs.splitlines())
             for req in install_reqs.splitlines():
                 if dep := clean_python_req(req):
                     req = f"pypi({dep})"
@@ -737,6 +762,9 @@ class Requirements(object):
         with util.open_auto(filename) as f:
             lines = f.readlines()
 
+        # (requirement, is install_requires) in file order, the pypi names
+        # are looked up in one batch once the whole file has been read
+        found = []
         for line in lines:
             if not multiline and ("install_requires" in line or "setup_requires" in line):
                 req = "install_requires" in line
@@ -757,10 +785,7 @@ class Requirements(object):
                         item = item.strip()
                         try:
                             # eval the string and add requirements
-                            if dep := clean_python_req(ast.literal_eval(item)):
-                                dep = f"pypi({dep})"
-                                if self.add_buildreq(dep) and req:
-                                    self.add_requires(dep, packages, subpkg="python3")
+                            found.append((ast.literal_eval(item), req))
 
                         except Exception:
                             # do not fail, the line contained a variable and
@@ -781,10 +806,7 @@ class Requirements(object):
                 else:
                     line = line.strip()
                     try:
-                        if dep := clean_python_req(ast.literal_eval(line)):
-                            dep = f"pypi({dep})"
-                            if self.add_buildreq(dep) and req:
-                                self.add_requires(dep, packages, subpkg="python3")
+                        found.append((ast.literal_eval(line), req))
 
                     except Exception:
                         # Do not fail, just keep looking
@@ -802,17 +824,25 @@ class Requirements(object):
                     line = line.split("]")[0]
 
                 try:
-                    dep = ast.literal_eval(line.split('#')[0].strip(' ,\n'))
-                    if dep := clean_python_req(dep):
-                        dep = f"pypi({dep})"
-                        if self.add_buildreq(dep) and req:
-                            self.add_requires(dep, packages, subpkg="python3")
+                    found.append((ast.literal_eval(line.split('#')[0].strip(' ,\n')), req))
 
                 except Exception:
                     # do not fail, the line contained a variable and had to
                     # be skipped
                     pass
 
+        prefetch_python_reqs(dep for dep, _ in found)
+        for dep, req in found:
+            try:
+                if dep := clean_python_req(dep):
+                    dep = f"pypi({dep})"
+                    if self.add_buildreq(dep) and req:
+                        self.add_requires(dep, packages, subpkg="python3")
+
+            except Exception:
+                # do not fail, the item was not a requirement string
+                pass
+
     def parse_catkin_deps(self, cmakelists_file, conf32):
         """Determine requirements for catkin packages."""
         f = util.open_auto(cmakelists_file, "r")
@@ -861,8 +891,9 @@ class Requirements(object):
             self.extra_cmake_special_pgo.add("-DCATKIN_BUILD_BINARY_PACKAGE=ON")
             self.extra_cmake_special_pgo.add("-DSETUPTOOLS_DEB_LAYOUT=OFF")
 
-    def scan_for_configure(self, dirn, tname, config):
+    def scan_for_configure(self, dirn, tname, config, tree=None):
         """Scan the package directory for build files to determine build pattern."""
+        tree = tree or srctree.SourceTreeIndex(dirn)
         if config.default_pattern == "distutils36":
             self.add_buildreq("buildreq-distutils36")
         elif config.default_pattern == "distutils3":
@@ -891,7 +922,7 @@ class Requirements(object):
             self.add_buildreq("buildreq-configure")
 
         count = 0
-        for dirpath, _, files in os.walk(dirn):
+        for dirpath, _, files in tree.walk(dirn):
             default_score = 2 if dirpath == dirn else 1
 
             if any(f.endswith(".go") for f in files):
@@ -1011,7 +1042,7 @@ class Requirements(object):
                 if config.alias:
                     tname = config.alias
                 pypi_name = pypidata.get_pypi_name(tname)
-                pypi_json = pypidata.get_pypi_metadata(pypi_name)
+                pypi_json = pypidata.get_pypi_metadata(pypi_name, dirn)
             if pypi_json:
                 try:
                     package_pypi = json.loads(pypi_json)
@@ -23,17 +23,25 @@ import os
 import re
 
 import count
+import srctree
 import util
 
 tests_config = ""
 
 
-def check_regression(pkg_dir, skip_tests):
-    """Check the build log for test regressions using the count module."""
+def check_regression(pkg_dir, skip_tests, counter=None):
+    """Check the build log for test regressions using the count module.
+
+    If counter is given it is a count.ResultCounter that has already been fed
+    results/build.log, so the log is not read again.
+    """
     if skip_tests:
         return
 
-    result = count.parse_log(os.path.join(pkg_dir, "results/build.log"))
+    if counter is not None:
+        result = counter.finish()
+    else:
+        result = count.parse_log(os.path.join(pkg_dir, "results/build.log"))
     titles = [('Package', 'package name', 1),
               ('Total', 'total tests', 1),
               ('Pass', 'total passing', 1),
@@ -52,7 +60,7 @@ def check_regression(pkg_dir, skip_tests):
     util.write_out(os.path.join(pkg_dir, "testresults"), res_str)
 
 
-def scan_for_tests(src_dir, config, requirements, content):
+def scan_for_tests(src_dir, config, requirements, content, tree=None):
     """Scan source directory for test files and set tests_config accordingly."""
     global tests_config
 
@@ -125,7 +133,8 @@ def scan_for_tests(src_dir, config, requirements, content):
         testsuites["makecheck"] += "\ncd ../build-openmpi;\n" + make_check_openmpi
         testsuites["cmake"] += "\ncd ../clr-build-openmpi;\n" + cmake_check_openmpi
 
-    files = os.listdir(src_dir)
+    tree = tree or srctree.SourceTreeIndex(src_dir)
+    files = tree.listdir(src_dir)
 
     if config.default_pattern == "cmake":
         makefile_path = os.path.join(src_dir, "CMakeLists.txt")
@@ -166,20 +175,14 @@ def scan_for_tests(src_dir, config, requirements, content):
                        "R CMD check --no-manual --no-examples --no-codoc "    \
                        + content.rawname + " || :"
     elif config.default_pattern == "meson":
-        found_tests = False
         makefile_path = os.path.join(src_dir, "meson.build")
         if not os.path.isfile(makefile_path):
             return
-        for dirpath, _, files in os.walk(src_dir):
-            for f in files:
-                if f == "meson.build":
-                    with util.open_auto(os.path.join(dirpath, f)) as fp:
-                        if any(re.search(r'^\s*test\s*\(.+', line) for line in fp):
-                            found_tests = True
-                            tests_config = testsuites["meson"]
-                            break
-            if found_tests:
-                break
+        for path in tree.files_named("meson.build", src_dir):
+            with util.open_auto(path) as fp:
+                if any(re.search(r'^\s*test\s*\(.+', line) for line in fp):
+                    tests_config = testsuites["meson"]
+                    break
 
     elif config.default_pattern == "waf":
         tests_config = testsuites["waf"]
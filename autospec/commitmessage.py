@@ -28,19 +28,21 @@ import shutil
 import sys
 from subprocess import PIPE, run
 
+import srctree
 import util
 
 
-def scan_for_changes(download_path, directory, transforms):
+def scan_for_changes(download_path, directory, transforms, tree=None):
     """Scan for changelogs or news files in the file sources.
 
     Scan for changelogs or news files in the source code and copy them to download_path as their
     `transform`ed name. The file with the transformed name will later be parsed to find the
     commit message.
     """
+    tree = tree or srctree.SourceTreeIndex(directory)
     found = []
     interests = transforms.keys()
-    for dirpath, dirnames, files in os.walk(directory, topdown=False):
+    for dirpath, dirnames, files in tree.walk(directory, topdown=False):
         hits = [x for x in files if x.lower() in interests and x.lower() not in found]
         for item in hits:
             source = os.path.join(dirpath, item)
@@ -29,6 +29,7 @@ from collections import OrderedDict
 from typing import List, Tuple
 import shutil
 
+import buildlog
 import check
 import license
 from util import call, print_warning, print_fatal, write_out
@@ -65,6 +66,44 @@ def read_pattern_conf(filename, dest, list_format=False, path=None):
                 dest[pattern] = package.rstrip()
 
 
+def read_file_overrides(filename, dest, path=None):
+    """Read the per-package file placement overrides.
+
+    Lines are in the form <pattern>, <package> and are grouped under a
+    [<package name>] header. dest is indexed by package name, each value being
+    the ordered list of rule tuples used by FileManager. A package of the form
+    "-n <package>" places the file in a %package -n subpackage. A section in
+    the path version of the file replaces the repo section of the same name.
+    """
+    file_repo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    file_conf_path = os.path.join(path, filename) if path else None
+    file_path = [fpath for fpath in (file_repo_path, file_conf_path) if fpath and os.path.isfile(fpath)]
+    for fpath in file_path:
+        seen = set()
+        rules = None
+        with open(fpath, "r") as patfile:
+            for line in patfile:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("[") and line.endswith("]"):
+                    name = line[1:-1]
+                    if name not in seen:
+                        seen.add(name)
+                        dest[name] = []
+                    rules = dest[name]
+                    continue
+                if rules is None:
+                    continue
+                pattern, package = line.rsplit(", ", 1)
+                # fail on a bad pattern here rather than on the first file
+                re.compile(pattern)
+                if package.startswith("-n "):
+                    rules.append((pattern, package[3:], "", "", True))
+                else:
+                    rules.append((pattern, package))
+
+
 class Config(object):
     """Class to handle autospec configuration."""
 
@@ -200,6 +239,7 @@ class Config(object):
         self.license_blacklist = {}
         self.qt_modules = {}
         self.cmake_modules = {}
+        self.file_overrides = {}
         self.cves = []
         self.download_path = download_path
         self.default_pattern = "make"
@@ -429,6 +469,15 @@ class Config(object):
         self.failed_exit_pats = [(r"overwriting an existing profile", 0, None),
                                  (r"\[-Wmissing-profile\]", 0, None),
                                  (r"\[-Wcoverage-mismatch\]", 0, None)]
+        # compiled form of the pattern tables above, see get_pattern_matcher
+        self.pattern_matcher = None
+
+    def get_pattern_matcher(self):
+        """Return the compiled build.log pattern matcher, building it on first use."""
+        if self.pattern_matcher is None:
+            self.pattern_matcher = buildlog.PatternMatcher(self.pkgconfig_pats, self.simple_pats,
+                                                           self.failed_pats, self.failed_exit_pats)
+        return self.pattern_matcher
 
     def set_build_pattern(self, pattern, strength):
         """Set the global default pattern and pattern strength."""
@@ -834,6 +883,7 @@ class Config(object):
         read_pattern_conf("license_blacklist", self.license_blacklist, list_format=True, path=path)
         read_pattern_conf("qt_modules", self.qt_modules, path=path)
         read_pattern_conf("cmake_modules", self.cmake_modules, path=path)
+        read_file_overrides("file_overrides", self.file_overrides, path=path)
 
     def parse_existing_spec(self, name):
         """Determine the old version, old patch list, old keyid, and cves from old spec file."""
@@ -161,43 +161,62 @@ def parse_meson_test(lines):
             continue
 
 
-def parse_log(log, pkgname=''):
-    """Parse output of test logs."""
-    global total_tests
-    global total_pass
-    global total_fail
-    global total_xfail
-    global total_skip
-    global counted_tests
-    global counted_pass
-    global counted_fail
-    global counted_xfail
-    global counted_skip
-    global name
-
-    name = pkgname
-    incheck = False
-    with util.open_auto(log, 'r') as logf:
-        lines = logf.readlines()
-
-    zero_lines = ["Executing(%check)",
-                  "+ make check",
-                  "##### Testing packages."]
-
-    for idx, line in enumerate(lines):
-        line = line.rstrip()
-
-        for zline in zero_lines:
+ZERO_LINES = ["Executing(%check)",
+              "+ make check",
+              "##### Testing packages."]
+
+
+class ResultCounter(object):
+    """Count test results in a build log fed to it one line at a time.
+
+    The counts are kept in the module globals, as with parse_log, so only one
+    counter can be in use at a time. A new counter resets them, so results
+    from an earlier log are not added to its own.
+    """
+
+    def __init__(self, pkgname=''):
+        """Start counting for pkgname."""
+        global name
+        name = pkgname
+        zero_test_data()
+        for results in (testcount, testpass, testfail, testxfail, testskip):
+            results.clear()
+        self.incheck = False
+        self.inmeson = False
+
+    def feed(self, rawline):
+        """Count the test results in a single log line."""
+        global total_tests
+        global total_pass
+        global total_fail
+        global total_xfail
+        global total_skip
+        global counted_tests
+        global counted_pass
+        global counted_fail
+        global counted_xfail
+        global counted_skip
+        global name
+
+        if self.inmeson:
+            parse_meson_test([rawline])
+            return
+
+        line = rawline.rstrip()
+
+        for zline in ZERO_LINES:
             if zline in line:
-                if incheck:
+                if self.incheck:
                     zero_test_data()
                 else:
-                    incheck = True
+                    self.incheck = True
 
         if "meson test" in line:
             zero_test_data()
-            parse_meson_test(lines[idx:])
-            break
+            # the rest of the log, from this line on, goes to the meson parser
+            self.inmeson = True
+            parse_meson_test([rawline])
+            return
 
         match = re.search(r"CLR-XTEST: Package: (.*)", line)
         if match:
@@ -210,13 +229,13 @@ def parse_log(log, pkgname=''):
         # 17 commands (17 passed, 0 failed)-
         if re.search(r"\[[0-9]+\].*\-\- ok", line):
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"[0-9]+ commands \(([0-9]+) passed, ([0-9]+) failed\)", line)
         if match:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         # alembic package
         # Ran 678 tests in 5.175s
@@ -224,34 +243,34 @@ def parse_log(log, pkgname=''):
         match = re.search("Ran ([0-9]+) tests? in", line)
         if match:
             total_tests += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"OK \(SKIP=([0-9]+)\)", line)
         if match:
             total_skip += convert_int(match.group(1))
-            continue
+            return
         else:
             match = re.search(r"OK \(skipped=([0-9]+)\)", line)
             if match:
                 total_skip += convert_int(match.group(1))
-                continue
+                return
 
         # anyjson
         # test_implementations.test_default_serialization ... ok
         # note: configure false positive
-        if re.search(r"\.\.\. ok$", line) and incheck:
+        if re.search(r"\.\.\. ok$", line) and self.incheck:
             counted_pass += 1
-            continue
+            return
 
-        if re.search(r"\.\.\. skipped$", line) and incheck:
+        if re.search(r"\.\.\. skipped$", line) and self.incheck:
             counted_skip += 1
-            continue
+            return
 
         # apr
         # testatomic          :  SUCCESS
-        if re.search(r":  SUCCESS$", line) and incheck:
+        if re.search(r":  SUCCESS$", line) and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # cryptography
         # ================= 76230 passed, 267 skipped in 140.23 seconds ==================
@@ -271,141 +290,141 @@ def parse_log(log, pkgname=''):
         # ================= 68 passed, 1 pytest-warnings in 0.09 seconds =================
         # ===== 21 failed, 73 passed, 5 skipped, 2 pytest-warnings in 34.81 seconds ======
         match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_skip += convert_int(match.group(2))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xfailed in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_skip += convert_int(match.group(2))
             total_xfail += convert_int(match.group(3))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) error in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_skip += convert_int(match.group(2))
             total_fail += convert_int(match.group(3))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) error in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
             total_fail += convert_int(match.group(4)) + convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) error in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(2))
             total_fail += convert_int(match.group(3)) + convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) passed, ([0-9]+) error in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) passed, ([0-9]+) warnings in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(2))
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) xfailed in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(2))
             total_fail += convert_int(match.group(1))
             total_xfail += convert_int(match.group(3))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) warnings in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(2))
             total_fail += convert_int(match.group(1)) + convert_int(match.group(4))
             total_skip += convert_int(match.group(3))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) passed in [0-9\.]+ seconds ====", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped in [0-9\.]+ seconds ====", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(2))
             total_fail += convert_int(match.group(1))
             total_skip += convert_int(match.group(3))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) skipped in [0-9\.]+ seconds ====", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) error in [0-9\.]+ seconds ====", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"== ([0-9]+) passed\, [0-9]+ [A-Za-z0-9]+\-warnings? in [0-9\.]+ seconds ====", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # ===== 21 failed, 73 passed, 5 skipped, 2 pytest-warnings in 34.81 seconds ======
         match = re.search(r"== ([0-9]+) failed\, ([0-9]+) passed\, ([0-9]+) skipped\, [0-9]+ [A-Za-z0-9]+\-warnings? in [0-9\.]+ seconds ====", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
             total_pass += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
-            continue
+            return
 
         # mercurial
         # running 59 tests using 8 parallel processes
         # # Ran 55 tests, 4 skipped, 0 failed.
         match = re.search(r"^# Ran ([0-9]+) tests\, ([0-9]+) skipped\, ([0-9]+) failed.", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(3))
             total_skip += convert_int(match.group(2))
             total_pass += (convert_int(match.group(1)) - convert_int(match.group(2)) - convert_int(match.group(3)))
-            continue
+            return
 
         # swift
         # ========= 1 failed, 1287 passed, 1 warnings, 62 error in 35.77 seconds =========
         match = re.search(r"== ([0-9]+) failed\, ([0-9]+) passed\, ([0-9]+) warnings\, ([0-9]+) error in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += (convert_int(match.group(1)) + convert_int(match.group(3)) + convert_int(match.group(4)))
             total_pass += convert_int(match.group(2))
-            continue
+            return
 
         # swift
         # 487 failed, 4114 passed, 32 skipped, 1 pytest-warnings, 34 error in 222.82 seconds
         match = re.search(r"\s*([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, [0-9]+ [A-Za-z0-9]+\-warnings?, ([0-9]+) error in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1)) + convert_int(match.group(4))
             total_pass += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
-            continue
+            return
 
         # tox
         # ======== 199 passed, 38 skipped, 1 xpassed, 1 warnings in 5.76 seconds =========
         match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xpassed, ([0-9]) warnings in ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_skip += convert_int(match.group(2))
             total_xfail += convert_int(match.group(3))
             total_fail += convert_int(match.group(4))
-            continue
+            return
 
         # augeas
         # TOTAL: 215
@@ -416,34 +435,34 @@ def parse_log(log, pkgname=''):
         # XPASS: 0
         # ERROR: 0
         match = re.search(r"# TOTAL: +([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"# PASS: +([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"# SKIP: +([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"# FAIL: +([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"# XFAIL: +([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"# XPASS: +([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # autoconf
         # 493 tests behaved as expected.
@@ -452,36 +471,36 @@ def parse_log(log, pkgname=''):
         # 344: Erlang                                          skipped (erlang.at:30)
         # 26: autoupdating macros recursively                 expected failure (tools.at:945)
         match = re.search(r"^([0-9]+) tests behaved as expected", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^([0-9]+) tests were skipped", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^[0-9]+\:.*ok$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^[0-9]+\:.*skipped \(", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_skip += 1
-            continue
+            return
 
         match = re.search(r"^[0-9]+\:.*expected failure \(", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_xfail += 1
-            continue
+            return
 
         # bison
         # 470 tests were successful.
         match = re.search(r"^([0-9]+) tests were successful", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # binutils
         # of expected passes            1144
@@ -489,76 +508,76 @@ def parse_log(log, pkgname=''):
         # of untested testcases         1
         # of unsupported tests          12
         match = re.search(r"^# of expected passes.*\t([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^# of expected failures.*\t([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^# of unexpected failures.*\t([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^# of unsupported tests.*\t([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         # ccache
         # PASSED: 448 assertions, 88 tests, 10 suites
         match = re.search(r"PASSED: [0-9]+ assertions, ([0-9]+) tests, [0-9]+ suites", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # rubygem-rack
         # 701 tests, 2292 assertions, 0 failures, 0 errors
         match = re.search(r"([0-9]+) tests, [0-9]+ assertions, ([0-9]+) failures, ([0-9])+ errors", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
             total_fail += convert_int(match.group(3))
-            continue
+            return
 
         # curl
         # TESTDONE: 686 tests out of 686 reported OK: 100%
         match = re.search(r"TESTDONE: ([0-9]+) tests out of ([0-9]+) reported OK: ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(2))
             total_pass += convert_int(match.group(1))
             total_fail = convert_int(match.group(2)) - convert_int(match.group(1))
-            continue
+            return
 
         # gcc
         # All 4 tests passed
         # PASS: test-strtol-16.
         match = re.search(r"All ([0-9]+) tests passed", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^PASS\: [A-Za-z]+", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^FAIL\: [A-Za-z]+", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # gdbm
         # All 22 tests were successful.
         match = re.search(r"All ([0-9]+) tests were successful.", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # glibc
         # 3 FAIL
@@ -567,170 +586,170 @@ def parse_log(log, pkgname=''):
         # 199 XFAIL
         # 3 XPASS
         match = re.search(r"^\s*([0-9]+) FAIL$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^\s*([0-9]+) PASS$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^\s*([0-9]+) XFAIL$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^\s*([0-9]+) XPASS$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # libxml2
         # Total 2908 tests, no errors
         # Total: 1171 functions, 291083 tests, 0 errors
         match = re.search(r"Total ([0-9]+) tests, no errors", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"Total: ([0-9]+) functions, ([0-9]+) tests, 0 errors", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # zlib
         # *** zlib shared test OK ***
         match = re.search(r"\*\*\* .* test OK \*\*\*", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # e2fsprogs
         # 153 tests succeeded     0 tests failed
         match = re.search(r"([0-9]+) tests succeeded\s*([0-9]+) tests failed", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         # expect
         # all.tcl:        Total   29      Passed  29      Skipped 0       Failed  0
         match = re.search(r".*:\s*Total\s+([0-9]+)\s+Passed\s+([0-9]+)\s+Skipped\s+([0-9]+)\s+Failed\s+([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_pass += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
             total_fail += convert_int(match.group(4))
-            continue
+            return
 
         # expat
         # 100%: Checks: 50, Failed: 0
         match = re.search(r"[0-9]+%: Checks: ([0-9]+), Failed: ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1)) - convert_int(match.group(2))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         # flex
         # Tests succeeded: 47
         # Tests FAILED: 0
         match = re.search(r"^Tests succeeded: ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Tests FAILED: ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         # this one catches the generic TAP format!
         #  perl-Capture-tiny
         # ok 580 - tee_merged|sys|stderr|short - got STDERR
         match = re.search(r"^ok [0-9]+ \-", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^not ok [0-9]+ \-", line)
-        if match and incheck:
+        if match and self.incheck:
             if re.search(r"# TODO\b", line):
                 counted_xfail += 1
             else:
                 counted_fail += 1
 
-            continue
+            return
 
         match = re.search(r"^ok [0-9]+$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^not ok [0-9]+$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # tcpdump
         #    0 tests failed
         # 154 tests passed
         match = re.search(r"^\s*([0-9]+) tests? failed$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^\s*([0-9]+) tests? passed$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # R packages
         # * checking top-level files ... OK
         match = re.search(r"\* .* \.\.\. OK", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"\* .* \.\.\. PASSED\.", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"\* .* \.\.\. SKIPPED", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_skip += 1
-            continue
+            return
 
         # python
         # 365 tests OK.
         # 22 tests skipped:
         match = re.search(r"^([0-9]+) tests skipped:$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^([0-9]+) tests OK.$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # jemalloc
         # Test suite summary: pass: 30/33, skip: 3/33, fail: 0/33
         match = re.search(r"Test suite summary: pass: ([0-9]+)\/([0-9]+), skip: ([0-9]+)\/([0-9]+), fail: ([0-9]+)\/([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_tests += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
             total_fail += convert_int(match.group(5))
-            continue
+            return
 
         # util-linux
         #   All 160 tests PASSED
         match = re.search(r"  All ([0-9]+) tests PASSED$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # nss
         # cert.sh: #101: Import chain-2-serverCA-ec CA -t u,u,u for localhost.localdomain (ext.)  - PASSED
@@ -739,51 +758,51 @@ def parse_log(log, pkgname=''):
         # Failed with core:   0
         # Unknown status:     0
         match = re.search(r"^[a-z]+.sh: #[0-9]+: .*  - PASSED$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^[a-z]+.sh: #[0-9]+: .*  - FAILED$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         match = re.search(r"^Passed:\s+([0-9]+)$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Failed:\s+([0-9]+)$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Failed with core:\s+([0-9]+)$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         # rsync
         #      34 passed
         #      5 skipped
         match = re.search(r"^\s+([0-9]+) passed$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^\s+([0-9]+) skipped$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         # mariadb
         # 100% tests passed, 0 tests failed out of 53
         match = re.search(r"tests passed, ([0-9]+) tests failed out of ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
             total_tests += convert_int(match.group(2))
             total_pass += convert_int(match.group(2)) - convert_int(match.group(1))
-            continue
+            return
 
         # python-runtime-tests
         # FAILED (KNOWNFAIL=6, SKIP=18, errors=6)
@@ -791,102 +810,102 @@ def parse_log(log, pkgname=''):
         # FAILED (failures=1, errors=499, skipped=48)
         # OK (KNOWNFAIL=5, SKIP=15)
         match = re.search(r"FAILED \(KNOWNFAIL=([0-9]+), SKIP=([0-9]+), errors=([0-9]+)\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
             total_skip += convert_int(match.group(2))
             total_fail += convert_int(match.group(3))
-            continue
+            return
 
         match = re.search(r"FAILED \(failures=([0-9]+), errors=([0-9]+), skipped=([0-9]+)\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"FAILED \(failures=([0-9]+), errors=([0-9]+)\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(2))
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"FAILED \(failures=([0-9]+)\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"FAILED \(errors=([0-9]+)\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"OK \(KNOWNFAIL=([0-9]+), SKIP=([0-9]+)\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
             total_skip += convert_int(match.group(2))
-            continue
+            return
 
         # qpid-python
         # Totals: 318 tests, 200 passed, 112 skipped, 0 ignored, 6 failed
         match = re.search(r"Totals: ([0-9]+) tests, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) ignored, ([0-9]+) failed", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_pass += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
             total_xfail += convert_int(match.group(4))
             total_fail += convert_int(match.group(5))
-            continue
+            return
 
         # PyYAML
         # TESTS: 2577
         match = re.search(r"^TESTS: ([0-9]+)$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
-            continue
+            return
 
         # sudo
         # visudo: 7/7 tests passed; 0/7 tests failed
         # check_symbols: 7 tests run, 0 errors, 100% success rate
         match = re.search(r"[a-z_]+\:\s+([0-9]+)\/[0-9]+ tests passed; ([0-9]+)\/[0-9]+ tests failed", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         match = re.search(r"[a-z_]+\: ([0-9]+) tests run, ([0-9]+) errors", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
             total_pass += convert_int(match.group(1)) - convert_int(match.group(2))
-            continue
+            return
 
         # R
         # running code in 'reg-examples1.R' ... OK
         # Status: 1 ERROR, 1 WARNING, 4 NOTEs
         # OK: 749 SKIPPED: 4 FAILED: 2
         match = re.search(r"running code in '.*\.R' \.\.. OK", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"Status: ([0-9]+) ERROR, ([0-9]+) WARNING, ([0-9]+) NOTEs", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"OK: ([0-9]+) SKIPPED: ([0-9]+) FAILED: ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(3))
             total_skip += convert_int(match.group(2))
-            continue
+            return
 
         # onig
         # OK: // 'a'
         match = re.search(r"^OK\: ", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # php
         # Number of tests : 13526              9794
@@ -896,165 +915,165 @@ def parse_log(log, pkgname=''):
         # Expected fail   :   31 (  0.2%) (  0.3%)
         # Tests passed    : 9751 ( 72.1%) ( 99.6%)
         match = re.search(r"^Number of tests : ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Tests skipped   :\s+([0-9]+) \(", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Tests failed    :\s+([0-9]+) \(", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Expected fail   :\s+([0-9]+) \(", line)
-        if match and incheck:
+        if match and self.incheck:
             total_xfail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"^Tests passed    :\s+([0-9]+) \(", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # rubygem / rake
         # 174 runs, 469 assertions, 0 failures, 0 errors, 0 skips
         match = re.search(r"([0-9]+) runs, ([0-9]+) assertions, ([0-9]+) failures, ([0-9]+) errors, ([0-9]+) skips", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_fail += convert_int(match.group(3))
             total_skip += convert_int(match.group(5))
-            continue
+            return
 
         # cryptsetup
         #  [OK]
-        if re.search(r" \[OK\]$", line) and incheck:
+        if re.search(r" \[OK\]$", line) and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # lzo
         #  test passed.
         match = re.search(r" test passed.$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # lsof
         # LTnlink ... OK
         # LTnfs ... ERROR!!!
         match = re.search(r"^LT[a-zA-Z0-9]+ \.\.\. OK$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^LT[a-zA-Z0-9]+ \.\.\. ERROR\!\!\!", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # libaio
         # Pass: 11  Fail: 1
         match = re.search(r"^Pass: ([0-9]+)  Fail: ([0-9]+)$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         # gawk
         match = re.search(r"^ALL TESTS PASSED$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
+            return
 
         # gptfdisk
         # **SUCCESS** ...
         match = re.search(r"^\*\*SUCCESS\*\*", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # boost
         # **passed** ...
         # 8 errors detected.
         match = re.search(r"^\*\*passed\*\*", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"([0-9]+) errors? detected\.?", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         match = re.search(r"([0-9]+) failures? detected\.?", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
-            continue
+            return
 
         # make
         # 534 Tests in 118 Categories Complete ... No Failures
         match = re.search(r"([0-9]+) Tests in ([0-9]+) Categories Complete ... No Failures", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # icu4c ---[OK]
         match = re.search(r"---\[OK\]", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # libxslt
         # Pass 1
         match = re.search(r"^Pass [0-9]+$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # bash
         # < Failed 126 of 1378 Unicode tests
         match = re.search(r"^[<,>] Failed ([0-9]+) of ([0-9]+)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
             total_tests += convert_int(match.group(2))
-            continue
+            return
 
         # crudini
         # Test 95 OK (line 460)
         match = re.search(r"^Test [0-9]+ OK", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"^Test [0-9]+ (?!^OK)[A-Z]+", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # discount
         # Reddit-style automatic links ......................... OK
         match = re.search(r"[A-Za-z\-\s]+ \.\.\.+ (OK|GOOD)$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"[A-Za-z\-\s]+ \.\.\.+ (?!^OK)[A-Z]+$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # libjpeg-turbo
         # JPEG -> RGB Top-Down  2/1 ... Passed.
         # JPEG -> RGB Top-Down  15/8 ... Passed.
         # JPEG -> RGB Top-Down  7/4 ... Passed.
         match = re.search(r"[A-Za-z0-9\ \>\<\/]+ \.\.\. Passed\.", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # LVM2
         # valgrind pool awareness ... fail
@@ -1068,24 +1087,24 @@ def parse_log(log, pkgname=''):
         # dfa with non-print regex chars ... fail
         # bitset iteration ... fail
         match = re.search(r"[a-z\ ]+\ \.\.\.\ pass", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"[a-z\ ]+\ \.\.\.\ fail", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # keyring
         #  76 passed, 62 skipped, 50 xfailed, 14 xpassed, 2 warnings, 32 error in 2.13 seconds
         match = re.search(r"([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xfailed, ([0-9]+) xpassed, ([0-9]+) warnings, ([0-9]+) error in [0-9\.]+ seconds", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1)) + convert_int(match.group(4))
             total_skip += convert_int(match.group(2))
             total_xfail += convert_int(match.group(3))
             total_fail += convert_int(match.group(5)) + convert_int(match.group(6))
-            continue
+            return
 
         # openblas
         #  Real BLAS Test Program Results
@@ -1096,116 +1115,116 @@ def parse_log(log, pkgname=''):
         #  Test of subprogram number  3            SROTG
         #                                     ----- PASS -----
         match = re.search(r"\ \ +\-\-\-+\ PASS\ \-\-\-+", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         match = re.search(r"\ \ +\-\-\-+\ FAIL\ \-\-\-+", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_fail += 1
-            continue
+            return
 
         # rubygem-hashie
         # Finished in 0.07221 seconds (files took 0.28356 seconds to load)
         # 545 examples, 0 failures, 1 pending
         match = re.search(r"([0-9]+) examples?, ([0-9]+) failures?, ([0-9]+) pending", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
-            continue
+            return
 
         # rubygem-warden
         # Finished in 0.08928 seconds (files took 0.1046 seconds to load)
         # 215 examples, 14 failures
         match = re.search(r"([0-9]+) examples?, ([0-9]+) failures?", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
-            continue
+            return
 
         # rubygem-ansi
         # Executed 12 tests with 7 passing, 5 errors.
         match = re.search(r"Executed ([0-9]+) tests with ([0-9+]) passing, ([0-9]+) errors\.", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_pass += convert_int(match.group(2))
             total_fail += convert_int(match.group(3))
-            continue
+            return
 
         # vim
         # Executed 9 tests
         match = re.search(r"Executed ([0-9]+) tests$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
-            continue
+            return
 
         # rubygem-formatador
         #   9 succeeded in 0.00375661 seconds
         match = re.search(r"([0-9]+) succeeded in [0-9]+\.[0-9]+ seconds", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # ./pigz -kf pigz.c ; ./pigz -t pigz.c.gz
         # ./pigz -kfb 32 pigz.c ; ./pigz -t pigz.c.gz
         match = re.search(r".*\.\/pigz.+(\.\/pigz).+", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 2
-            continue
-        elif re.search(r".*\.\/pigz.+", line) and incheck:
+            return
+        elif re.search(r".*\.\/pigz.+", line) and self.incheck:
             total_pass += 1
-            continue
+            return
 
         # netifaces
         # Interface lo:
         # Interface enp2s0:
         match = re.search(r"^Interface [a-zA-Z0-9]+\:", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
+            return
 
         # btrfs-progs
         # [TEST]   001-bad-file-extent-bytenr
         # [NOTRUN] Need to validate root privileges
         # test failed for case
         match = re.search(r"    \[TEST\]   .*", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
+            return
 
         match = re.search(r"test failed for case.*", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += 1
             total_pass = max(0, total_pass - 1)
-            continue
+            return
 
         match = re.search(r"    \[NOTRUN\] .*", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += 1
-            continue
+            return
 
         # chrpath
         # success: chrpath changed rpath to larger path.
         # error: chrpath unable to change rpath to larger path.
         match = re.search(r"success\: chrpath .*", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
-        elif re.search(r"error: chrpath .*", line) and incheck:
+            return
+        elif re.search(r"error: chrpath .*", line) and self.incheck:
             total_fail += 1
-            continue
-        elif re.search(r"warning: chrpath .*", line) and incheck:
+            return
+        elif re.search(r"warning: chrpath .*", line) and self.incheck:
             total_fail += 1
-            continue
+            return
 
         # yajl
         # 58/58 tests successful
         match = re.search(r"([0-9]+)\/([0-9]+) tests successful", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_tests += convert_int(match.group(2))
-            continue
+            return
 
         # xmlsec1
         #     Checking required transforms                            OK
@@ -1213,37 +1232,37 @@ def parse_log(log, pkgname=''):
         #     Checking required transforms                          Skip
         #     Checking required key data                               OK
         match = re.search(r"^    [\w ]+\ +OK$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
-        elif re.search(r"^    [\w ]+\ +Fail$", line) and incheck:
+            return
+        elif re.search(r"^    [\w ]+\ +Fail$", line) and self.incheck:
             total_fail += 1
-            continue
-        elif re.search(r"^    [\w ]+\ +Skip$", line) and incheck:
+            return
+        elif re.search(r"^    [\w ]+\ +Skip$", line) and self.incheck:
             total_skip += 1
-            continue
+            return
 
         # xdg-utils
         # TOTAL: 4 tests failed, 90 of 116 tests passed. (140 attempted)
         match = re.search(r"TOTAL\: ([0-9]+) tests? failed\, ([0-9]+) of [0-9]+ tests? passed\. \(([0-9]+) attempted\)", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += convert_int(match.group(1))
             total_pass += convert_int(match.group(2))
             total_skip += convert_int(match.group(3)) - (convert_int(match.group(2)) + convert_int(match.group(1)))
-            continue
+            return
 
         # slang
         # Testing argv processing ...Ok
         # ./utf8.sl:14:check_sprintf:Test Error
         match = re.search(r"^Testing [\w ]+\.\.\.Ok$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
+            return
 
         match = re.search(r":Test Error", line)
-        if match and incheck:
+        if match and self.incheck:
             total_fail += 1
-            continue
+            return
 
         # go & golang
         # ok  	golang.org/x/text/encoding/htmlindex	0.002s
@@ -1251,22 +1270,22 @@ def parse_log(log, pkgname=''):
         # FAIL	golang.org/x/text/internal	0.002s
         # --- PASS: TestApp_Command (0.00s)
         match = re.search(r"^ok\s+[\w_]+[A-Za-z0-9\.\?_\-]*", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += 1
             total_pass += 1
-            continue
+            return
 
         match = re.search(r"(---\s+)?(?<!X)FAIL:?\s*", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += 1
             total_fail += 1
-            continue
+            return
 
         match = re.search(r"---\s+PASS|PASS\s+ ", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += 1
             total_pass += 1
-            continue
+            return
 
         # valgrind
         # == 5 tests, 0 stderr failures, 1 stdout failure, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
@@ -1274,30 +1293,30 @@ def parse_log(log, pkgname=''):
         # == 125 tests, 12 stderr failures, 0 stdout failures, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
         match = re.search(r"\=\= ([0-9]+) tests?\, ([0-9]+) stderr failures?\, ([0-9]+) stdout failures?\, "
                           r"([0-9]+) stderrB failures?\, ([0-9]+) stdoutB failures?\, ([0-9]+) post failures? \=\=", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests += convert_int(match.group(1))
             total_fail += (convert_int(match.group(2)) + convert_int(match.group(3)) + convert_int(match.group(4)) + convert_int(match.group(5)) + convert_int(match.group(6)))
             total_pass += \
                 (convert_int(match.group(1)) - (convert_int(match.group(2)) + convert_int(match.group(3)) + convert_int(match.group(4)) + convert_int(match.group(5)) + convert_int(match.group(6))))
-            continue
+            return
 
         # zsh
         # **************************************
         # 46 successful test scripts, 0 failures, 1 skipped
         # **************************************
         match = re.search(r"([0-9]+) successful test scripts\, ([0-9]+) failures\, ([0-9]+) skipped", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
             total_fail += convert_int(match.group(2))
             total_skip += convert_int(match.group(3))
-            continue
+            return
 
         # glog
         # Passed 3 tests
         match = re.search(r"Passed ([0-9]+) tests", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += convert_int(match.group(1))
-            continue
+            return
 
         # hdf5
         # Testing h5repack h5repack_szip.h5 -f dset_szip:GZIP=1                  -SKIP-
@@ -1305,33 +1324,33 @@ def parse_log(log, pkgname=''):
         # Testing h5repack --metadata_block_size=8192                            PASSED
         # Verifying h5diff output h5repack_layout.h5 out-meta_long.h5repack_layo PASSED
         match = re.search(r"^Testing .+\ +PASSED$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
+            return
 
         match = re.search(r"^Verifying .+\ +PASSED$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_pass += 1
-            continue
+            return
 
         match = re.search(r"^Testing .+\ +\-SKIP\-$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += 1
-            continue
+            return
 
         match = re.search(r"^Verifying .+\ +\-SKIP\-$", line)
-        if match and incheck:
+        if match and self.incheck:
             total_skip += 1
-            continue
+            return
 
         # libconfig
         # 3 tests; 3 passed, 0 failed
         match = re.search(r"^([0-9]+) tests; ([0-9]+) passed\, ([0-9]+) failed", line)
-        if match and incheck:
+        if match and self.incheck:
             total_tests = convert_int(match.group(1))
             total_pass = convert_int(match.group(2))
             total_fail = convert_int(match.group(3))
-            continue
+            return
 
         # libogg
         # testing page spill expansion... 0, (0),  granule:0 1, (1),  granule:4103 2, (2),  granule:5127 ok.
@@ -1342,9 +1361,9 @@ def parse_log(log, pkgname=''):
         # Testing search for capture... ok.
         # Testing recapture... ok.
         match = re.search(r"^[T,t]esting .*\ ok\.$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # libvorbis
         #     vorbis_1ch_q-0.5_44100.ogg : ok
@@ -1353,20 +1372,30 @@ def parse_log(log, pkgname=''):
         #     vorbis_7ch_q-0.5_44100.ogg : ok
         #     vorbis_8ch_q-0.5_44100.ogg : ok
         match = re.search(r"^\ \ \ \ vorbis_.*\.ogg\ \:\ ok$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
 
         # pth
         # OK - ALL TESTS SUCCESSFULLY PASSED.
         match = re.search(r"^OK\ \-\ ALL\ TESTS\ SUCCESSFULLY\ PASSED\.$", line)
-        if match and incheck:
+        if match and self.incheck:
             counted_pass += 1
-            continue
+            return
+
+    def finish(self):
+        """Finalize the counts and return them formatted by string_out."""
+        sanitize_counts()
+        collect_output()
+        return string_out()
+
 
-    sanitize_counts()
-    collect_output()
-    return string_out()
+def parse_log(log, pkgname=''):
+    """Parse output of test logs."""
+    counter = ResultCounter(pkgname)
+    for line in util.iter_lines(log):
+        counter.feed(line)
+    return counter.finish()
 
 
 def string_out():
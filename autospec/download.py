@@ -17,63 +17,429 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 import pycurl
-from util import print_fatal
+from util import link_file, print_fatal, print_warning
 
+# Default number of transfers do_curl_many runs at the same time
+MAX_PARALLEL_DOWNLOADS = 8
 
-def do_curl(url, dest=None, post=None, is_fatal=False):
+# Default number of times a failed transfer is retried, and the delay in
+# seconds before the first retry, doubled for every further retry
+RETRIES = 3
+RETRY_DELAY = 2
+
+# Failures that may go away on their own: the server could not be reached,
+# or the transfer stalled or was cut off
+RETRY_ERRORS = {
+    pycurl.E_COULDNT_RESOLVE_HOST,
+    pycurl.E_COULDNT_CONNECT,
+    pycurl.E_PARTIAL_FILE,
+    pycurl.E_OPERATION_TIMEDOUT,
+    pycurl.E_SSL_CONNECT_ERROR,
+    pycurl.E_GOT_NOTHING,
+    pycurl.E_SEND_ERROR,
+    pycurl.E_RECV_ERROR,
+}
+
+# HTTP statuses, reported as E_HTTP_RETURNED_ERROR, worth retrying
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Default size in bytes the shared download cache is trimmed to
+CACHE_SIZE = 20 << 30
+
+# Default number of seconds the download cache trusts the file it recorded
+# for a url, when the sha1 of the file wanted is not known
+URL_TTL = 24 * 3600
+
+
+class PartWriter(object):
+    """Append a download to its .part file, keeping a digest of the file.
+
+    `hashed` is the number of leading bytes of the file that have already
+    been fed to `digest`. Bytes kept from an earlier transfer are hashed when
+    the first new data arrives, which is after the server accepted the
+    resume. `written` counts the bytes received by this transfer.
+
+    When a transfer starts over from the beginning, fp is open at the start
+    of the file and the first `replay` bytes received are compared with the
+    bytes already hashed instead of being written, since the digest cannot be
+    rewound. A mismatch sets `changed` and stops the transfer.
+    """
+
+    def __init__(self, fp, path, digest, hashed, replay=0):
+        """Write to fp, the open .part file at path."""
+        self.fp = fp
+        self.path = path
+        self.digest = digest
+        self.hashed = hashed
+        self.replay = replay
+        self.written = 0
+        self.changed = False
+        self.caught_up = digest is None
+
+    def write(self, data):
+        """Hash data, and any kept bytes before it, and write it to the file."""
+        self.written += len(data)
+        size = len(data)
+        if self.replay:
+            kept = self.fp.read(min(size, self.replay))
+            if data[:len(kept)] != kept:
+                self.changed = True
+                return 0
+            self.replay -= len(kept)
+            data = data[len(kept):]
+            if not data:
+                return size
+        if not self.caught_up:
+            with open(self.path, 'rb') as kept:
+                kept.seek(self.hashed)
+                for chunk in iter(lambda: kept.read(1 << 20), b''):
+                    self.digest.update(chunk)
+                    self.hashed += len(chunk)
+            self.caught_up = True
+        if self.digest is not None:
+            self.digest.update(data)
+            self.hashed += len(data)
+        self.fp.write(data)
+        return size
+
+
+class DownloadError(Exception):
+    """A failed transfer, with the HTTP status the server returned, if any."""
+
+    def __init__(self, message, status=None):
+        """Describe the failure in message."""
+        super().__init__(message)
+        self.status = status
+
+
+def write_failed(dest, path, error):
+    """Remove the partial download at path after a failure writing dest."""
+    if os.path.exists(path):
+        os.unlink(path)
+    return DownloadError("Unable to write to {}: {}".format(dest, error))
+
+
+def part_size(path):
+    """Return the size of the partial download at path, 0 if there is none."""
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def retryable(error, status):
+    """Return whether a transfer that failed with error may succeed later."""
+    code = error.args[0] if error.args else None
+    if code == pycurl.E_HTTP_RETURNED_ERROR:
+        return status in RETRY_STATUS
+    return code in RETRY_ERRORS
+
+
+def resume_rejected(error, status):
+    """Return whether the server refused to continue a partial download."""
+    code = error.args[0] if error.args else None
+    return code == pycurl.E_RANGE_ERROR or (code == pycurl.E_HTTP_RETURNED_ERROR and status == 416)
+
+
+def do_curl(url, dest=None, post=None, is_fatal=False, digest=None, retries=None, curl=None):
     """
     Perform a curl operation for `url`.
 
-    If `post` is set, a POST is performed for `url` with fields taken from the
-    specified value. Otherwise a GET is performed for `url`. If `dest` is set,
-    the curl response (if successful) is written to the specified path and the
-    path is returned. Otherwise a successful response is returned as a BytesIO
-    object. If `is_fatal` is `True` (`False` is the default), a GET failure,
+    This is `fetch` for callers that do not need to know why a transfer
+    failed. If `is_fatal` is `True` (`False` is the default), a GET failure,
     POST failure, or a failure to write to the path specified for `dest`
-    results in the program exiting with an error. Otherwise, `None` is returned
-    for any of those error conditions.
+    results in the program exiting with an error. Otherwise, `None` is
+    returned for any of those error conditions.
     """
-    c = pycurl.Curl()
-    c.setopt(c.URL, url)
-    if post:
-        c.setopt(c.POSTFIELDS, post)
-    c.setopt(c.FOLLOWLOCATION, True)
-    c.setopt(c.FAILONERROR, True)
-    c.setopt(c.CONNECTTIMEOUT, 10)
-    c.setopt(c.TIMEOUT, 600)
-    c.setopt(c.LOW_SPEED_LIMIT, 1)
-    c.setopt(c.LOW_SPEED_TIME, 10)
-    buf = BytesIO()
-    c.setopt(c.WRITEDATA, buf)
     try:
-        c.perform()
-    except pycurl.error as e:
+        return fetch(url, dest=dest, post=post, digest=digest, retries=retries, curl=curl)
+    except DownloadError as e:
         if is_fatal:
-            print_fatal("Unable to fetch {}: {}".format(url, e))
+            print_fatal(str(e))
             sys.exit(1)
         return None
+
+
+def fetch(url, dest=None, post=None, digest=None, retries=None, curl=None):
+    """
+    Perform a curl operation for `url`.
+
+    If `post` is set, a POST is performed for `url` with fields taken from the
+    specified value. Otherwise a GET is performed for `url`. If `dest` is set,
+    the curl response is streamed to `dest` + ".part", which is renamed to
+    `dest` once the transfer succeeds, and the path is returned. A .part file
+    left by an interrupted transfer is resumed rather than downloaded again.
+    Otherwise a successful response is returned as a BytesIO object. If
+    `digest` is set along with `dest`, it is a hashlib object that ends up
+    updated with the whole downloaded file.
+
+    A transfer that fails for a reason that may be temporary is retried up to
+    `retries` times (`RETRIES` by default), waiting `RETRY_DELAY` seconds
+    before the first retry and twice as long before each following one. The
+    .part file is kept if the transfer still fails after the last retry.
+
+    The transfer runs on `curl`, a pycurl.Curl handle that is reset before
+    each attempt and left open, so that a caller fetching several files can
+    reuse its connections. Without one, a handle is made for this call.
+
+    A GET failure, POST failure, or a failure to write to the path specified
+    for `dest` raises DownloadError.
+    """
+    if curl is None:
+        curl = pycurl.Curl()
+        try:
+            return fetch(url, dest=dest, post=post, digest=digest, retries=retries, curl=curl)
+        finally:
+            curl.close()
+    if retries is None:
+        retries = RETRIES
+    part = dest + ".part" if dest else None
+    hashed = 0
+    attempt = 0
+    restart = False
+    c = curl
+    while True:
+        c.reset()
+        c.setopt(c.URL, url)
+        if post:
+            c.setopt(c.POSTFIELDS, post)
+        c.setopt(c.FOLLOWLOCATION, True)
+        c.setopt(c.FAILONERROR, True)
+        c.setopt(c.CONNECTTIMEOUT, 10)
+        c.setopt(c.TIMEOUT, 600)
+        c.setopt(c.LOW_SPEED_LIMIT, 1)
+        c.setopt(c.LOW_SPEED_TIME, 10)
+
+        # stream to a file next to dest, so that dest only ever holds a
+        # complete download
+        offset = replay = 0
+        if dest:
+            if restart:
+                # the server refused the resume: download the whole file
+                # again, checking the bytes already hashed are unchanged and
+                # dropping the rest
+                replay = hashed
+            else:
+                offset = part_size(part)
+            try:
+                out = open(part, 'r+b' if replay else 'ab' if offset else 'wb')
+                if replay:
+                    out.truncate(replay)
+            except IOError as e:
+                raise write_failed(dest, part, e)
+            writer = PartWriter(out, part, digest, hashed, replay)
+            if offset:
+                c.setopt(c.RESUME_FROM_LARGE, offset)
+        else:
+            out = writer = BytesIO()
+        c.setopt(c.WRITEDATA, writer)
+
+        error = None
+        try:
+            c.perform()
+        except pycurl.error as e:
+            error = e
+            if e.args and e.args[0] == pycurl.E_HTTP_RETURNED_ERROR:
+                status = c.getinfo(c.RESPONSE_CODE)
+            else:
+                status = None
+        restart = False
+        if dest:
+            out.close()
+            hashed = writer.hashed
+            if writer.changed or (error is None and writer.replay):
+                os.unlink(part)
+                raise DownloadError("Unable to fetch {}: the file changed on the server".format(url))
+        if error is None:
+            break
+
+        if offset and writer.written == 0 and resume_rejected(error, status):
+            # start over, without counting this as a failed attempt
+            restart = True
+            continue
+        if attempt < retries and retryable(error, status):
+            delay = RETRY_DELAY * 2 ** attempt
+            print_warning("Unable to fetch {}: {}, retrying in {}s".format(url, error, delay))
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        # keep whatever was downloaded for a later run to resume
+        if dest and (not retryable(error, status) or not part_size(part)):
+            if os.path.exists(part):
+                os.unlink(part)
+        raise DownloadError("Unable to fetch {}: {}".format(url, error), status)
+
+    if not dest:
+        return out
+    try:
+        os.replace(part, dest)
+    except OSError as e:
+        raise write_failed(dest, part, e)
+    return dest
+
+
+def do_curl_many(downloads, is_fatal=False, max_parallel=MAX_PARALLEL_DOWNLOADS, retries=None):
+    """
+    Perform a curl GET for each `(url, dest)` or `(url, dest, digest)` tuple in `downloads`.
+
+    Up to `max_parallel` transfers run at the same time. Each worker thread
+    keeps one Curl handle for all its transfers, so connections to the same
+    server are reused; pycurl releases the GIL while a transfer is in
+    progress. The
+    results are returned in the order of `downloads`, with the same meaning as
+    the return value of `do_curl`. If `is_fatal` is `True`, the program exits
+    once the running transfers finish if any of them failed.
+    """
+    if not downloads:
+        return []
+
+    local = threading.local()
+    handles = []
+
+    def fetch_job(job):
+        if not hasattr(local, "curl"):
+            local.curl = pycurl.Curl()
+            handles.append(local.curl)
+        digest = job[2] if len(job) > 2 else None
+        return do_curl(job[0], dest=job[1], is_fatal=is_fatal, digest=digest, retries=retries, curl=local.curl)
+
+    try:
+        if max_parallel < 2 or len(downloads) == 1:
+            return [fetch_job(job) for job in downloads]
+
+        workers = min(max_parallel, len(downloads))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # do_curl exits through SystemExit, which is raised again here
+            return list(pool.map(fetch_job, downloads))
     finally:
-        c.close()
+        for handle in handles:
+            handle.close()
+
+
+class DownloadCache(object):
+    """Content-addressed store of upstream downloads shared between packages.
+
+    Files are kept as objects/<sha1[:2]>/<sha1>, and urls/<sha1 of url> holds
+    the sha1 of the file last downloaded from that url. A url record only
+    stands for the file for url_ttl seconds after it was written, as the file
+    behind a url may change. Files are handed out as hardlinks, so they must
+    not be modified in place. The mtime of an object records when it was last
+    used, and the least recently used objects are removed once the cache
+    grows past max_size bytes.
+    """
+
+    def __init__(self, root, max_size=CACHE_SIZE, url_ttl=URL_TTL):
+        """Use the cache kept in root, creating it if needed."""
+        self.root = root
+        self.max_size = max_size
+        self.url_ttl = url_ttl
+        # bytes used by the objects, counted on the first add
+        self.size = None
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "urls"), exist_ok=True)
+
+    def object_path(self, sha1):
+        """Return the path of the cached file with the given sha1."""
+        return os.path.join(self.root, "objects", sha1[:2], sha1)
 
-    # write to dest if specified
-    if dest:
+    def url_path(self, url):
+        """Return the path of the file recording the sha1 of url."""
+        return os.path.join(self.root, "urls", hashlib.sha1(url.encode()).hexdigest())
+
+    def lookup(self, url, sha1=None):
+        """Return the sha1 of a cached file matching sha1 or url, or None.
+
+        The file recorded for url is only used if the record has not expired.
+        """
+        candidates = [sha1] if sha1 else []
+        record = self.url_path(url)
         try:
-            with open(dest, 'wb') as fp:
-                fp.write(buf.getvalue())
-        except IOError as e:
-            if os.path.exists(dest):
-                os.unlink(dest)
-            if is_fatal:
-                print_fatal("Unable to write to {}: {}".format(dest, e))
-                sys.exit(1)
+            if time.time() - os.stat(record).st_mtime < self.url_ttl:
+                with open(record) as f:
+                    candidates.append(f.read().strip())
+        except OSError:
+            pass
+        for candidate in candidates:
+            try:
+                os.stat(self.object_path(candidate))
+            except OSError:
+                continue
+            return candidate
+        return None
+
+    def get(self, url, dest, sha1=None):
+        """Link the cached copy of url, or of sha1, to dest.
+
+        Return the sha1 of the file, or None if it is not cached.
+        """
+        found = self.lookup(url, sha1)
+        if found is None:
             return None
+        obj = self.object_path(found)
+        os.utime(obj)
+        if os.path.lexists(dest):
+            os.unlink(dest)
+        link_file(obj, dest)
+        return found
+
+    def add(self, path, sha1, url=None):
+        """Store the file at path, which has the given sha1, as downloaded from url."""
+        obj = self.object_path(sha1)
+        added = 0
+        try:
+            os.utime(obj)
+        except OSError:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            tmp = "{}.{}.tmp".format(obj, os.getpid())
+            link_file(path, tmp)
+            os.replace(tmp, obj)
+            os.utime(obj)
+            added = os.stat(obj).st_size
+        if url:
+            record = self.url_path(url)
+            tmp = "{}.{}.tmp".format(record, os.getpid())
+            with open(tmp, "w") as f:
+                f.write(sha1 + "\n")
+            os.replace(tmp, record)
+        if not added:
+            return
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.objects())
+        else:
+            self.size += added
+        if self.size > self.max_size:
+            self.evict()
+
+    def objects(self):
+        """Return (mtime, size, path) for every cached file."""
+        objects = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "objects")):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                objects.append((st.st_mtime, st.st_size, path))
+        return objects
 
-    if dest:
-        return dest
-    else:
-        return buf
+    def evict(self):
+        """Remove the least recently used files until the cache fits in max_size."""
+        objects = self.objects()
+        total = sum(size for _, size, _ in objects)
+        for _, size, path in sorted(objects):
+            if total <= self.max_size:
+                break
+            os.unlink(path)
+            total -= size
+        self.size = total
@@ -0,0 +1,467 @@
+#!/bin/true
+#
+# elf.py - part of autospec
+# Copyright (C) 2016 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Read the headers, dynamic section and dynamic symbols of ELF objects
+# without running file, objdump, readelf or nm. What is reported matches
+# what those tools print.
+#
+
+import collections
+import mmap
+import struct
+
+ELFMAG = b"\x7fELF"
+
+ET_REL = 1
+ET_EXEC = 2
+ET_DYN = 3
+ET_CORE = 4
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+SHT_DYNAMIC = 6
+SHT_NOBITS = 8
+SHT_DYNSYM = 11
+SHT_GNU_VERDEF = 0x6ffffffd
+SHT_GNU_VERNEED = 0x6ffffffe
+SHT_GNU_VERSYM = 0x6fffffff
+
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_ABS = 0xfff1
+SHN_COMMON = 0xfff2
+SHN_XINDEX = 0xffff
+
+STB_GLOBAL = 1
+STB_WEAK = 2
+STB_GNU_UNIQUE = 10
+
+STT_OBJECT = 1
+STT_GNU_IFUNC = 10
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_SONAME = 14
+DT_FLAGS_1 = 0x6ffffffb
+
+DF_1_PIE = 0x08000000
+
+VER_FLG_BASE = 0x1
+VERSYM_HIDDEN = 0x8000
+VERSYM_VERSION = 0x7fff
+
+# what file(1) calls each object type
+TYPE_NAMES = {
+    ET_REL: "relocatable",
+    ET_EXEC: "executable",
+    ET_DYN: "shared object",
+    ET_CORE: "core file",
+}
+
+# sections nm names by their name rather than their flags
+SECTION_TYPES = [
+    (".drectve", "i"),
+    (".edata", "e"),
+    (".idata", "i"),
+    (".pdata", "p"),
+]
+
+Section = collections.namedtuple("Section", ["name", "type", "flags", "addr", "offset", "size", "link", "info", "entsize"])
+Segment = collections.namedtuple("Segment", ["type", "offset", "vaddr", "filesz"])
+
+# struct layouts, by ELF class
+LAYOUTS = {
+    1: {
+        "ehdr": "HHIIIIIHHHHHH",
+        "shdr": "IIIIIIIIII",
+        "phdr": "IIIIIIII",
+        "dyn": "iI",
+        "sym": "IIIBBH",
+    },
+    2: {
+        "ehdr": "HHIQQQIHHHHHH",
+        "shdr": "IIQQQQIIQQ",
+        "phdr": "IIQQQQQQ",
+        "dyn": "qQ",
+        "sym": "IBBHQQ",
+    },
+}
+
+
+# Enough for the ELF header of either class
+HEADER_SIZE = 64
+
+
+class ElfError(Exception):
+    """Raised when a file cannot be read as an ELF object."""
+
+
+class NotElfError(ElfError):
+    """Raised for a file that is not an ELF object at all."""
+
+
+class ElfFile(object):
+    """An ELF object, mapped into memory.
+
+    Use as a context manager, or close() it when done. Malformed objects
+    raise ElfError from the methods that read the broken parts.
+    """
+
+    def __init__(self, path, data=None):
+        """Map path and read its ELF header.
+
+        If data is given, it holds the contents of the object and path is
+        only used in messages.
+        """
+        self.path = path
+        self.map = None
+        if data is not None:
+            if data[:4] != ELFMAG:
+                raise NotElfError("{} is not an ELF file".format(path))
+            self.map = data
+        else:
+            with open(path, "rb") as f:
+                if f.read(4) != ELFMAG:
+                    raise NotElfError("{} is not an ELF file".format(path))
+                try:
+                    self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError as e:
+                    raise ElfError("Cannot map {}: {}".format(path, e))
+        try:
+            self._read_header()
+        except ElfError:
+            self.close()
+            raise
+        self._sections = None
+        self._segments = None
+        self._dynamic = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Unmap the file."""
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.map = None
+
+    def _unpack(self, fmt, offset):
+        try:
+            return struct.unpack_from(self.endian + fmt, self.map, offset)
+        except struct.error:
+            raise ElfError("{} is truncated".format(self.path))
+
+    def _read_header(self):
+        if len(self.map) < 16:
+            raise ElfError("{} is truncated".format(self.path))
+        self.elf_class = self.map[4]
+        data = self.map[5]
+        if self.elf_class not in LAYOUTS or data not in (1, 2):
+            # file(1) does not describe these as 32 or 64-bit objects either
+            raise NotElfError("{} has an unknown ELF class or encoding".format(self.path))
+        self.little_endian = data == 1
+        self.endian = "<" if self.little_endian else ">"
+        self.layout = LAYOUTS[self.elf_class]
+        (self.type, self.machine, _, _, self.phoff, self.shoff, _, _,
+         self.phentsize, self.phnum, self.shentsize, self.shnum, self.shstrndx) = self._unpack(self.layout["ehdr"], 16)
+
+    def describe(self):
+        """Return the start of what file(1) prints for this object."""
+        kind = TYPE_NAMES.get(self.type, "unknown type")
+        if self.type == ET_DYN:
+            try:
+                if self.flags_1() & DF_1_PIE:
+                    kind = "pie executable"
+            except ElfError:
+                pass
+        return "ELF {}-bit {} {},".format(32 * self.elf_class, "LSB" if self.little_endian else "MSB", kind)
+
+    def string(self, offset):
+        """Return the NUL terminated string at offset."""
+        if offset < 0 or offset >= len(self.map):
+            raise ElfError("{} has a string outside the file".format(self.path))
+        end = self.map.find(b"\0", offset)
+        if end < 0:
+            end = len(self.map)
+        return self.map[offset:end].decode("utf-8", "replace")
+
+    def sections(self):
+        """Return the section headers, named."""
+        if self._sections is not None:
+            return self._sections
+        headers = []
+        names = None
+        if self.shoff:
+            fmt = self.layout["shdr"]
+            size = struct.calcsize(fmt)
+            first = self._unpack(fmt, self.shoff)
+            # counts too large for the ELF header are kept in section 0
+            shnum = self.shnum or first[5]
+            shstrndx = first[6] if self.shstrndx == SHN_XINDEX else self.shstrndx
+            for idx in range(shnum):
+                headers.append(self._unpack(fmt, self.shoff + idx * (self.shentsize or size)))
+            names = headers[shstrndx][4] if shstrndx < len(headers) else None
+        sections = []
+        for header in headers:
+            name, stype, flags, addr, offset, size, link, info, _, entsize = header
+            name = self.string(names + name) if names is not None else ""
+            sections.append(Section(name, stype, flags, addr, offset, size, link, info, entsize))
+        self._sections = sections
+        return sections
+
+    def segments(self):
+        """Return the program headers."""
+        if self._segments is not None:
+            return self._segments
+        fmt = self.layout["phdr"]
+        segments = []
+        for idx in range(self.phnum if self.phoff else 0):
+            header = self._unpack(fmt, self.phoff + idx * (self.phentsize or struct.calcsize(fmt)))
+            if self.elf_class == 1:
+                ptype, offset, vaddr, _, filesz = header[:5]
+            else:
+                ptype, _, offset, vaddr, _, filesz = header[:6]
+            segments.append(Segment(ptype, offset, vaddr, filesz))
+        self._segments = segments
+        return segments
+
+    def vaddr_offset(self, vaddr):
+        """Return the file offset vaddr is loaded from, or None."""
+        for seg in self.segments():
+            if seg.type == PT_LOAD and seg.vaddr <= vaddr < seg.vaddr + seg.filesz:
+                return seg.offset + vaddr - seg.vaddr
+        return None
+
+    def dynamic(self):
+        """Return the (tag, value) entries of the dynamic section, as readelf -d lists them."""
+        if self._dynamic is not None:
+            return self._dynamic
+        offset = size = None
+        for seg in self.segments():
+            if seg.type == PT_DYNAMIC:
+                offset, size = seg.offset, seg.filesz
+                break
+        else:
+            for sec in self.sections():
+                if sec.type == SHT_DYNAMIC:
+                    offset, size = sec.offset, sec.size
+                    break
+        entries = []
+        if offset is not None:
+            fmt = self.layout["dyn"]
+            entsize = struct.calcsize(fmt)
+            for pos in range(offset, offset + size - entsize + 1, entsize):
+                tag, val = self._unpack(fmt, pos)
+                if tag == DT_NULL:
+                    break
+                entries.append((tag, val))
+        self._dynamic = entries
+        return entries
+
+    def dynamic_strings(self):
+        """Return the file offset of the string table the dynamic section uses."""
+        for tag, val in self.dynamic():
+            if tag == DT_STRTAB:
+                offset = self.vaddr_offset(val)
+                if offset is not None:
+                    return offset
+        sections = self.sections()
+        for sec in sections:
+            if sec.type == SHT_DYNAMIC and sec.link < len(sections):
+                return sections[sec.link].offset
+        raise ElfError("{} has no dynamic string table".format(self.path))
+
+    def dynamic_values(self, wanted):
+        """Return the strings of the dynamic entries tagged wanted."""
+        entries = [val for tag, val in self.dynamic() if tag == wanted]
+        if not entries:
+            return []
+        strtab = self.dynamic_strings()
+        return [self.string(strtab + val) for val in entries]
+
+    def soname(self):
+        """Return the SONAME, or None."""
+        names = self.dynamic_values(DT_SONAME)
+        return names[0] if names else None
+
+    def needed(self):
+        """Return the NEEDED shared libraries, in order."""
+        return self.dynamic_values(DT_NEEDED)
+
+    def flags_1(self):
+        """Return the DT_FLAGS_1 value, 0 when there is none."""
+        for tag, val in self.dynamic():
+            if tag == DT_FLAGS_1:
+                return val
+        return 0
+
+    def _versions(self, dynsym):
+        """Return the version of each dynamic symbol, and the version names.
+
+        The names are a (defined, needed) pair of dicts from version index to
+        (flags, name), and None when there are no version definitions or
+        requirements.
+        """
+        sections = self.sections()
+        versym = verdef = verneed = None
+        for sec in sections:
+            if sec.type == SHT_GNU_VERSYM:
+                versym = sec
+            elif sec.type == SHT_GNU_VERDEF:
+                verdef = sec
+            elif sec.type == SHT_GNU_VERNEED:
+                verneed = sec
+        if versym is None or (verdef is None and verneed is None):
+            return None, None
+        count = dynsym.size // dynsym.entsize
+        if versym.size < count * 2:
+            raise ElfError("{} has a truncated version table".format(self.path))
+        versions = self._unpack("{}H".format(count), versym.offset)
+
+        defined = {}
+        if verdef is not None and verdef.link < len(sections):
+            strtab = sections[verdef.link].offset
+            pos = verdef.offset
+            for _ in range(verdef.info):
+                _, flags, ndx, cnt, _, aux, nxt = self._unpack("HHHHIII", pos)
+                name = None
+                if cnt:
+                    name = self.string(strtab + self._unpack("I", pos + aux)[0])
+                defined[ndx & VERSYM_VERSION] = (flags, name)
+                if not nxt:
+                    break
+                pos += nxt
+        needed = {}
+        if verneed is not None and verneed.link < len(sections):
+            strtab = sections[verneed.link].offset
+            pos = verneed.offset
+            for _ in range(verneed.info):
+                _, cnt, _, aux, nxt = self._unpack("HHIII", pos)
+                apos = pos + aux
+                for _ in range(cnt):
+                    _, _, other, name, anxt = self._unpack("IHHII", apos)
+                    needed[other] = self.string(strtab + name)
+                    if not anxt:
+                        break
+                    apos += anxt
+                if not nxt:
+                    break
+                pos += nxt
+        return versions, (defined, needed)
+
+    def _version_suffix(self, name, version, names):
+        """Return the @VERSION or @@VERSION nm appends to a defined symbol."""
+        defined, needed = names
+        hidden = bool(version & VERSYM_HIDDEN)
+        version &= VERSYM_VERSION
+        cverdefs = max(defined) if defined else 0
+        if version == 0:
+            return ""
+        if version == 1 and (cverdefs < 1 or defined.get(1, (0, None))[0] == VER_FLG_BASE):
+            return ""
+        if version <= cverdefs:
+            nodename = defined.get(version, (0, None))[1]
+            if nodename is None or nodename == name:
+                return ""
+        else:
+            nodename = needed.get(version, "<corrupt>")
+            hidden = True
+        return ("@" if hidden else "@@") + nodename
+
+    def _symbol_type(self, sym_type, bind, shndx, sections):
+        """Return the letter nm prints for a defined external symbol."""
+        if shndx == SHN_COMMON:
+            return "C"
+        if sym_type == STT_GNU_IFUNC:
+            return "i"
+        if bind == STB_WEAK:
+            return "V" if sym_type == STT_OBJECT else "W"
+        if bind == STB_GNU_UNIQUE:
+            return "u"
+        if shndx == SHN_ABS or shndx >= SHN_LORESERVE or shndx >= len(sections):
+            return "A"
+        sec = sections[shndx]
+        for prefix, letter in SECTION_TYPES:
+            if sec.name.startswith(prefix):
+                return letter.upper()
+        if sec.flags & SHF_EXECINSTR:
+            return "T"
+        if sec.flags & SHF_ALLOC and sec.type != SHT_NOBITS:
+            return "D" if sec.flags & SHF_WRITE else "R"
+        if sec.type == SHT_NOBITS:
+            return "B"
+        return "N"
+
+    def dynamic_symbols(self):
+        """Return the defined external dynamic symbols as (name, type) pairs.
+
+        This is what nm --defined-only -g --dynamic lists: names carry their
+        symbol version, and types are nm's letters.
+        """
+        sections = self.sections()
+        dynsym = None
+        for sec in sections:
+            if sec.type == SHT_DYNSYM:
+                dynsym = sec
+                break
+        if dynsym is None or not dynsym.entsize or dynsym.link >= len(sections):
+            return []
+        strtab = sections[dynsym.link].offset
+        versions, names = self._versions(dynsym)
+        fmt = self.layout["sym"]
+        symbols = []
+        # entry 0 is the reserved null symbol
+        for idx in range(1, dynsym.size // dynsym.entsize):
+            entry = self._unpack(fmt, dynsym.offset + idx * dynsym.entsize)
+            if self.elf_class == 1:
+                st_name, _, _, info, _, shndx = entry
+            else:
+                st_name, info, _, shndx, _, _ = entry
+            bind = info >> 4
+            if shndx == SHN_UNDEF or bind not in (STB_GLOBAL, STB_WEAK, STB_GNU_UNIQUE):
+                continue
+            name = self.string(strtab + st_name)
+            if versions is not None:
+                name += self._version_suffix(name, versions[idx], names)
+            symbols.append((name, self._symbol_type(info & 0xf, bind, shndx, sections)))
+        return symbols
+
+
+def describe_file(path):
+    """Return the start of what file(1) prints for the ELF object at path.
+
+    Raise NotElfError if path is not an ELF object. Only the ELF header is
+    read, except for shared objects, whose dynamic section tells whether
+    they are position independent executables.
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    obj = ElfFile(path, header)
+    if obj.type != ET_DYN:
+        return obj.describe()
+    with ElfFile(path) as obj:
+        return obj.describe()
@@ -30,6 +30,147 @@ from typing import List, Tuple
 from util import call, write_out, print_fatal, print_debug, print_info, scantree
 import sys
 
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+# Patterns for files kept in 32bit_only packages, see only32bit_exclude
+ONLY32BIT_PATTERNS = [
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
+    re.compile(r"^/(usr/|usr.*)lib32/cmake/"),
+    re.compile(r"^/(usr/|usr.*)lib32/qt5/mkspecs/"),
+    re.compile(r"^/(usr/|usr.*)lib32/qt5/"),
+    re.compile(r"^/(usr/|usr.*)lib32/libkdeinit5_[a-zA-Z0-9\.\_\+\-]*\.so$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib32/pkgconfig/[a-zA-Z0-9\.\_\+\-]*\.pc$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.la$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.prl$"),
+    re.compile(r"^/(usr/|usr.*)lib32/.*/[a-zA-Z0-9\.\_\+\-]*\.so"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$"),
+    re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$")]
+
+# Patterns for files kept in compat packages, see compat_exclude
+COMPAT_PATTERNS = [
+    re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib64/lib(asm|dw|elf)-[0-9.]+\.so"),
+    re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
+    re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)share/package-licenses/"),
+    re.compile(r"^/usr/share/locale/.*/(.*)\.mo")]
+
+COMPAT_STATIC_PATTERNS = [
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$")]
+
+AUTOSTART_PATTERN = re.compile(r"^/(usr/|usr.*)lib/systemd/system/.+\.target\.wants/.+")
+LOCALE_PATTERN = re.compile(r"^/usr/share/locale/.*/(.*)\.mo")
+
+
+def literal_prefix(pattern):
+    """Return the literal text every match of an anchored pattern starts with.
+
+    Unanchored patterns can match anywhere, so their prefix is empty.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return ""
+    items = list(parsed)
+    if not items or items[0] != (sre_parse.AT, sre_parse.AT_BEGINNING):
+        return ""
+
+    prefix = []
+    for op, arg in items[1:]:
+        if op is sre_parse.LITERAL:
+            prefix.append(chr(arg))
+            continue
+        if op is sre_parse.SUBPATTERN and not arg[1] & re.IGNORECASE:
+            # a group is mandatory, so its own leading literals count too
+            for sub_op, sub_arg in arg[-1]:
+                if sub_op is not sre_parse.LITERAL:
+                    break
+                prefix.append(chr(sub_arg))
+        break
+    return "".join(prefix)
+
+
+class FileClassifier(object):
+    """Find the first file rule matching a path.
+
+    Rules are bucketed in a trie by the literal prefix of their pattern, so
+    only rules whose prefix the path starts with are considered. Each distinct
+    set of candidate rules is compiled into a single regex, with one named
+    alternative per rule in rule order, which makes the first alternative
+    that matches the first matching rule.
+    """
+
+    def __init__(self, rules):
+        """Normalize and index rules, as returned by FileManager.file_rules."""
+        self.rules = []
+        self.trie = {}
+        self.combined = {}
+        for idx, rule in enumerate(rules):
+            rule = tuple(rule) + ("", "", False)[len(rule) - 2:]
+            self.rules.append(rule)
+            node = self.trie
+            for char in literal_prefix(rule[0]):
+                node = node.setdefault(char, {})
+            node.setdefault("", []).append(idx)
+
+    def _candidates(self, filename):
+        """Return the indices of the rules whose prefix filename starts with."""
+        node = self.trie
+        found = list(node.get("", []))
+        for char in filename:
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend(node.get("", []))
+        return tuple(sorted(found))
+
+    def _compile(self, candidates):
+        """Compile the candidate rules into one alternation."""
+        alternatives = []
+        for idx in candidates:
+            pattern = self.rules[idx][0]
+            if not pattern.startswith("^"):
+                # re.search semantics for unanchored patterns
+                pattern = "(?s:.*?)" + pattern
+            alternatives.append("(?P<r{}>{})".format(idx, pattern))
+        try:
+            return re.compile("|".join(alternatives))
+        except re.error:
+            return None
+
+    def classify(self, filename):
+        """Return the first rule matching filename, or None."""
+        candidates = self._candidates(filename)
+        if not candidates:
+            return None
+        if candidates not in self.combined:
+            self.combined[candidates] = self._compile(candidates)
+        combined = self.combined[candidates]
+        if combined is None:
+            # patterns that cannot be combined are tried one at a time
+            for idx in candidates:
+                if re.search(self.rules[idx][0], filename):
+                    return self.rules[idx]
+            return None
+        match = combined.match(filename)
+        if not match:
+            return None
+        return self.rules[int(match.lastgroup[1:])]
+
+
 class FileManager(object):
     """Class to handle spec file %files section management."""
 
@@ -58,6 +199,12 @@ class FileManager(object):
         self.mock_dir : str = mock_dir
         self.short_circuit : str = short_circuit
         self.package_name : str = str()
+        self.file_classifier = None
+        self.file_classifier_key = None
+        # %files entry -> {(<-n subpackage>, <package>): True}, in the order added
+        self.file_index = {}
+        # new %files entries seen by the current push_files batch
+        self.batch_new_files = None
 
     @staticmethod
     def banned_path(path):
@@ -74,6 +221,21 @@ class FileManager(object):
                 return True
         return False
 
+    def count_new_files(self, count):
+        """Record new %files content and indicate that the build must restart."""
+        if self.batch_new_files is not None:
+            self.batch_new_files += count
+            return
+        if not count:
+            return
+        if self.package.do_file_restart:
+            self.package.file_restart += count
+        else:
+            self.package.must_restart += count
+        if not self.newfiles_printed:
+            print("  New %files content found")
+            self.newfiles_printed = True
+
     def push_package_file(self, filename, package="main", subpackage=False):
         """Add found %file and indicate to build module that we must restart the build."""
 
@@ -93,13 +255,8 @@ class FileManager(object):
                 g = self.attrs[filename][2]
                 filename = "%attr({0},{1},{2}) {3}".format(mod, u, g, filename)
             self.packages[package].add(filename)
-            if self.package.do_file_restart:
-                self.package.file_restart += 1
-            else:
-                self.package.must_restart += 1
-            if not self.newfiles_printed:
-                print("  New %files content found")
-                self.newfiles_printed = True
+            self.file_index.setdefault(filename, {})[(False, package)] = True
+            self.count_new_files(1)
 
         else:
             if package not in self.subpackages:
@@ -117,38 +274,16 @@ class FileManager(object):
                 g = self.attrs[filename][2]
                 filename = "%attr({0},{1},{2}) {3}".format(mod, u, g, filename)
             self.subpackages[package].add(filename)
-            if self.package.do_file_restart:
-                self.package.file_restart += 1
-            else:
-                self.package.must_restart += 1
-            if not self.newfiles_printed:
-                print("  New %files content found")
-                self.newfiles_printed = True
+            self.file_index.setdefault(filename, {})[(True, package)] = True
+            self.count_new_files(1)
 
     def only32bit_exclude(self, filename):
         """Exclude files not necessary for a 32bit only package."""
         if not self.config.config_opts.get("32bit_only"):
             return False
 
-        patterns = [
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
-            re.compile(r"^/(usr/|usr.*)lib32/cmake/"),
-            re.compile(r"^/(usr/|usr.*)lib32/qt5/mkspecs/"),
-            re.compile(r"^/(usr/|usr.*)lib32/qt5/"),
-            re.compile(r"^/(usr/|usr.*)lib32/libkdeinit5_[a-zA-Z0-9\.\_\+\-]*\.so$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
-            re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
-            re.compile(r"^/(usr/|usr.*)lib32/pkgconfig/[a-zA-Z0-9\.\_\+\-]*\.pc$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.la$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.prl$"),
-            re.compile(r"^/(usr/|usr.*)lib32/.*/[a-zA-Z0-9\.\_\+\-]*\.so"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$"),
-            re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$")]
-
         exclude = True
-        for pat in patterns:
+        for pat in ONLY32BIT_PATTERNS:
             if pat.search(filename):
                 exclude = False
                 break
@@ -160,30 +295,14 @@ class FileManager(object):
         if not self.config.config_opts.get("compat"):
             return False
 
-        patterns = [
-            re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib64/lib(asm|dw|elf)-[0-9.]+\.so"),
-            re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
-            re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)share/package-licenses/"),
-            re.compile(r"^/usr/share/locale/.*/(.*)\.mo")]
-
         exclude = True
-        for pat in patterns:
+        for pat in COMPAT_PATTERNS:
             if pat.search(filename):
                 exclude = False
                 break
 
         if self.config.config_opts.get("keepstatic"):
-            patterns_static = [
-                re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
-                re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
-                re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
-                re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$")]
-
-            for pat in patterns_static:
+            for pat in COMPAT_STATIC_PATTERNS:
                 if pat.search(filename):
                     exclude = False
                     break
@@ -223,8 +342,7 @@ class FileManager(object):
 
     def file_is_locale(self, filename):
         """If a file is a locale, appends to self.locales and returns True, returns False otherwise."""
-        pat = re.compile(r"^/usr/share/locale/.*/(.*)\.mo")
-        match = pat.search(filename)
+        match = LOCALE_PATTERN.search(filename)
         if match:
             if self.config.config_opts["exclude_locales"]:
                 self.excludes.append(filename)
@@ -244,8 +362,12 @@ class FileManager(object):
         else:
             return False
 
-    def _clean_dirs(self, root, files):
-        """Do the work to remove the directories from the files list."""
+    def _clean_dirs(self, root, files, dirs):
+        """Do the work to remove the directories from the files list.
+
+        dirs is the util.scandirs snapshot of root. Entries below a directory
+        the snapshot did not descend into (a symlink) are checked on disk.
+        """
         res = set()
         removed = False
 
@@ -261,10 +383,18 @@ class FileManager(object):
                 res.add(f)
                 continue
 
-            path = os.path.join(root, f.lstrip("/"))
-            if os.path.isdir(path) and not os.path.islink(path):
+            name = os.path.normpath("/" + f.lstrip("/"))
+            if name in dirs:
+                is_dir = True
+            elif os.path.dirname(name) == "/" or os.path.dirname(name) in dirs:
+                is_dir = False
+            else:
+                path = os.path.join(root, f.lstrip("/"))
+                is_dir = os.path.isdir(path) and not os.path.islink(path)
+            if is_dir:
                 util.print_warning("Removing directory {} from file list".format(f))
                 self.files_blacklist.add(f)
+                self.file_index.pop(f, None)
                 removed = True
             else:
                 res.add(f)
@@ -274,13 +404,14 @@ class FileManager(object):
     def clean_directories(self, root):
         """Remove directories from file list."""
         removed = False
+        dirs = util.scandirs(root)
         for pkg in self.packages:
-            self.packages[pkg], _rem = self._clean_dirs(root, self.packages[pkg])
+            self.packages[pkg], _rem = self._clean_dirs(root, self.packages[pkg], dirs)
             if _rem:
                 removed = True
 
         for pkg in self.subpackages:
-            self.subpackages[pkg], _rem = self._clean_dirs(root, self.subpackages[pkg])
+            self.subpackages[pkg], _rem = self._clean_dirs(root, self.subpackages[pkg], dirs)
             if _rem:
                 removed = True
 
@@ -292,6 +423,32 @@ class FileManager(object):
             return
 
         self.files.add(filename)
+        self.place_file(filename, self.get_file_classifier(pkg_name))
+
+    def push_files(self, filenames, pkg_name):
+        """Push a batch of filenames, as push_file does for each of them.
+
+        Files already known are dropped from the batch up front, the file rules
+        are looked up once and the restart counters are updated once.
+        """
+        filenames = list(dict.fromkeys(filenames))
+        fresh = set(filenames) - self.files - self.files_blacklist
+        if not fresh:
+            return
+        batch = [filename for filename in filenames if filename in fresh]
+        self.files.update(fresh)
+        classifier = self.get_file_classifier(pkg_name)
+        self.batch_new_files = 0
+        try:
+            for filename in batch:
+                self.place_file(filename, classifier)
+        finally:
+            count = self.batch_new_files
+            self.batch_new_files = None
+            self.count_new_files(count)
+
+    def place_file(self, filename, classifier):
+        """Find the package for a new filename and push it there."""
         if self.file_is_locale(filename):
             return
 
@@ -307,16 +464,46 @@ class FileManager(object):
             return
 
         # autostart
-        part = re.compile(r"^/(usr/|usr.*)lib/systemd/system/.+\.target\.wants/.+")
-        if part.search(filename) and 'update-triggers.target.wants' not in filename:
+        if AUTOSTART_PATTERN.search(filename) and 'update-triggers.target.wants' not in filename:
             if filename not in self.excludes:
                 self.push_package_file(filename, "autostart")
                 self.push_package_file("%exclude " + filename, "services")
                 return
 
-        if self.want_dev_split and self.file_pat_match(filename, r"^/usr/.*/include/.*\.(h|hpp)$", "dev"):
+        # compat and 32bit_only exclusions apply whichever pattern matches
+        if self.compat_exclude(filename) or self.only32bit_exclude(filename):
+            self.excludes.append(filename)
             return
 
+        rule = classifier.classify(filename)
+        if filename in self.excludes:
+            return
+
+        if rule:
+            _, package, replacement, prefix, subpackage = rule
+            self.push_package_file(replacement or prefix + filename, package, subpackage)
+            return
+
+        self.push_package_file(filename)
+
+    def get_file_classifier(self, pkg_name):
+        """Return the FileClassifier for the current file rules, building it as needed."""
+        key = (pkg_name, self.package_name, self.want_dev_split, bool(self.config.config_opts.get('so_to_lib')))
+        if self.file_classifier is None or self.file_classifier_key != key:
+            self.file_classifier = FileClassifier(self.file_rules(pkg_name))
+            self.file_classifier_key = key
+        return self.file_classifier
+
+    def file_rules(self, pkg_name):
+        """Return the ordered file pattern rules used by push_file.
+
+        Rules are tuples as follows, and the first matching rule wins:
+        (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
+        """
+        rules = []
+        if self.want_dev_split:
+            rules.append((r"^/usr/.*/include/.*\.(h|hpp)$", "dev"))
+
         # if configured to do so, add .so files to the lib package instead of
         # the dev package. THis is useful for packages with a plugin
         # architecture like elfutils and mesa.
@@ -453,156 +640,10 @@ class FileManager(object):
             # locale data gets picked up via file_is_locale
             (r"^/(usr/|usr.*)share/locale/", "ignore")]
 
-        if self.package_name == "gcc":
-            patterns_gcc = [
-                # Patterns for matching files, format is a tuple as follows:
-                # (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
-                # order matters, first match wins!
-                (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
-                (r"^/usr/lib64/[a-zA-Z0-9\.\_\+\-]*\.[ao]$", "main"),
-                (r"^/usr/(?:bin/(?:x86_64\-generic\-linux\-(?:g(?:cc(?:\-(?:ranlib|11|nm|ar))?|fortran|\+\+)|c\+\+)|gcc\-ranlib|gcov\-tool|lto\-dump|gfortran|gcc\-nm|gcc\-ar|gc(?:ov|c)|f95|c(?:pp|c)|[cg]\+\+)|lib\/cpp)$", "main"),
-                (r"^/usr/share/gcc-11/[a-zA-Z0-9\.\_\+\-\/]*", "main"),
-                (r"^/usr/lib64/libcc1[a-zA-Z0-9\.\_\+\-\/]*", "main"),
-                (r"^/usr/lib64/gcc/x86_64-generic-linux/11/plugin/[a-zA-Z0-9\.\_\+\-]*\.so[0-9\.]*", "main"),
-                (r"^/usr/lib64/gcc/x86_64\-generic\-linux/11/(?:plugin/include|in(?:stall\-tools|clude(?:\-fixed)?))/[a-zA-Z0-9\.\_\+\-\/]*", "main"),
-                (r"^/usr/lib64/gcc/x86_64\-generic\-linux/11/(?:l(?:iblto_plugin\.so\.0\.0\.0|to(?:\-wrapper|1))|liblto_plugin\.so(?:\.0)?|plugin/gtype\.state|f(?:include|951)|c(?:ollect2|c1(?:plus)?))", "main"),
-                (r"^/usr/lib64/gcc/x86_64-generic-linux/11/libcaf_[a-zA-Z0-9\.\_\+\-]*", "main"),
-
-                (r"^/usr/lib64/gcc/x86_64\-generic\-linux/11/(?:plugin/gengtype|crt(?:fastmath|begin[ST]|prec(?:64|80|32)|begin|endS?)\.o|include/ssp/|libgc(?:c(?:_eh)?|ov)\.a)", "dev"),
-                (r"^/usr/include/c\+\+/*[a-zA-Z0-9\.\_\+\-\/]*", "dev"),
-                (r"^/usr/bin/gcov-dump$", "dev"),
-                (r"^/usr/share/gdb/auto-load/usr/lib64/libstdc\+\+\.so[a-zA-Z0-9\.\_\+\-]*", "dev"),
-                (r"^/usr/lib64/libssp[a-zA-Z0-9\.\_\+\-]*\.a$", "dev"),
-                (r"^/usr/lib64/lib(?:g(?:fortran\.s(?:pec|o)|omp\.(?:spec|a))|quadmath\.so|s(?:tdc\+\+(?:fs)?|upc\+\+)\.a|stdc\+\+\.so|(?:atomic|gcc_s)\.so|itm\.s(?:pec|o))$", "dev"),
-
-                (r"^/usr/lib32/(?:lib(?:sanitizer\.spec|(?:g(?:fortran|omp)|itm)\.spec|caf_single\.a|g(?:fortran|omp)\.(?:so|a)|quadmath\.(?:so|a)|(?:s(?:tdc\+\+fs|upc\+\+)|gc(?:c_eh|ov))\.a|stdc\+\+\.(?:so|a)|(?:atomic|ubsan|asan|ssp)\.(?:so|a)|itm\.(?:so|a)|gcc\.a)|crt(?:fastmath|(?:(?:begin[ST]|prec(?:32|64|80)|endS)|(?:begin|end)))\.o)$", "dev32"),
-                (r"^/usr/lib64/gcc/x86_64-generic-linux/11/32/[a-zA-Z0-9\.\_\+\-\/]*", "dev32"),
-                (r"^/usr/share/gdb/auto-load/usr/lib32/libstdc\+\+\.so[a-zA-Z0-9\.\_\+\-]*", "dev32"),
-                (r"^/usr/lib32/libgo(?:(?:lib)?begin)?\.a", "dev32"),
-
-                (r"^/usr/lib64/libgcc_s\.so\.1$", "libgcc1", "", "", True),
-
-                (r"^/usr/lib64/lib(?:g(?:fortran|omp)|quadmath|atomic|itm|ssp)[a-zA-Z0-9\_\+\-]*\.so[a-zA-Z0-9\.\_\+\-]+", "libs-math"),
-                (r"^/usr/lib64/haswell/lib(?:g(?:fortran|omp)|quadmath|atomic|itm|ssp)[a-zA-Z0-9\_\+\-]*\.so[a-zA-Z0-9\.\_\+\-]+", "libs-math"),
-
-                (r"^/usr/lib32/lib(?:ssp_nonshared\.a|asan_preinit\.o)$", "libgcc32"),
-                (r"^/usr/lib32/libgcc_s.so[a-zA-Z0-9\.\_\+\-]*", "libgcc32"),
-                (r"^/usr/lib32/lib(?:quadmath|(?:gfortr|ubs)an|a(?:tomic|san)|gomp|itm|ssp)\.so\.[a-zA-Z0-9\.\_\+\-]*", "libgcc32"),
-
-                (r"^/usr/lib64/libstdc\+\+\.so\.[a-zA-Z0-9\.\_\+\-]*", "libstdc++", "", "", True),
-
-                (r"^/usr/lib32/libstdc\+\+\.so\.[a-zA-Z0-9\.\_\+\-]*", "libstdc++32"),
-
-                (r"^/usr/libexec/gccgo/bin/[a-zA-Z0-9\.\_\+\-\/]*", "go"),
-                (r"^/usr/(?:lib64/(?:gcc/x86_64\-generic\-linux/11/(?:test2json|buildid|vet|go1)|gcc/x86_64\-generic\-linux/11/cgo|libgo(?:(?:lib)?begin)?\.a|libgo\.so)|bin\/(?:x86_64\-generic\-linux\-)?gccgo)", "go"),
-
-                (r"^/usr/lib64/libgo\.so\.[0-9\.]*", "go-lib"),
-                (r"^/usr/lib64/go/11/x86_64-generic-linux/[a-zA-Z0-9\.\_\+\-\/]*\.gox$", "go-lib"),
-
-                (r"^/usr/lib64/lib(?:sanit|ubsan|[alt]san)[a-zA-Z0-9\.\_\+\-\/]*", "libubsan"),
-
-                (r"^/usr/share/man/man\d/[a-zA-Z0-9\.\_\+\-]*\.\d$", "doc"),
-                (r"^/usr/share/info/[a-zA-Z0-9\.\_\+\-\/]*\.info$", "doc")]
-            for pat_args in patterns_gcc:
-                if self.file_pat_match(filename, *pat_args):
-                    return
-
-        if self.package_name == "db":
-            patterns_db = [
-                # Patterns for matching files, format is a tuple as follows:
-                # (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
-                # order matters, first match wins!
-                (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
-                (r"/usr/lib64/libdb_cxx(?:\-5\.(?:3\.)?|\.)so", "cxx")]
-            for pat_args in patterns_db:
-                if self.file_pat_match(filename, *pat_args):
-                    return
-
-        if self.package_name == "nss":
-            patterns_nss = [
-                # Patterns for matching files, format is a tuple as follows:
-                # (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
-                # order matters, first match wins!
-                (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
-                (r"/usr/lib64/lib(?:(?:softokn|freebl)3\.chk|(?:softokn|freebl)3\.so|nss(?:dbm3\.(?:chk|so)|(?:util)?3\.so)|s(?:mime|sl)3\.so)", "lib"),
-                (r"/usr/lib32/lib(?:(?:softokn|freebl)3\.chk|(?:softokn|freebl)3\.so|nss(?:dbm3\.(?:chk|so)|(?:util)?3\.so)|s(?:mime|sl)3\.so)", "lib32")]
-            for pat_args in patterns_nss:
-                if self.file_pat_match(filename, *pat_args):
-                    return
-
-        if self.package_name == "ncurses":
-            patterns_ncurses = [
-                # Patterns for matching files, format is a tuple as follows:
-                # (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
-                # order matters, first match wins!
-                (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
-                (r"^/usr/lib64/libncurses\+\+w?\.so\.6(?:\.2)?$", "lib-plusplus"),
-                (r"^/usr/lib64/lib(?:ncurses\.so\.6(?:\.2)?|(?:panel|tinfo|form|menu)\.so\.6(?:\.2)?)$", "lib-narrow"),
-                (r"^/usr/share/man.*$", "docs"),
-                (r"^/usr/share/terminfo/i/ibm.*$", "data-rare")]
-            for pat_args in patterns_ncurses:
-                if self.file_pat_match(filename, *pat_args):
-                    return
-
-        if self.package_name == "glibc":
-            patterns_glibc = [
-                # Patterns for matching files, format is a tuple as follows:
-                # (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
-                # order matters, first match wins!
-                (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
-                (r"^/usr/bin/(?:catchsegv|sln)$", "bin"),
-                (r"^/usr/bin/nscd$", "nscd"),
-                (r"^/usr/lib64/libnss_(?:(?:compat|files|d(?:ns|b))(?:\-2\.33\.9000\.so|\.so(?:\.2)?)|hesiod(?:\-2\.33\.9000\.so|\.so(?:\.2)?))$", "extras"),
-                (r"^/usr/bin/(?:pcprofiledump|iconvconfig|tzselect|sotruss|ge(?:t(?:conf|ent)|ncat)|rpcgen|xtrace|l(?:ocale|dd)|iconv|zdump|sprof|pldd|zic)$", "utils"),
-                (r"^/usr/share/locale/(?:en_US|C)\.UTF\-8/[a-zA-Z0-9\.\_\+\-\/]*", "libc6", "", "", True),
-                (r"^/usr/lib64/audit/sotruss-lib\.so$", "libc6", "", "", True),
-                (r"^/usr/lib64/gconv/[a-zA-Z0-9\.\_\+\-\/]*", "libc6", "", "", True),
-                (r"^/usr/lib64/glibc/getconf/[a-zA-Z0-9\.\_\+\-\/]*", "libc6", "", "", True),
-                (r"^/usr/lib64/l(?:ib(?:BrokenLocale\-|(?:(?:nss_(?:(?:compat|files|d(?:ns|b))|hesiod)\-|pthread\-|resolv\-|m(?:vec)?\-|dl\-|c\-)|(?:(?:cryp|r)t|util|nsl|anl)\-))2\.33\.90{3}\.so|ib(?:BrokenLocale\.so\.1|thread_db\.so\.1|pthread\.so\.0|(?:(?:cryp|r)t|util|nsl|anl)\.so\.1|mvec\.so\.1|[cm]\.so\.6)|d\-(?:linux\-x86\-64\.so\.2|2\.33\.90{3}\.so)|ib(?:thread_db\-1\.0|pcprofile|SegFault|memusage)\.so|ibnss_(?:(?:compat|files|d(?:ns|b))|hesiod)\.so\.2|ib(?:nss_(?:(?:compat|files|d(?:ns|b))|hesiod)\.so|mvec\.so)|ib(?:resolv|dl)\.so\.2)$", "libc6", "", "", True),
-                (r"^/usr/lib64/haswel{2}/libm(?:\-2\.3{2}\.90{3}\.so|\.so\.6)$", "libc6", "", "", True),
-                (r"^/usr/share/defaults/etc/rpc$", "libc6-dev", "", "", True),
-                (r"^/usr/bin/ldconfig$", "libc6", "", "", True),
-                (r"^/usr/lib64/haswel{2}/lib(?:c(?:rypt(?:\-2\.3{2}\.90{3}\.so|\.so\.1)|(?:\-2\.3{2}\.90{3}\.so|\.so\.6))|mvec(?:\-2\.3{2}\.90{3}\.so|\.so\.1))$", "lib-avx2"),
-                (r"^/usr/share/locale/[a-zA-Z0-9\.\_\+\-\/]*", "locale"),
-                (r"^/usr/share/i18n/[a-zA-Z0-9\.\_\+\-\/]*", "locale"),
-                (r"^/usr/bin/localedef$", "locale"),
-                (r"^/usr/lib64/(?:[MSg]crt1|crt[1in])\.o$", "dev"),
-                (r"^/usr/lib64/lib(?:BrokenLocale\.so|c(?:_nonshared\.a|\.so)|(?:nss_hesiod|ns(?:s_(?:file|dn)s|l)|thread_db|pthread|r(?:esolv|t)|crypt|util|(?:an|d)l|m)\.so)$", "dev"),
-                (r"^/usr/lib32/[a-zA-Z0-9\.\_\+\-]*\.[ao]$", "dev32"),
-                (r"^/usr/lib32/[a-zA-Z0-9\.\_\+\-]*\.so$", "libc32"),
-                (r"^/usr/lib/ld-linux.so.2$", "libc32"),
-                (r"^/usr/bin/lddlibc4$", "libc32"),
-                (r"^/usr/lib32/gconv/[a-zA-Z0-9\.\_\+\-\/]*", "libc32"),
-                (r"^/usr/lib32/glibc/getconf/[a-zA-Z0-9\.\_\+\-\/]*", "libc32"),
-                (r"^/usr/lib32/audit/sotruss-lib\.so$", "libc32"),
-                (r"^/usr/lib32/l(?:ib(?:BrokenLocale\.so\.1|(?:thread_db|(?:cryp|r)t|util|nsl|anl)\.so\.1|pthread\.so\.0|[cm]\.so\.6)|ib(?:nss_(?:compat|hesiod|files|d(?:ns|b))|resolv|dl)\.so\.2|d\-linux\.so\.2)$", "libc32"),
-                (r"^/usr/share/info/libc\.info", "doc"),
-                (r"^/usr/bin/makedb$", "extras"),
-                (r"^/usr/bin/bench-[a-zA-Z0-9\.\_\+\-\/]*", "bench"),
-                (r"^/usr/lib64/glibc/benchmarks/[a-zA-Z0-9\.\_\+\-\/]*", "bench")]
-            for pat_args in patterns_glibc:
-                if self.file_pat_match(filename, *pat_args):
-                    return
-
-        if self.package_name == "gmp":
-            patterns_gmp = [
-                # Patterns for matching files, format is a tuple as follows:
-                # (<raw pattern>, <package>, <optional replacement>, <optional prefix>, <-n subpackage:True or False>)
-                # order matters, first match wins!
-                (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
-                (r"^/usr/lib64/haswell/libgmp\.so\.(?:[0-9\.])*$", "lib-hsw")]
-            for pat_args in patterns_gmp:
-                if self.file_pat_match(filename, *pat_args):
-                    return
-
-        for pat_args in patterns:
-            if self.file_pat_match(filename, *pat_args):
-                return
-
-        if filename in self.excludes:
-            return
-
-        self.push_package_file(filename)
+        # package specific overrides from the file_overrides config file
+        rules.extend(self.config.file_overrides.get(self.package_name, []))
+        rules.extend(patterns)
+        return rules
 
     def write_cargo_find_install_assets(self, content_name: str):
         """ Find custom assets to install such as docs, shell completion, etc """
@@ -822,20 +863,26 @@ class FileManager(object):
         """Remove filename from local file list."""
         hit = False
 
+        owners = self.file_index.pop(filename, None)
+        if owners is None and filename in self.files:
+            # the package lists were filled without push_package_file
+            owners = [(False, pkg) for pkg in self.packages if filename in self.packages[pkg]]
+            owners += [(True, pkg) for pkg in self.subpackages if filename in self.subpackages[pkg]]
+
         if filename in self.files:
             self.files.remove(filename)
             print("File no longer present: {}".format(filename))
             hit = True
-        for pkg in self.packages:
-            if filename in self.packages[pkg]:
-                self.packages[pkg].remove(filename)
-                print("File no longer present in {}: {}".format(pkg, filename))
-                hit = True
-        for pkg in self.subpackages:
-            if filename in self.subpackages[pkg]:
-                self.subpackages[pkg].remove(filename)
+        for subpackage, pkg in owners or []:
+            pkgs = self.subpackages if subpackage else self.packages
+            if filename not in pkgs.get(pkg, ()):
+                continue
+            pkgs[pkg].remove(filename)
+            if subpackage:
                 print("File no longer present in subpackage {}: {}".format(pkg, filename))
-                hit = True
+            else:
+                print("File no longer present in {}: {}".format(pkg, filename))
+            hit = True
         if hit:
             self.files_blacklist.add(filename)
             self.package.must_restart += 1
@@ -20,6 +20,7 @@
 #
 
 import glob
+import hashlib
 import os
 import sys
 import subprocess
@@ -435,8 +436,11 @@ def git_clone(url, path, cmd_args, clone_path, force_module, force_fullclone, is
             sys.exit(1)
 
 
-def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf, is_fatal=True):
-    """Clone package directly from a git repository."""
+def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf, is_fatal=True, download_cache=None):
+    """Clone package directly from a git repository.
+
+    PyPI sources are downloaded instead, through download_cache if one is given.
+    """
     cmd_args = f"{branch} {url} {name}"
     clone_path = f"{path}{name}"
     if util.debugging:
@@ -450,7 +454,12 @@ def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf
             latest_pypi_source = latest_pypi(url, output_format="source", pre_ok=True)
             print_info(f"pypi.org/project/: {latest_pypi_source}")
             latest_pypi_source_basename=os.path.basename(latest_pypi_source)
-            download.do_curl(latest_pypi_source, dest=f"./{latest_pypi_source_basename}", is_fatal=True)
+            dest = f"./{latest_pypi_source_basename}"
+            if download_cache is None or download_cache.get(latest_pypi_source, dest) is None:
+                digest = hashlib.sha1()
+                download.do_curl(latest_pypi_source, dest=dest, is_fatal=True, digest=digest)
+                if download_cache is not None:
+                    download_cache.add(dest, digest.hexdigest(), latest_pypi_source)
             absolute_url_file=f"file://{os.path.abspath(latest_pypi_source_basename)}"
             return absolute_url_file
         else:
@@ -29,6 +29,7 @@ import urllib.parse
 
 import chardet
 import download
+import srctree
 
 from util import get_contents, get_sha1sum, print_fatal, print_warning
 
@@ -148,8 +149,9 @@ def license_from_copying_hash(copying, srcdir, config, name):
         print_warning("Visit {0} to enter".format(hash_url))
 
 
-def scan_for_licenses(srcdir, config, pkg_name):
+def scan_for_licenses(srcdir, config, pkg_name, tree=None):
     """Scan the project directory for things we can use to guess a description and summary."""
+    tree = tree or srctree.SourceTreeIndex(srcdir)
     targets = ["copyright",
                "copyright.txt",
                "apache-2.0",
@@ -164,7 +166,7 @@ def scan_for_licenses(srcdir, config, pkg_name):
     # look for files that start with copying or licen[cs]e (but are
     # not likely scripts) or end with licen[cs]e
     target_pat = re.compile(r"^((copying)|(licen[cs]e)|(e[dp]l-v\d+))|(licen[cs]e)(\.(txt|xml))?$")
-    for dirpath, dirnames, files in os.walk(srcdir):
+    for dirpath, dirnames, files in tree.walk(srcdir):
         for name in files:
             if name.lower() in targets or target_pat.search(name.lower()):
                 license_from_copying_hash(os.path.join(dirpath, name),
@@ -19,42 +19,36 @@
 import os
 import re
 
-from util import print_fatal, write_out
+from util import iter_lines, print_fatal, write_out
 
 
-def logcheck(pkg_loc):
-    """Try to discover configuration options that were automatically switched off."""
-    log = os.path.join(pkg_loc, 'results', 'build.log')
-    if not os.path.exists(log):
-        print('build log is missing, unable to perform logcheck.')
-        return
-
-    whitelist = []
+def read_list(filename):
+    """Read a configure_whitelist style list shipped next to this module."""
+    items = []
     file_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(file_dir, 'configure_whitelist')
-    with open(file_path, "r") as whitelistf:
-        for line in whitelistf:
+    file_path = os.path.join(file_dir, filename)
+    with open(file_path, "r") as listf:
+        for line in listf:
             if line.startswith("#"):
                 continue
-            whitelist.append(line.rstrip())
+            items.append(line.rstrip())
+    return items
 
-    blacklist = []
-    file_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(file_dir, 'configure_blacklist')
-    with open(file_path, "r") as blacklistf:
-        for line in blacklistf:
-            if line.startswith("#"):
-                continue
-            blacklist.append(line.rstrip())
 
-    with open(log, 'r') as logf:
-        lines = logf.readlines()
+class LogChecker(object):
+    """Collect configure misses from build log lines fed one at a time."""
+
+    def __init__(self):
+        """Load the configure whitelist and blacklist."""
+        self.whitelist = set(read_list('configure_whitelist'))
+        self.blacklist = set(read_list('configure_blacklist'))
+        self.pat = re.compile(r"^checking (?:for )?(.*?)\.\.\. no")
+        self.matches = []
 
-    pat = re.compile(r"^checking (?:for )?(.*?)\.\.\. no")
-    misses = []
-    for line in lines:
+    def feed(self, line):
+        """Record line if it reports a configure miss."""
         match = None
-        m = pat.search(line)
+        m = self.pat.search(line)
         if m:
             match = m.group(1)
 
@@ -64,22 +58,46 @@ def logcheck(pkg_loc):
         if "warning: format not a string literal" in line:
             match = line
 
-        if not match or match in whitelist:
-            continue
+        if not match or match in self.whitelist:
+            return
 
-        if match in blacklist:
-            print_fatal("Blacklisted configure-miss is forbidden: " + match)
-            misses.append("Blacklisted configure-miss is forbidden: " + match)
-            write_misses(pkg_loc, misses)
-            exit(1)
+        self.matches.append(match)
 
-        print("Configure miss: " + match)
-        misses.append("Configure miss: " + match)
+    def finish(self, pkg_loc):
+        """Report the collected configure misses and write them to pkg_loc."""
+        misses = []
+        for match in self.matches:
+            if match in self.blacklist:
+                print_fatal("Blacklisted configure-miss is forbidden: " + match)
+                misses.append("Blacklisted configure-miss is forbidden: " + match)
+                write_misses(pkg_loc, misses)
+                exit(1)
 
-    if not misses:
+            print("Configure miss: " + match)
+            misses.append("Configure miss: " + match)
+
+        if not misses:
+            return
+
+        write_misses(pkg_loc, misses)
+
+
+def logcheck(pkg_loc, checker=None):
+    """Try to discover configuration options that were automatically switched off.
+
+    If checker is given it has already been fed results/build.log (for
+    instance through a buildlog.LogPipeline), so the log is not read again.
+    """
+    log = os.path.join(pkg_loc, 'results', 'build.log')
+    if not os.path.exists(log):
+        print('build log is missing, unable to perform logcheck.')
         return
 
-    write_misses(pkg_loc, misses)
+    if checker is None:
+        checker = LogChecker()
+        for line in iter_lines(log):
+            checker.feed(line)
+    checker.finish(pkg_loc)
 
 
 def write_misses(pkg_loc, misses):
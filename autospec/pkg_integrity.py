@@ -220,12 +220,7 @@ class Verifier(object):
     @staticmethod
     def calc_sum(filepath, digest_algo):
         """Use digest_algo to calculate block sum of a file."""
-        BLOCK_SIZE = 4096
-        with open(filepath, 'rb') as fp:
-            digest = digest_algo()
-            for block in iter(lambda: fp.read(BLOCK_SIZE), b''):
-                digest.update(block)
-            return digest.hexdigest()
+        return util.file_digest(filepath, digest_algo().name)
 
     def print_result(self, result, err_msg=''):
         """Display verification results."""
@@ -1,97 +1,277 @@
 #!/usr/bin/env python3
 
+import atexit
+import email.parser
+import glob
 import json
 import os
-import subprocess
+import re
 import sys
-import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import download
 
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+except ImportError:
+    Requirement = None
 
-def pip_env():
-    """Generate a copy of os.environ appropriate for pip."""
-    env = os.environ.copy()
-    env["PYTHON_KEYRING_BACKEND"] = "keyring.backends.null.Keyring"
-    return env
 
+class TTLCache(object):
+    """Answers kept in a JSON file for ttl seconds, saved when autospec exits."""
 
-def pkg_search(name):
-    """Query the pypi json API for name and return True if found."""
+    def __init__(self, path, ttl):
+        """Keep the answers in path."""
+        self.path = path
+        self.ttl = ttl
+        self.entries = None
+
+    def load(self):
+        """Return the cached entries, reading the file on first use."""
+        if self.entries is None:
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+            atexit.register(self.save)
+        return self.entries
+
+    def get(self, key):
+        """Return the unexpired answer for key, or None."""
+        entry = self.load().get(key)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def set(self, key, value):
+        """Remember value as the answer for key."""
+        self.load()[key] = [time.time(), value]
+
+    def save(self):
+        """Write the unexpired entries back to the file."""
+        if not self.entries:
+            return
+        now = time.time()
+        entries = {key: entry for key, entry in self.entries.items() if now - entry[0] < self.ttl}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+# Whether names exist on pypi, and the metadata pypi has for them
+name_cache = TTLCache(os.path.expanduser("~/.cache/autospec/pypi_names.json"), 7 * 24 * 3600)
+metadata_cache = TTLCache(os.path.expanduser("~/.cache/autospec/pypi_metadata.json"), 24 * 3600)
+
+
+def query_pypi(name):
+    """Query the pypi json API for name.
+
+    Return True if found, False if pypi does not know it, or None if pypi
+    could not be asked.
+    """
     query = f"https://pypi.org/pypi/{name}/json/"
-    resp = download.do_curl(query)
-    if resp is not None:
-        return True
-    else:
+    try:
+        download.fetch(query, retries=1)
+    except download.DownloadError as e:
+        if e.status in (404, 410):
+            return False
+        return None
+    return True
+
+
+def pkg_search(name):
+    """Query the pypi json API for name and return True if found.
+
+    Answers, found or not, are kept in name_cache.
+    """
+    found = name_cache.get(name)
+    if found is not None:
+        return found
+    found = query_pypi(name)
+    if found is None:
         return False
+    name_cache.set(name, found)
+    return found
 
 
-def get_pypi_name(name, miss=False):
-    """Try and verify the pypi name for a given package name."""
+def search_names(names):
+    """Run pkg_search for every name in names that is not cached, concurrently."""
+    missing = sorted(set(name for name in names if name_cache.get(name) is None))
+    if not missing:
+        return
+    with ThreadPoolExecutor(max_workers=min(download.MAX_PARALLEL_DOWNLOADS, len(missing))) as pool:
+        results = list(pool.map(query_pypi, missing))
+    for name, found in zip(missing, results):
+        if found is not None:
+            name_cache.set(name, found)
+
+
+def candidate_names(name):
+    """Return the names get_pypi_name tries for name, in order."""
     # normalize the name for matching as pypi is case insensitve for search
     name = name.lower().replace('-', '_')
-    # Common case is the name and the pypi name match
-    if pkg_search(name):
-        return name
+    candidates = [name]
     # Maybe we have a prefix
     for prefix in ["pypi_", "python_"]:
         if name.startswith(prefix):
             name = name[len(prefix):]
-            if pkg_search(name):
-                return name
+            candidates.append(name)
+    return candidates
+
+
+def prefetch_pypi_names(names):
+    """Look up everything get_pypi_name needs for names in a single batch."""
+    search_names([candidate for name in names if name for candidate in candidate_names(name)])
+
+
+def get_pypi_name(name, miss=False):
+    """Try and verify the pypi name for a given package name."""
+    candidates = candidate_names(name)
+    # Common case is the name and the pypi name match
+    for candidate in candidates:
+        if pkg_search(candidate):
+            return candidate
     # Some cases where search fails (Sphinx)
     # Just try the name we were given
     if miss:
         return ""
-    return name
-
-
-def get_pypi_metadata(name):
-    """Get metadata for a pypi package."""
-    show = []
-    # Create virtenv to do the pip install (needed for pip show)
-    with tempfile.TemporaryDirectory() as tdir:
-        proc = subprocess.run(["virtualenv", "--no-periodic-update", tdir], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        if proc.returncode != 0:
-            return ""
-        proc = subprocess.run(f"source bin/activate && pip install {name}", cwd=tdir, shell=True,
-                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
-                              env=pip_env())
-        if proc.returncode != 0:
-            return ""
-        with tempfile.TemporaryFile() as tfile:
-            proc = subprocess.run(f"source bin/activate &> /dev/null && pip show {name}",
-                                  cwd=tdir, shell=True,
-                                  stdout=tfile.fileno(), stderr=subprocess.DEVNULL,
-                                  env=pip_env())
-            if proc.returncode != 0:
-                return ""
-            tfile.seek(0)
-            show = tfile.read().decode('utf-8', errors='surrogateescape').splitlines()
-    # Parse pip show for relevent information
-    metadata = {}
-    for line in show:
-        if line.startswith("Name: "):
-            # 'Name: pypi-name'
-            # normalize names -> lowercase and dash to underscore
-            metadata["name"] = line.split()[1].lower().replace('-', '_')
-        elif line.startswith("Summary: "):
-            # 'Summary: <description of the package>'
-            try:
-                metadata["summary"] = line.split(maxsplit=1)[1]
-            except IndexError:
-                # No Summary (haven't seen this case before though)
-                metadata["summary"] = ""
-        elif line.startswith("Requires: "):
-            # 'Requires: dep1, dep2
-            # normalize names -> lowercase and dash to underscore
+    return candidates[-1]
+
+
+def normalize_name(name):
+    """Normalize a pypi name the way autospec spells it: lowercase, dash to underscore."""
+    return name.strip().lower().replace('-', '_')
+
+
+def requirement_names(requirements):
+    """Return the normalized names of the requirements that apply without extras.
+
+    requirements are Requires-Dist values, e.g. "foo (>=1.0); python_version < '3.8'".
+    Environment markers are evaluated for the running python when the packaging
+    module is available, otherwise only requirements for an extra are dropped.
+    """
+    names = []
+    for requirement in requirements:
+        if Requirement is not None:
             try:
-                reqs = [item.strip().lower().replace('-', '_') for item in line.split(maxsplit=1)[1].split(",")]
-            except IndexError:
-                # No Requires
-                reqs = []
-            metadata["requires"] = reqs
+                parsed = Requirement(requirement)
+            except InvalidRequirement:
+                continue
+            if parsed.marker and not parsed.marker.evaluate({"extra": ""}):
+                continue
+            name = parsed.name
+        else:
+            requirement, _, marker = requirement.partition(";")
+            if "extra" in marker:
+                continue
+            match = re.match(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)", requirement)
+            if not match:
+                continue
+            name = match.group(1)
+        name = normalize_name(name)
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def parse_metadata(text):
+    """Return name, summary and requires from the text of a PKG-INFO or METADATA file.
+
+    requires is None when the file does not list any Requires-Dist.
+    """
+    headers = email.parser.HeaderParser().parsestr(text)
+    requires = headers.get_all("Requires-Dist")
+    return {
+        "name": normalize_name(headers.get("Name", "")),
+        "summary": (headers.get("Summary") or "").strip(),
+        "requires": requirement_names(requires) if requires is not None else None,
+    }
 
+
+def parse_requires_txt(text):
+    """Return the unconditional requirement names in an egg-info requires.txt."""
+    requirements = []
+    for line in text.splitlines():
+        line = line.strip()
+        # [extra] and [:marker] sections follow the unconditional requirements
+        if line.startswith("["):
+            break
+        if line and not line.startswith("#"):
+            requirements.append(line)
+    return requirement_names(requirements)
+
+
+def local_metadata(srcdir):
+    """Read metadata from the PKG-INFO or METADATA shipped in the source tree at srcdir.
+
+    Return a metadata dict, or None if the tree has no metadata file.
+    requires is None when neither the metadata file nor an egg-info
+    requires.txt lists the requirements.
+    """
+    for pattern in ("PKG-INFO", "*.egg-info/PKG-INFO", "src/*.egg-info/PKG-INFO", "*.dist-info/METADATA"):
+        for path in sorted(glob.glob(os.path.join(glob.escape(srcdir), pattern))):
+            with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                metadata = parse_metadata(f.read())
+            if not metadata["name"]:
+                continue
+            if metadata["requires"] is None:
+                # setuptools keeps them next to PKG-INFO rather than in it
+                requires = glob.glob(os.path.join(glob.escape(srcdir), "*.egg-info", "requires.txt"))
+                requires += glob.glob(os.path.join(glob.escape(srcdir), "src", "*.egg-info", "requires.txt"))
+                if requires:
+                    with open(sorted(requires)[0], encoding="utf-8", errors="surrogateescape") as f:
+                        metadata["requires"] = parse_requires_txt(f.read())
+            return metadata
+    return None
+
+
+def remote_metadata(name):
+    """Read metadata for name from the pypi json API, through metadata_cache.
+
+    Return a metadata dict, or None if pypi has nothing for name.
+    """
+    metadata = metadata_cache.get(name)
+    if metadata is not None:
+        return metadata
+    try:
+        resp = download.fetch(f"https://pypi.org/pypi/{name}/json", retries=1)
+        info = json.loads(resp.getvalue().decode("utf-8"))["info"]
+    except (download.DownloadError, ValueError, KeyError):
+        return None
+    metadata = {
+        "name": normalize_name(info.get("name") or name),
+        "summary": (info.get("summary") or "").strip(),
+        "requires": requirement_names(info.get("requires_dist") or []),
+    }
+    metadata_cache.set(name, metadata)
+    return metadata
+
+
+def get_pypi_metadata(name, srcdir=None):
+    """Get metadata for a pypi package.
+
+    The metadata file of the extracted sources in srcdir is used when there
+    is one, otherwise the pypi json API is asked, as it is for requirements
+    the sources do not list. Nothing is installed.
+    Return a JSON object with name, summary and requires, or "" on failure.
+    """
+    metadata = None
+    if srcdir:
+        metadata = local_metadata(srcdir)
+        if metadata is not None and metadata["requires"] is None:
+            remote = remote_metadata(name or metadata["name"])
+            metadata["requires"] = remote["requires"] if remote else []
+    if metadata is None and name:
+        metadata = remote_metadata(name)
+    if metadata is None:
+        return ""
     return json.dumps(metadata)
 
 
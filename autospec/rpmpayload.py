@@ -0,0 +1,171 @@
+#!/bin/true
+#
+# rpmpayload.py - part of autospec
+# Copyright (C) 2016 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Stream the files out of an RPM payload, without rpm2cpio or cpio
+#
+
+import bz2
+import gzip
+import lzma
+import stat
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LEAD_MAGIC = b"\xed\xab\xee\xdb"
+LEAD_SIZE = 96
+HEADER_MAGIC = b"\x8e\xad\xe8"
+
+RPM_STRING_TYPE = 6
+RPMTAG_PAYLOADFORMAT = 1124
+RPMTAG_PAYLOADCOMPRESSOR = 1125
+
+CPIO_MAGICS = (b"070701", b"070702")
+CPIO_HEADER_SIZE = 110
+CPIO_TRAILER = "TRAILER!!!"
+
+# Bytes read at a time when skipping file contents
+SKIP_BLOCK_SIZE = 1024 * 1024
+
+# What the decompressors raise for corrupt data
+PAYLOAD_ERRORS = (EOFError, OSError, lzma.LZMAError, zlib.error)
+if zstandard is not None:
+    PAYLOAD_ERRORS += (zstandard.ZstdError,)
+
+
+class RpmError(Exception):
+    """Raised for an RPM whose payload cannot be read."""
+
+
+def read_exact(stream, size):
+    """Read exactly size bytes from stream."""
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            raise RpmError("Unexpected end of RPM data")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def skip(stream, size):
+    """Read and drop size bytes from stream."""
+    while size > 0:
+        size -= len(read_exact(stream, min(size, SKIP_BLOCK_SIZE)))
+
+
+def read_header(stream, pad=False):
+    """Read an RPM header structure and return its string tags.
+
+    With pad, the header is followed by padding to 8 bytes, as the
+    signature header is.
+    """
+    intro = read_exact(stream, 16)
+    if intro[:3] != HEADER_MAGIC:
+        raise RpmError("Bad RPM header magic")
+    nindex, hsize = struct.unpack(">II", intro[8:])
+    index = read_exact(stream, nindex * 16)
+    store = read_exact(stream, hsize)
+    if pad:
+        skip(stream, -(16 + nindex * 16 + hsize) % 8)
+    tags = {}
+    for pos in range(0, len(index), 16):
+        tag, tag_type, offset, _ = struct.unpack(">IIII", index[pos:pos + 16])
+        if tag_type == RPM_STRING_TYPE:
+            end = store.find(b"\0", offset)
+            tags[tag] = store[offset:end].decode("utf-8", "replace")
+    return tags
+
+
+def open_payload(stream):
+    """Skip the RPM lead and headers and return the decompressed payload stream."""
+    lead = read_exact(stream, LEAD_SIZE)
+    if lead[:4] != LEAD_MAGIC:
+        raise RpmError("Not an RPM file")
+    read_header(stream, pad=True)
+    tags = read_header(stream)
+    if tags.get(RPMTAG_PAYLOADFORMAT, "cpio") != "cpio":
+        raise RpmError("Unsupported payload format {}".format(tags[RPMTAG_PAYLOADFORMAT]))
+    compressor = tags.get(RPMTAG_PAYLOADCOMPRESSOR, "gzip")
+    if compressor == "gzip":
+        return gzip.GzipFile(fileobj=stream)
+    if compressor == "bzip2":
+        return bz2.BZ2File(stream)
+    if compressor in ("xz", "lzma"):
+        return lzma.LZMAFile(stream)
+    if compressor == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    raise RpmError("Unsupported payload compressor {}".format(compressor))
+
+
+def install_path(name):
+    """Return the absolute path a payload member is installed at."""
+    if name.startswith("./"):
+        name = name[1:]
+    return "/" + name.lstrip("/")
+
+
+def read_files(path, magic=b""):
+    """Yield (name, data) for the non-empty regular files in the RPM at path.
+
+    Only files whose contents start with magic are read, the rest of the
+    payload is skipped. Names are absolute, as the files are installed.
+    """
+    # hard links carry the file data on the last link only, the others
+    # are empty
+    links = {}
+    with open(path, "rb") as rpm:
+        payload = open_payload(rpm)
+        try:
+            while True:
+                header = read_exact(payload, CPIO_HEADER_SIZE)
+                if header[:6] not in CPIO_MAGICS:
+                    raise RpmError("Bad cpio header in {}".format(path))
+                try:
+                    fields = [int(header[pos:pos + 8], 16) for pos in range(6, CPIO_HEADER_SIZE, 8)]
+                except ValueError:
+                    raise RpmError("Bad cpio header in {}".format(path))
+                ino, mode, _, _, nlink, _, size, devmajor, devminor, _, _, namesize, _ = fields
+                name = read_exact(payload, namesize)[:-1].decode("utf-8", "surrogateescape")
+                skip(payload, -(CPIO_HEADER_SIZE + namesize) % 4)
+                if name == CPIO_TRAILER:
+                    break
+                names = [install_path(name)]
+                if nlink > 1 and stat.S_ISREG(mode):
+                    names = links.setdefault((devmajor, devminor, ino), [])
+                    names.append(install_path(name))
+                data = None
+                if stat.S_ISREG(mode) and size and size >= len(magic):
+                    head = read_exact(payload, len(magic))
+                    if head == magic:
+                        data = head + read_exact(payload, size - len(magic))
+                    else:
+                        skip(payload, size - len(magic))
+                else:
+                    skip(payload, size)
+                skip(payload, -size % 4)
+                if data is not None:
+                    for name in names:
+                        yield name, data
+        except PAYLOAD_ERRORS as e:
+            raise RpmError("Cannot read the payload of {}: {}".format(path, e))
@@ -30,6 +30,7 @@ import os
 import re
 
 import license
+import srctree
 import util
 
 default_description = "No detailed description available"
@@ -240,11 +241,12 @@ def description_from_readme(readmefile):
     assign_description(desc, score)
 
 
-def scan_for_description(package, dirn, translations, blacklist):
+def scan_for_description(package, dirn, translations, blacklist, tree=None):
     """Scan the project directory for things we can use to guess a description and summary."""
+    tree = tree or srctree.SourceTreeIndex(dirn)
     test_pat = re.compile(r"tests?")
     dirpath_seen = ""
-    for dirpath, dirnames, files in os.walk(dirn):
+    for dirpath, dirnames, files in tree.walk(dirn):
         if dirpath_seen != dirpath:
             dirpath_seen = dirpath
             dirnames[:] = [d for d in dirnames if not re.match(test_pat, d)]
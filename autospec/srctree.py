@@ -0,0 +1,137 @@
+#!/bin/true
+#
+# srctree.py - part of autospec
+# Copyright (C) 2015 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Index of an extracted source tree, shared by the static scanners
+#
+
+import os
+
+
+class SourceTreeIndex(object):
+    """Directory listing of a source tree, read with a single os.walk.
+
+    The tree is walked the first time it is queried. Queries take any
+    directory inside the tree and answer the way the equivalent os call on
+    that directory would, including the spelling and order of the paths
+    returned. Directories outside the tree are read from disk.
+    """
+
+    def __init__(self, root):
+        """Index the tree below root."""
+        self.root = os.path.normpath(root)
+        self.dirs = None
+        self.by_name = None
+        self.by_lower = None
+
+    def build(self):
+        """Walk the tree, unless that was already done.
+
+        Directories are keyed by their path relative to the root ("" for the
+        root itself), and file names map to those paths in walk order.
+        """
+        if self.dirs is not None:
+            return
+        self.dirs = {}
+        self.by_name = {}
+        self.by_lower = {}
+        for dirpath, dirnames, files in os.walk(self.root):
+            rel = self.key(dirpath)
+            self.dirs[rel] = (dirnames, files)
+            for name in files:
+                path = os.path.join(rel, name)
+                self.by_name.setdefault(name, []).append(path)
+                self.by_lower.setdefault(name.lower(), []).append(path)
+
+    def key(self, path):
+        """Return path relative to the root, "" for the root itself."""
+        rel = os.path.relpath(os.path.normpath(path), self.root)
+        return "" if rel == "." else rel
+
+    def indexed(self, top):
+        """Return the key of directory top, or None if it is not in the index."""
+        self.build()
+        rel = self.key(top)
+        return rel if rel in self.dirs else None
+
+    def walk(self, top, topdown=True):
+        """Yield (dirpath, dirnames, filenames) for top like os.walk(top, topdown).
+
+        With topdown, dirnames may be pruned in place to skip subdirectories.
+        """
+        rel = self.indexed(top)
+        if rel is None:
+            yield from os.walk(top, topdown=topdown)
+        else:
+            yield from self._walk(top, rel, topdown)
+
+    def _walk(self, dirpath, rel, topdown):
+        dirnames, files = self.dirs[rel]
+        dirnames = list(dirnames)
+        if topdown:
+            yield dirpath, dirnames, list(files)
+        for name in dirnames:
+            child = os.path.join(rel, name)
+            # symlinks to directories are listed but, as in os.walk, not entered
+            if child in self.dirs:
+                yield from self._walk(os.path.join(dirpath, name), child, topdown)
+        if not topdown:
+            yield dirpath, dirnames, list(files)
+
+    def listdir(self, top):
+        """Return the names in directory top, like os.listdir(top).
+
+        The tree is not walked for this; if it has not been yet, top is read
+        from disk.
+        """
+        if self.dirs is not None:
+            rel = self.indexed(top)
+            if rel is not None:
+                dirnames, files = self.dirs[rel]
+                return dirnames + files
+        return os.listdir(top)
+
+    def files_named(self, name, top=None, lower=False):
+        """Return the paths of all files called name below top, in walk order.
+
+        With lower, name is lowercase and matched case-insensitively.
+        """
+        self.build()
+        paths = (self.by_lower if lower else self.by_name).get(name, [])
+        return self._below(paths, top, lambda f: (f.lower() if lower else f) == name)
+
+    def files_with_suffix(self, suffix, top=None, lower=False):
+        """Return the paths of all files whose names end with suffix below top, in walk order.
+
+        With lower, suffix is lowercase and matched case-insensitively.
+        """
+        self.build()
+        match = lambda f: (f.lower() if lower else f).endswith(suffix)  # noqa: E731
+        # self.dirs is in walk order
+        paths = [os.path.join(rel, f) for rel, (_, files) in self.dirs.items() for f in files if match(f)]
+        return self._below(paths, top, match)
+
+    def _below(self, paths, top, match):
+        """Return the indexed paths below top, spelled as os.walk(top) would."""
+        top = self.root if top is None else top
+        rel = self.indexed(top)
+        if rel is None:
+            return [os.path.join(dirpath, f) for dirpath, _, files in os.walk(top) for f in files if match(f)]
+        if rel == "":
+            return [os.path.join(top, path) for path in paths]
+        prefix = rel + os.sep
+        return [os.path.join(top, path[len(prefix):]) for path in paths if path.startswith(prefix)]
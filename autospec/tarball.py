@@ -17,27 +17,64 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import concurrent.futures
 import configparser
+import hashlib
+import json
 import os
 import re
+import shutil
+import subprocess
 import tarfile
+import tempfile
 import zipfile
 import util
 from collections import OrderedDict
 
 import download
-from util import do_regex, get_sha1sum, print_fatal, write_out, print_debug
+from util import do_regex, print_fatal, print_warning, write_out, print_debug
+
+# Multi-threaded decompressors by the magic bytes of the compressed archive,
+# first found in PATH is used. Each one writes the tar stream to stdout.
+DECOMPRESSORS = [
+    (b"\x1f\x8b", [["pigz", "-dc"]]),
+    (b"\xfd7zXZ\x00", [["xz", "-dc", "-T0"]]),
+    (b"BZh", [["lbzip2", "-dc"], ["pbzip2", "-dc"]]),
+    (b"\x28\xb5\x2f\xfd", [["zstd", "-dc", "-T0"]]),
+]
+
+
+def parallel_decompressor(path):
+    """Return the command line to decompress path with a parallel tool, or None."""
+    with open(path, "rb") as archive:
+        magic = archive.read(6)
+    for prefix, commands in DECOMPRESSORS:
+        if magic.startswith(prefix):
+            for command in commands:
+                if shutil.which(command[0]):
+                    return command + [path]
+            return None
+    return None
 
 
 class Source(object):
     """Holds data and methods for source code or archives management."""
 
-    def __init__(self, url, destination, path, pattern=None):
-        """Set default values for source file."""
+    def __init__(self, url, destination, path, pattern=None, sha1=None, cache_dir=None, staging_dir=None):
+        """Set default values for source file.
+
+        With a cache_dir and the archive sha1, extracted trees are kept in
+        cache_dir for later runs. staging_dir holds a tar extracted while its
+        prefix is detected, until extract() moves it into place.
+        """
         self.url = url
         self.destination = destination
         self.path = path
         self.pattern = pattern
+        self.sha1 = sha1
+        self.cache_dir = cache_dir if sha1 else None
+        self.staging_dir = staging_dir
+        self.staged = None
         self.type = None
         self.prefix = None
         self.subdir = None
@@ -70,22 +107,30 @@ class Source(object):
             self.gem_subdir = os.path.splitext(os.path.basename(self.path))[0]
 
     def set_tar_prefix(self):
-        """Determine prefix folder name of tar file."""
-        if tarfile.is_tarfile(self.path):
-            with tarfile.open(self.path, 'r') as content:
-                lines = content.getnames()
-                # When tarball is not empty
-                if len(lines) == 0:
-                    print_fatal("Tar file doesn't appear to have any content")
-                    exit(1)
-                elif len(lines) > 1:
-                    if 'package.xml' in lines and self.pattern in ['phpize']:
-                        lines.remove('package.xml')
-                    self.prefix = os.path.commonpath(lines)
+        """Determine prefix folder name of tar file.
+
+        Listing the members of a compressed tar decompresses all of it, so the
+        archive is staged in the same pass and extract_tar only has to put the
+        tree in place.
+        """
+        if self.cached_tree():
+            with open(os.path.join(self.cache_dir, self.sha1, "names"), "r") as names:
+                lines = json.load(names)
+        elif tarfile.is_tarfile(self.path):
+            lines = self.stage(self.stream_tar)
         else:
             print_fatal("Not a valid tar file.")
             exit(1)
 
+        # When tarball is not empty
+        if len(lines) == 0:
+            print_fatal("Tar file doesn't appear to have any content")
+            exit(1)
+        elif len(lines) > 1:
+            if 'package.xml' in lines and self.pattern in ['phpize']:
+                lines.remove('package.xml')
+            self.prefix = os.path.commonpath(lines)
+
     def set_zip_prefix(self):
         """Determine prefix folder name of zip file."""
         if zipfile.is_zipfile(self.path):
@@ -100,36 +145,165 @@ class Source(object):
         else:
             print_fatal("Not a valid zip file.")
             exit(1)
+        if not self.cached_tree():
+            self.stage(self.unzip)
 
     def set_go_prefix(self):
         """Set empty prefix for go packages (*.list)."""
         self.prefix = ''
 
+    def cached_tree(self):
+        """Return the cached extraction of this archive, or None."""
+        if not self.cache_dir:
+            return None
+        cached = os.path.join(self.cache_dir, self.sha1)
+        if not os.path.isfile(os.path.join(cached, "names")):
+            return None
+        return os.path.join(cached, "tree")
+
+    def stage(self, extract_method):
+        """Extract with extract_method ahead of extract() and return the member names.
+
+        The tree goes to the cache when there is one, and to a staging
+        directory otherwise. This is the expensive part of handling an archive
+        and is safe to run for several sources at once.
+        """
+        if self.cache_dir:
+            return self.add_to_cache(extract_method)
+        self.staged = tempfile.mkdtemp(prefix=".staging-", dir=self.staging_dir)
+        return extract_method(self.staged)
+
+    def add_to_cache(self, extract_method):
+        """Extract into a new cache entry with extract_method and return the member names."""
+        cached = os.path.join(self.cache_dir, self.sha1)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # extract next to the final location and rename it into place, so
+        # an interrupted or concurrent run never sees a partial entry
+        tmp_path = tempfile.mkdtemp(prefix=self.sha1 + ".", dir=self.cache_dir)
+        try:
+            names = extract_method(os.path.join(tmp_path, "tree"))
+            write_out(os.path.join(tmp_path, "names"), json.dumps(names))
+            os.rename(tmp_path, cached)
+        except OSError:
+            if not self.cached_tree():
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return names
+
+    def extraction_path(self, base_path):
+        """Return the directory the archive is extracted to."""
+        if not self.prefix:
+            return os.path.join(base_path, self.subdir)
+        return base_path
+
     def extract(self, base_path):
         """Prepare extraction path and call specific extraction method."""
-        if not self.prefix:
-            extraction_path = os.path.join(base_path, self.subdir)
+        extract_method = getattr(self, 'extract_{}'.format(self.type))
+        extract_method(self.extraction_path(base_path))
+
+    def place(self, extraction_path, extract_method):
+        """Put the cached or staged tree in path, or extract it with extract_method."""
+        cached = self.cached_tree()
+        if cached:
+            if util.debugging:
+                print_debug("Using cached extraction {} for {}".format(cached, self.path))
+            util.link_tree(cached, extraction_path)
+        elif self.staged:
+            util.move_tree(self.staged, extraction_path)
+            shutil.rmtree(self.staged, ignore_errors=True)
+            self.staged = None
         else:
-            extraction_path = base_path
+            extract_method(extraction_path)
 
-        extract_method = getattr(self, 'extract_{}'.format(self.type))
-        extract_method(extraction_path)
+    def stream_tar(self, extraction_path):
+        """Extract tar in path in a single pass and return its member names.
+
+        The archive is piped through a parallel decompressor when one is
+        installed, and decompressed by tarfile otherwise.
+        """
+        names = []
+
+        def _members(content):
+            for member in content:
+                names.append(member.name)
+                yield member
+
+        os.makedirs(extraction_path, exist_ok=True)
+        command = parallel_decompressor(self.path)
+        proc = None
+        if command:
+            if util.debugging:
+                print_debug("Decompressing with: {}".format(" ".join(command)))
+            try:
+                proc = subprocess.Popen(command, stdout=subprocess.PIPE)
+            except OSError:
+                proc = None
+        if not proc:
+            with tarfile.open(self.path, 'r|*') as content:
+                content.extractall(path=extraction_path, members=_members(content))
+            return names
+
+        try:
+            with tarfile.open(fileobj=proc.stdout, mode='r|') as content:
+                content.extractall(path=extraction_path, members=_members(content))
+            # read the padding after the end of archive marker, so the
+            # decompressor is not killed by SIGPIPE
+            while proc.stdout.read(1 << 20):
+                pass
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise tarfile.ReadError("{} failed with exit code {}".format(command[0], returncode))
+        return names
 
     def extract_tar(self, extraction_path):
         """Extract tar in path."""
-        with tarfile.open(self.path) as content:
+        self.place(extraction_path, self.stream_tar)
+
+    def unzip(self, extraction_path):
+        """Extract zip in path and return its member names."""
+        with zipfile.ZipFile(self.path, 'r') as content:
             content.extractall(path=extraction_path)
+            return content.namelist()
 
     def extract_zip(self, extraction_path):
         """Extract zip in path."""
-        with zipfile.ZipFile(self.path, 'r') as content:
-            content.extractall(path=extraction_path)
+        self.place(extraction_path, self.unzip)
 
     def extract_go(self, extraction_path):
         """Pretend to do something."""
         return
 
 
+def create_sources(src_args):
+    """Create a Source for each tuple of arguments in src_args, in a process pool.
+
+    Creating a Source decompresses and stages its archive, and the archives
+    are independent of each other. The sources are returned in order.
+    """
+    if len(src_args) < 2:
+        return [Source(*args) for args in src_args]
+    workers = min(len(src_args), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(Source, *zip(*src_args)))
+
+
+def find_conflicts(sources, base_path):
+    """Return pairs of sources whose trees land in the same or nested directories."""
+    roots = []
+    for src in sources:
+        root = os.path.normpath(os.path.join(src.extraction_path(base_path), src.prefix or ""))
+        roots.append((root, src))
+    conflicts = []
+    for i, (root, src) in enumerate(roots):
+        for other_root, other in roots[i + 1:]:
+            if os.path.commonpath([root, other_root]) in (root, other_root):
+                conflicts.append((src, other))
+    return conflicts
+
+
 def convert_version(ver_str, name):
     """Remove disallowed characters from the version."""
     # banned substrings. It is better to remove these here instead of filtering
@@ -192,6 +366,17 @@ class Content(object):
         self.force_fullclone = force_fullclone
         self.archives_from_git = new_archives_from_git
         self.gem_subdir = str()
+        # opt-in cache of extracted archives, see Source
+        self.extract_cache = None
+        self.sha1sums = dict()
+        # number of archives downloaded at the same time, and number of
+        # times a failed download is retried
+        self.download_jobs = download.MAX_PARALLEL_DOWNLOADS
+        self.download_retries = download.RETRIES
+        # opt-in download.DownloadCache shared between packages, and the
+        # sha1s listed in the upstream file before this run rewrites it
+        self.download_cache = None
+        self.old_upstream = None
 
     def write_upstream(self, sha, tarfile, mode="w"):
         """Write the upstream hash to the upstream file."""
@@ -199,26 +384,107 @@ class Content(object):
                   os.path.join(sha, tarfile) + "\n", mode=mode)
 
     def extract_sources(self, main_src, archives_src):
-        """Extract sources."""
-        full_list_src = [main_src] + archives_src
+        """Extract sources.
+
+        Archives were staged when their Source was created, so this only puts
+        the trees in place, in order. Later archives overwrite files of earlier
+        ones, as a serial extraction would.
+        """
+        full_list_src = [src for src in [main_src] + archives_src if src.destination != ':']
+        for first, second in find_conflicts(full_list_src, self.base_path):
+            print_warning("{} and {} extract to the same directory, {} is extracted last".format(
+                first.url, second.url, second.url))
         for src in full_list_src:
-            if src.destination != ':':
-                src.extract(self.base_path)
+            src.extract(self.base_path)
+
+    def read_old_upstream(self):
+        """Remember the sha1 of each tarball listed in the upstream file."""
+        if self.old_upstream is not None:
+            return
+        self.old_upstream = dict()
+        try:
+            with open(os.path.join(self.config.download_path, "upstream")) as upstream:
+                for line in upstream:
+                    sha1, _, tarfile = line.strip().partition("/")
+                    self.old_upstream[tarfile] = sha1
+        except OSError:
+            pass
+
+    def get_cached_file(self, upstream_url, tarball_path):
+        """Link tarball_path to its copy in the download cache.
+
+        The sha1 the upstream file lists for the tarball is tried before the
+        url, so a fresh checkout finds its exact sources. Return the sha1 of
+        the tarball, or None if it is not cached.
+        """
+        if self.download_cache is None:
+            return None
+        sha1 = self.old_upstream.get(os.path.basename(tarball_path))
+        return self.download_cache.get(upstream_url, tarball_path, sha1)
 
     def check_or_get_file(self, upstream_url, tarfile, mode="w"):
-        """Download tarball from url unless it is present locally."""
+        """Download tarball from url unless it is present locally or cached."""
+        self.read_old_upstream()
         tarball_path = self.config.download_path + "/" + tarfile
         if not os.path.isfile(tarball_path):
-            download.do_curl(upstream_url, dest=tarball_path, is_fatal=True)
-            self.write_upstream(get_sha1sum(tarball_path), tarfile, mode)
+            sha1 = self.get_cached_file(upstream_url, tarball_path)
+            if sha1 is None:
+                digest = hashlib.sha1()
+                download.do_curl(upstream_url, dest=tarball_path, is_fatal=True, digest=digest,
+                                 retries=self.download_retries)
+                sha1 = digest.hexdigest()
+                if self.download_cache is not None:
+                    self.download_cache.add(tarball_path, sha1, upstream_url)
+            util.remember_digest(tarball_path, sha1)
         else:
-            self.write_upstream(get_sha1sum(tarball_path), tarfile, mode)
+            sha1 = util.file_digest(tarball_path)
+        self.sha1sums[tarball_path] = sha1
+        self.write_upstream(sha1, tarfile, mode)
         return tarball_path
 
+    def check_or_get_files(self, upstream_urls, mode="a"):
+        """Download the tarballs from upstream_urls that are not present locally or cached.
+
+        Missing tarballs are downloaded in parallel, and hashed while they are
+        downloaded. The upstream entries are written, and the local paths
+        returned, in the order of upstream_urls, the same as calling
+        check_or_get_file for each url in turn.
+        """
+        self.read_old_upstream()
+        tarball_paths = [self.config.download_path + "/" + os.path.basename(url) for url in upstream_urls]
+        cached = dict()
+        missing = OrderedDict()
+        for url, tarball_path in zip(upstream_urls, tarball_paths):
+            if tarball_path in missing or tarball_path in cached or os.path.isfile(tarball_path):
+                continue
+            sha1 = self.get_cached_file(url, tarball_path)
+            if sha1 is None:
+                missing[tarball_path] = url
+            else:
+                cached[tarball_path] = sha1
+        digests = {path: hashlib.sha1() for path in missing}
+        download.do_curl_many([(url, path, digests[path]) for path, url in missing.items()], is_fatal=True,
+                              max_parallel=self.download_jobs, retries=self.download_retries)
+        for path, url in missing.items():
+            cached[path] = digests[path].hexdigest()
+            if self.download_cache is not None:
+                self.download_cache.add(path, cached[path], url)
+        for path, sha1 in cached.items():
+            util.remember_digest(path, sha1)
+        for url, tarball_path in zip(upstream_urls, tarball_paths):
+            if tarball_path in cached:
+                sha1 = cached[tarball_path]
+            else:
+                sha1 = util.file_digest(tarball_path)
+            self.sha1sums[tarball_path] = sha1
+            self.write_upstream(sha1, os.path.basename(url), mode)
+        return tarball_paths
+
     def process_main_source(self, url):
         """Download and get important information from main source code."""
         src_path = self.check_or_get_file(url, os.path.basename(url))
-        main_src = Source(url, '', src_path, self.config.default_pattern)
+        main_src = Source(url, '', src_path, self.config.default_pattern, self.sha1sums.get(src_path),
+                          self.extract_cache, self.base_path)
         return main_src
 
     def print_header(self):
@@ -455,18 +721,21 @@ class Content(object):
             self.process_multiver_archives(main_src, multiver_archives)
 
         full_archives = self.archives + go_archives + multiver_archives
-        # Download and extract full list
-        for arch_url, destination in zip(full_archives[::2], full_archives[1::2]):
+        # Download full list
+        src_args = []
+        src_paths = self.check_or_get_files(full_archives[::2], mode="a")
+        for arch_url, destination, src_path in zip(full_archives[::2], full_archives[1::2], src_paths):
             if util.debugging:
                 print_debug("arch_url 3: {} - {}".format(arch_url, destination))
-            src_path = self.check_or_get_file(arch_url, os.path.basename(arch_url), mode="a")
-            # Create source object and extract archive
-            archive = Source(arch_url, destination, src_path, self.config.default_pattern)
+            src_args.append((arch_url, destination, src_path, self.config.default_pattern,
+                             self.sha1sums.get(src_path), self.extract_cache, self.base_path))
+
+        # Create source objects, which stages the archives
+        src_objects = create_sources(src_args)
+        for archive in src_objects:
             # Add archive prefix to list
-            self.config.archive_details[arch_url + "prefix"] = archive.prefix
-            self.prefixes[arch_url] = archive.prefix
-            # Add archive to list
-            src_objects.append(archive)
+            self.config.archive_details[archive.url + "prefix"] = archive.prefix
+            self.prefixes[archive.url] = archive.prefix
 
         return src_objects
 
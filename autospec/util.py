@@ -17,10 +17,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import atexit
 import hashlib
+import json
 import os
 import re
 import shlex
+import shutil
 import subprocess
 import sys
 
@@ -28,6 +31,15 @@ dictionary_filename = os.path.dirname(__file__) + "/translate.dic"
 dictionary = [line.strip() for line in open(dictionary_filename, 'r')]
 os_paths = None
 debugging : bool = False
+# read buffer used when streaming large logs, see iter_lines
+LINE_BUFFER_SIZE = 1024 * 1024
+# read size used when hashing files, see file_digest
+HASH_BLOCK_SIZE = 1024 * 1024
+# where file_digest remembers digests between runs, once keep_digest_memo
+# is called, and how many it keeps
+DIGEST_MEMO = os.path.expanduser("~/.cache/autospec/digests.json")
+DIGEST_MEMO_SIZE = 1000
+_digest_memo = None
 
 
 def scantree(path):
@@ -39,6 +51,70 @@ def scantree(path):
             yield entry
 
 
+def scandirs(root):
+    """Return the real (not symlinked) directories below root.
+
+    Paths are relative to root and start with "/", so that they can be
+    compared with %files entries.
+    """
+    root = root.rstrip("/")
+    dirs = set()
+    pending = [root]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.add(entry.path[len(root):])
+                    pending.append(entry.path)
+    return dirs
+
+
+def link_tree(src, dst):
+    """Populate dst with the contents of src without copying file data.
+
+    A reflink copy is used where the filesystem supports it, otherwise files
+    are hardlinked (or copied when src and dst are on different devices).
+    Hardlinked files share their data with src, so they must not be modified
+    in place.
+    """
+    os.makedirs(dst, exist_ok=True)
+    result = subprocess.run(["cp", "-a", "--reflink=always", os.path.join(src, "."), dst],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if result.returncode == 0:
+        return
+
+    shutil.copytree(src, dst, symlinks=True, copy_function=link_file, dirs_exist_ok=True)
+
+
+def link_file(src, dst):
+    """Hardlink src to dst, copying it when that is not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def move_tree(src, dst):
+    """Move the contents of src into dst, merging with directories already there."""
+    os.makedirs(dst, exist_ok=True)
+    for entry in os.scandir(src):
+        target = os.path.join(dst, entry.name)
+        target_is_dir = os.path.isdir(target) and not os.path.islink(target)
+        if entry.is_dir(follow_symlinks=False) and target_is_dir:
+            move_tree(entry.path, target)
+            continue
+        # replace what is there, as extracting over it would
+        if target_is_dir:
+            shutil.rmtree(target)
+        elif os.path.lexists(target):
+            os.unlink(target)
+        shutil.move(entry.path, target)
+
+
 def call(command, logfile=None, check=True, **kwargs):
     """Subprocess.call convenience wrapper."""
     returncode = 1
@@ -95,11 +171,99 @@ def get_contents(filename):
     return None
 
 
+def iter_lines(filename):
+    """Yield the lines of filename one at a time.
+
+    The file is read through a bounded buffer, so memory use does not grow
+    with the size of the file (mock build logs can be hundreds of MB).
+    """
+    with open_auto(filename, "r", LINE_BUFFER_SIZE) as f:
+        for line in f:
+            yield line
+
+
+def _load_digest_memo():
+    """Return the digest memo, empty until keep_digest_memo reads DIGEST_MEMO."""
+    global _digest_memo
+    if _digest_memo is None:
+        _digest_memo = {}
+    return _digest_memo
+
+
+def keep_digest_memo():
+    """Remember digests between runs: read DIGEST_MEMO, and save to it at exit.
+
+    Without this, digests are only remembered for the life of the process.
+    """
+    global _digest_memo
+    try:
+        with open(DIGEST_MEMO) as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        memo = {}
+    # digests of this run are the most recent
+    memo.update(_load_digest_memo())
+    _digest_memo = memo
+    atexit.register(save_digest_memo)
+
+
+def save_digest_memo():
+    """Write the digest memo back to DIGEST_MEMO."""
+    if not _digest_memo:
+        return
+    try:
+        os.makedirs(os.path.dirname(DIGEST_MEMO), exist_ok=True)
+        tmp = "{}.{}.tmp".format(DIGEST_MEMO, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(_digest_memo, f)
+        os.replace(tmp, DIGEST_MEMO)
+    except OSError:
+        # the memo only saves work, a run without it is still correct
+        pass
+
+
+def remember_digest(filename, hexdigest, algorithm="sha1"):
+    """Record hexdigest as the digest of filename in its current state."""
+    st = os.stat(filename)
+    key = "{}:{}".format(algorithm, os.path.abspath(filename))
+    memo = _load_digest_memo()
+    # re-inserting keeps the most recently hashed files at the end
+    memo.pop(key, None)
+    memo[key] = [st.st_size, st.st_mtime_ns, st.st_ino, hexdigest]
+    while len(memo) > DIGEST_MEMO_SIZE:
+        del memo[next(iter(memo))]
+
+
+def file_digest(filename, algorithm="sha1", memo=True):
+    """Return the hex digest of filename using the named hashlib algorithm.
+
+    The file is hashed in blocks of HASH_BLOCK_SIZE. With memo, digests are
+    remembered by path, size, mtime and inode, and saved to DIGEST_MEMO when
+    autospec exits if keep_digest_memo was called, so a file that has not
+    changed since it was last hashed is not read again. This is meant for large files such as source
+    archives, small files are cheaper to hash again.
+    """
+    if memo:
+        st = os.stat(filename)
+        key = "{}:{}".format(algorithm, os.path.abspath(filename))
+        entry = _load_digest_memo().get(key)
+        if entry and entry[:3] == [st.st_size, st.st_mtime_ns, st.st_ino]:
+            _digest_memo[key] = _digest_memo.pop(key)
+            return entry[3]
+
+    digest = hashlib.new(algorithm)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    hexdigest = digest.hexdigest()
+    if memo:
+        remember_digest(filename, hexdigest, algorithm)
+    return hexdigest
+
+
 def get_sha1sum(filename):
     """Get sha1 sum of filename."""
-    sh = hashlib.sha1()
-    sh.update(get_contents(filename))
-    return sh.hexdigest()
+    return file_digest(filename, "sha1", memo=False)
 
 
 def _supports_color():
@@ -1,4 +1,10 @@
+import concurrent.futures
+import os
+import shutil
+import tempfile
 import unittest
+from unittest.mock import patch
+
 import abireport
 
 
@@ -175,6 +181,132 @@ class TestAbireport(unittest.TestCase):
         self.assertEqual(dumpsymbols.exception.code, 1)
 
 
+LIBTEST = os.path.join(os.path.dirname(__file__), 'testfiles', 'abireport', 'libtest.so.1')
+RPM = os.path.join(os.path.dirname(__file__), 'testfiles', 'abireport', 'libtest-1.0-1.x86_64.rpm')
+
+
+class TestAbireportNative(unittest.TestCase):
+
+    def test_native(self):
+        """
+        Test shared objects are inspected without running any tools, with the
+        same results nm, objdump, readelf and file give
+        """
+        with patch('abireport.get_output', side_effect=AssertionError):
+            self.assertTrue(abireport.is_file_valid(LIBTEST))
+            self.assertTrue(abireport.is_dynamic_binary(LIBTEST))
+            self.assertFalse(abireport.is_dynamic_binary(__file__))
+            self.assertEqual(abireport.get_soname(LIBTEST), 'libtest.so.1')
+            self.assertEqual(abireport.get_shared_dependencies(LIBTEST), set(['libc.so.6']))
+            self.assertEqual(abireport.dump_symbols(LIBTEST),
+                             set(['TEST_1.0', 'TEST_2.0', 'test_init@@TEST_1.0', 'test_run@@TEST_2.0']))
+
+    def test_native_fallback(self):
+        """
+        Test objects the ELF reader cannot parse are handed to the tools
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'libbroken.so')
+            with open(path, 'wb') as f:
+                f.write(b'\x7fELF\x09')
+            with patch('abireport.get_output', return_value='SONAME               libbroken.so.1') as output:
+                self.assertEqual(abireport.get_soname(path), 'libbroken.so.1')
+        output.assert_called_once()
+
+    def test_get_all_dependencies(self):
+        """
+        Test dependencies are collected from every binary in a tree, in a
+        process pool
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, 'lib'))
+            for name in ('libtest.so.1', 'libcopy.so'):
+                shutil.copy(LIBTEST, os.path.join(tmpd, 'lib', name))
+            with open(os.path.join(tmpd, 'README'), 'w') as f:
+                f.write('libc.so.6\n')
+            with patch('abireport.concurrent.futures.ProcessPoolExecutor',
+                       wraps=concurrent.futures.ProcessPoolExecutor) as pool:
+                self.assertEqual(abireport.get_all_dependencies(tmpd), set(['libc.so.6']))
+        pool.assert_called_once()
+
+    def test_inspect_binary(self):
+        """
+        Test the file magic is read once per file, and without running file
+        """
+        with patch('abireport.get_output', side_effect=AssertionError), \
+                patch('abireport.get_file_magic', wraps=abireport.get_file_magic) as magic:
+            self.assertEqual(abireport.inspect_binary(LIBTEST), ('libtest.so.1', set(['libc.so.6'])))
+            self.assertEqual(abireport.inspect_binary(__file__), (None, None))
+        self.assertEqual(magic.call_count, 2)
+
+    def test_map_files_order(self):
+        """
+        Test map_files returns results in the order of the paths
+        """
+        paths = ['/{}/f{}'.format(i % 3, i) for i in range(50)]
+        self.assertEqual(abireport.map_files(os.path.basename, paths), ['f{}'.format(i) for i in range(50)])
+
+
+class TestAbireportRpms(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpd.cleanup)
+        self.results = os.path.join(self.tmpd.name, 'results')
+        os.mkdir(self.results)
+        patcher = patch('abireport.ABI_CACHE_DIR', os.path.join(self.tmpd.name, 'abi'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, name):
+        with open(os.path.join(self.tmpd.name, name)) as f:
+            return f.read()
+
+    def test_examine_abi_fallback(self):
+        """
+        Test the symbols and used_libs reports are written from the rpms
+        without extracting them
+        """
+        shutil.copy(RPM, self.results)
+        shutil.copy(RPM, os.path.join(self.results, 'libtest-dev-1.0-1.x86_64.rpm'))
+        with patch('abireport.subprocess.check_call', side_effect=AssertionError):
+            abireport.examine_abi_fallback(self.tmpd.name, self.results, 'libtest')
+        self.assertEqual(self.read('symbols'),
+                         'libtest.so.1:TEST_1.0\n'
+                         'libtest.so.1:TEST_2.0\n'
+                         'libtest.so.1:test_init@@TEST_1.0\n'
+                         'libtest.so.1:test_run@@TEST_2.0\n')
+        self.assertEqual(self.read('used_libs'), 'libc.so.6\n')
+        self.assertNotIn('__extraction', os.listdir(self.tmpd.name))
+
+    def test_examine_abi_fallback_cached(self):
+        """
+        Test objects already scanned for the last report of the package are
+        not parsed again
+        """
+        shutil.copy(RPM, self.results)
+        abireport.examine_abi_fallback(self.tmpd.name, self.results, 'libtest')
+        symbols = self.read('symbols')
+        os.unlink(os.path.join(self.tmpd.name, 'symbols'))
+        os.unlink(os.path.join(self.tmpd.name, 'used_libs'))
+        self.assertEqual(os.listdir(os.path.join(self.tmpd.name, 'abi')), ['libtest.json'])
+        with patch('abireport.elf.ElfFile', side_effect=AssertionError):
+            abireport.examine_abi_fallback(self.tmpd.name, self.results, 'libtest')
+        self.assertEqual(self.read('symbols'), symbols)
+        self.assertEqual(self.read('used_libs'), 'libc.so.6\n')
+
+    def test_examine_abi_fallback_extract(self):
+        """
+        Test rpms that cannot be read directly are extracted instead
+        """
+        with open(os.path.join(self.results, 'libtest-1.0-1.x86_64.rpm'), 'wb') as f:
+            f.write(b'not an rpm')
+        with patch('abireport.extract_rpms', return_value=([], set(['libc.so.6']))) as extract:
+            abireport.examine_abi_fallback(self.tmpd.name, self.results, 'libtest')
+        extract.assert_called_once_with(self.tmpd.name, [os.path.join(self.results, 'libtest-1.0-1.x86_64.rpm')])
+        self.assertEqual(self.read('used_libs'), 'libc.so.6\n')
+
+
 READELF1 = """
 
 Dynamic section at offset 0x2d0788 contains 31 entries:
@@ -1,6 +1,8 @@
 import unittest
 import tempfile
 import os
+import signal
+import subprocess
 from unittest.mock import patch, mock_open, MagicMock
 import build
 import buildreq
@@ -493,6 +495,123 @@ class TestBuildpattern(unittest.TestCase):
         # check no files were added
         self.assertEqual(pkg.must_restart, 0)
 
+    def test_build_log_parser_files_batch(self):
+        """
+        Test BuildLogParser hands the unpackaged file listing to the file
+        manager as one batch once the listing ends
+        """
+        conf = config.Config('')
+        conf.setup_patterns()
+        reqs = buildreq.Requirements("")
+        conf.config_opts['altcargo1'] = False
+        tcontent = tarball.Content("", "testpkg", "", [], conf, "/", "", False, "", [], False, False)
+        pkg = build.Build()
+        fm = files.FileManager(conf, pkg, "", None)
+        fm.fix_broken_pkg_config_versioning = lambda name: None
+        batches = []
+        fm.push_files = lambda filenames, pkg_name: batches.append((list(filenames), pkg_name))
+        parser = build.BuildLogParser(pkg, 0, fm, conf, reqs, tcontent)
+        for line in ['line 1\n',
+                     'Installed (but unpackaged) file(s) found:\n',
+                     '/usr/testdir/file\n',
+                     '\n',
+                     '/usr/testdir/file1\n']:
+            parser.feed(line)
+        self.assertEqual(batches, [])
+        parser.feed('RPM build errors\n')
+        parser.feed('/usr/testdir/file2\n')
+        parser.finish()
+        self.assertEqual(batches, [(['/usr/testdir/file', '/usr/testdir/file1'], 'testpkg')])
+
+    def test_call_mock_tailing_early_restart(self):
+        """
+        Test call_mock_tailing stops the command as soon as the log it writes
+        shows a missing build requirement
+        """
+        conf = config.Config('')
+        conf.setup_patterns()
+        reqs = buildreq.Requirements("")
+        pkg = build.Build()
+        pkg.short_circuit = None
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, 'build.log')
+            command = "sh -c 'echo line 1 > build.log; " \
+                      "echo checking for Apache test module support >> build.log; " \
+                      "exec sleep 60'"
+            ret = pkg.call_mock_tailing(command, os.path.join(tmpd, 'mock_build.log'), log, conf, reqs, tmpd)
+
+        self.assertNotEqual(ret, 0)
+        self.assertIn('httpd-dev', reqs.buildreqs)
+        self.assertEqual(pkg.must_restart, 1)
+
+    def test_package_early_restart(self):
+        """
+        Test package stops a mock build running under sudo through sudo kill,
+        and counts the killed build as a restart rather than a failure
+        """
+        conf = config.Config('')
+        conf.setup_patterns()
+        conf.config_opts['altcargo1'] = False
+        reqs = buildreq.Requirements("")
+        tcontent = tarball.Content("", "testpkg", "", [], conf, "/", "", False, "", [], False, False)
+        pkg = build.Build()
+        pkg.early_restart = True
+        fm = files.FileManager(conf, pkg, "", None)
+        procs = []
+        calls = []
+
+        class SudoPopen(subprocess.Popen):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                procs.append(self)
+
+            def terminate(self):
+                raise PermissionError
+
+        def fake_call(cmd, **kwargs):
+            calls.append(cmd)
+            if cmd.startswith('sudo kill -TERM '):
+                os.kill(int(cmd.split()[-1]), signal.SIGTERM)
+            return 0
+
+        with tempfile.TemporaryDirectory() as tmpd:
+            conf.download_path = tmpd
+            mock = os.path.join(tmpd, 'mock')
+            with open(mock, 'w') as f:
+                f.write('#!/bin/sh\n'
+                        'echo ok > results/root.log\n'
+                        'echo checking for Apache test module support > results/build.log\n'
+                        'exec sleep 60\n')
+            os.chmod(mock, 0o755)
+            with patch('build.get_mock_cmd', return_value=mock), \
+                    patch('build.subprocess.Popen', SudoPopen), \
+                    patch('build.util.call', side_effect=fake_call):
+                pkg.package(fm, 'clear', '', conf, reqs, tcontent, tmpd, None, False)
+
+        self.assertEqual(len(procs), 1)
+        self.assertEqual(procs[0].returncode, -signal.SIGTERM)
+        self.assertIn('sudo kill -TERM {}'.format(procs[0].pid), calls)
+        self.assertIn('httpd-dev', reqs.buildreqs)
+        self.assertEqual(pkg.must_restart, 1)
+        self.assertEqual(pkg.success, 0)
+
+    def test_call_mock_tailing_no_restart(self):
+        """
+        Test call_mock_tailing lets the command finish when nothing is learned
+        """
+        conf = config.Config('')
+        conf.setup_patterns()
+        reqs = buildreq.Requirements("")
+        pkg = build.Build()
+        pkg.short_circuit = None
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, 'build.log')
+            command = "sh -c 'echo line 1 > build.log'"
+            ret = pkg.call_mock_tailing(command, os.path.join(tmpd, 'mock_build.log'), log, conf, reqs, tmpd)
+
+        self.assertEqual(ret, 0)
+        self.assertEqual(pkg.must_restart, 0)
+
     def test_get_mock_cmd_without_consolehelper(self):
         """
         Test get_mock_cmd when /usr/bin/mock doesn't point to consolehelper
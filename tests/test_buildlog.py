@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+import buildlog
+import config
+import count
+import logcheck
+
+
+class TestPatternMatcher(unittest.TestCase):
+
+    def test_required_literal(self):
+        """
+        Test required_literal picks the longest top-level literal run
+        """
+        self.assertEqual(buildlog.required_literal(r"checking for (.*?)\.\.\. no"), "checking for ")
+        self.assertEqual(buildlog.required_literal(r"(?:-- )?(?:Could|Did) (?:NOT|not) find ([a-z]+)"), " find ")
+
+    def test_required_literal_none(self):
+        """
+        Test required_literal without a usable literal
+        """
+        self.assertIsNone(buildlog.required_literal(r"(foo|bar)"))
+        self.assertIsNone(buildlog.required_literal(r"(?i)checking for (.*)"))
+
+    def test_candidates_no_match(self):
+        """
+        Test that an ordinary compiler line is rejected by the prefilter
+        """
+        conf = config.Config('')
+        matcher = conf.get_pattern_matcher()
+        self.assertEqual(matcher.candidates("gcc -O2 -c foo.c -o foo.o\n"), matcher.unkeyed)
+
+    def test_candidates_same_as_full_scan(self):
+        """
+        Test that filtering through candidates gives the same matches, in the
+        same order, as running every pattern against the line
+        """
+        conf = config.Config('')
+        matcher = conf.get_pattern_matcher()
+        self.assertIs(matcher, conf.get_pattern_matcher())
+        with open('tests/builderrors', 'r') as f:
+            lines = [line.split('|')[0] for line in f if not line.startswith('#')]
+        lines.append("checking for Apache test module support")
+        lines.append("which: no qmake")
+        for line in lines:
+            full = [(kind, pat) for _, kind, pat in matcher.entries if pat[0].search(line)]
+            fast = [(kind, pat) for kind, pat in matcher.candidates(line) if pat[0].search(line)]
+            self.assertEqual(full, fast)
+            self.assertTrue(fast)
+
+
+class Collector(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def feed(self, line):
+        self.lines.append(line)
+
+
+class TestLogPipeline(unittest.TestCase):
+
+    def test_run(self):
+        """
+        Test that every consumer sees every line, in order
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'build.log')
+            with open(path, 'w') as f:
+                f.write('line 1\nline 2\n')
+            first = Collector()
+            second = Collector()
+            pipeline = buildlog.LogPipeline([first])
+            pipeline.register(second)
+            pipeline.run(path)
+        self.assertEqual(first.lines, ['line 1\n', 'line 2\n'])
+        self.assertEqual(second.lines, first.lines)
+
+    def test_run_shared_consumers(self):
+        """
+        Test the logcheck and count consumers give the same results when fed
+        from a single pipeline as when reading the log themselves
+        """
+        log = ('checking for foo... no\n'
+               'checking for bar... yes\n'
+               '+ make check\n'
+               'Ran 3 tests in 0.1s\n'
+               'OK (skipped=1)\n')
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, 'results'))
+            path = os.path.join(tmpd, 'results', 'build.log')
+            with open(path, 'w') as f:
+                f.write(log)
+
+            expected_count = count.parse_log(path)
+            logcheck.logcheck(tmpd)
+            with open(os.path.join(tmpd, 'configure_misses')) as f:
+                expected_misses = f.read()
+            os.unlink(os.path.join(tmpd, 'configure_misses'))
+            # count keeps its per-package totals in module globals
+            for totals in (count.testcount, count.testpass, count.testfail, count.testxfail, count.testskip):
+                totals.clear()
+
+            checker = logcheck.LogChecker()
+            counter = count.ResultCounter()
+            buildlog.LogPipeline([checker, counter]).run(path)
+            logcheck.logcheck(tmpd, checker)
+            with open(os.path.join(tmpd, 'configure_misses')) as f:
+                misses = f.read()
+
+        self.assertEqual(misses, expected_misses)
+        self.assertEqual(misses, 'Configure miss: foo')
+        self.assertEqual(counter.finish(), expected_count)
+
+
+class TestLogTailer(unittest.TestCase):
+
+    def test_read_lines(self):
+        """
+        Test read_lines returns only complete lines appended since the last
+        call, and nothing before the log exists
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'build.log')
+            tailer = buildlog.LogTailer(path)
+            self.assertEqual(tailer.read_lines(), [])
+            with open(path, 'w') as f:
+                f.write('line 1\nline')
+                f.flush()
+                self.assertEqual(tailer.read_lines(), ['line 1\n'])
+                self.assertEqual(tailer.read_lines(), [])
+                f.write(' 2\nline 3\n')
+                f.flush()
+                self.assertEqual(tailer.read_lines(), ['line 2\n', 'line 3\n'])
+            tailer.close()
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
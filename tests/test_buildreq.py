@@ -22,6 +22,17 @@ class TestBuildreq(unittest.TestCase):
         """
         self.reqs = buildreq.Requirements("")
         self.reqs.banned_buildreqs.add('bannedreq')
+        # keep pypi lookups off the network and out of the user's cache
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpd.cleanup)
+        for cache in ('name_cache', 'metadata_cache'):
+            patcher = patch('pypidata.' + cache,
+                            pypidata.TTLCache(os.path.join(self.tmpd.name, cache + '.json'), 3600))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('pypidata.query_pypi', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_add_buildreq(self):
         """
@@ -370,6 +381,27 @@ class TestBuildreq(unittest.TestCase):
         self.assertEqual(self.reqs.buildreqs, set(['pypi(req1)', 'pypi(req2)', 'pypi(req7)']))
         self.assertEqual(self.reqs.requires["python3"], set(['pypi(req1)', 'pypi(req2)', 'pypi(req7)']))
 
+    @patch('buildreq.pypidata.get_pypi_name', get_pypi_name_wrapper)
+    def test_add_setup_py_requires_prefetch(self):
+        """
+        Test add_setup_py_requires looks up the pypi names of all requirements
+        in one batch before adding them
+        """
+        open_name = 'buildreq.util.open_auto'
+        content = "setup_requires=['req1']\n"       \
+                  "install_requires=['req2',\n"     \
+                  "'Req-7>=1.0',\n"                 \
+                  "some_variable]\n"
+        m_open = mock_open(read_data=content)
+        with patch(open_name, m_open, create=True), \
+                patch('buildreq.pypidata.search_names') as m_search:
+            self.reqs.add_setup_py_requires('filename', [])
+
+        m_search.assert_called_once()
+        self.assertEqual(list(m_search.call_args[0][0]), ['req1', 'req2', 'req_7'])
+        self.assertEqual(self.reqs.buildreqs, set(['pypi(req1)', 'pypi(req2)', 'pypi(req_7)']))
+        self.assertEqual(self.reqs.requires["python3"], set(['pypi(req2)', 'pypi(req_7)']))
+
     @patch('buildreq.pypidata.get_pypi_name', get_pypi_name_wrapper)
     def test_add_setup_py_requires_multiline_formatted(self):
         """
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import config
 
@@ -56,6 +58,31 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(conf.default_pattern, "make")
         self.assertEqual(conf.pattern_strength, 2)
 
+    def test_setup_patterns_file_overrides(self):
+        """
+        Test the file_overrides config file is indexed by package name
+        """
+        conf = config.Config("")
+        conf.setup_patterns()
+        self.assertIn("gcc", conf.file_overrides)
+        self.assertNotIn("make", conf.file_overrides)
+        self.assertIn((r"^/usr/lib64/libgcc_s\.so\.1$", "libgcc1", "", "", True), conf.file_overrides["gcc"])
+        self.assertEqual(conf.file_overrides["gmp"][-1], (r"^/usr/lib64/haswell/libgmp\.so\.(?:[0-9\.])*$", "lib-hsw"))
+
+    def test_read_file_overrides_path(self):
+        """
+        Test a section in the path version of file_overrides replaces the repo
+        section and keeps the order of its rules
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            with open(os.path.join(tmpd, "file_overrides"), "w") as f:
+                f.write("# comment\n[gmp]\n^/usr/lib64/a, lib-a\n^/usr/lib64/, -n extra\n[foo]\n^/usr/bin/foo$, bin\n")
+            overrides = {}
+            config.read_file_overrides("file_overrides", overrides, path=tmpd)
+        self.assertEqual(overrides["gmp"], [("^/usr/lib64/a", "lib-a"), ("^/usr/lib64/", "extra", "", "", True)])
+        self.assertEqual(overrides["foo"], [("^/usr/bin/foo$", "bin")])
+        self.assertIn("gcc", overrides)
+
 # Create dynamic tests
 create_dynamic_tests()
 
@@ -486,6 +486,24 @@ class TestCount(unittest.TestCase):
     def setUp(self):
         count.zero_test_data()
 
+    def test_counter_resets(self):
+        """
+        Test a new ResultCounter starts from zero, as one is made for each
+        build round
+        """
+        lines = ['+ make check\n', 'Ran 12 tests in 0.5s\n', 'OK (SKIP=2)\n']
+        # a round stopped before its log is finished
+        counter = count.ResultCounter('pkg')
+        for line in lines[:2]:
+            counter.feed(line)
+        results = []
+        for _ in range(2):
+            counter = count.ResultCounter('pkg')
+            for line in lines:
+                counter.feed(line)
+            results.append(counter.finish())
+        self.assertEqual(results, ['pkg,12,10,0,2,0'] * 2)
+
 
 def test_generator(line, expected):
     """
@@ -1,4 +1,11 @@
 from enum import Enum, auto
+import hashlib
+import http.server
+import os
+import re
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch, mock_open, call
 
@@ -102,17 +109,20 @@ class TestDownload(unittest.TestCase):
         data = download.do_curl("foo", is_fatal=True)
         test_exit.assert_called_once_with(1)
 
+    @patch('download.os.replace')
     @patch('download.open', new_callable=mock_open)
     @patch('download.pycurl.Curl')
-    def test_download_get_success_dest(self, test_curl, test_open):
+    def test_download_get_success_dest(self, test_curl, test_open, test_replace):
         """
         Test successful GET request when dest is set.
         """
         instance = init_curl_instance(test_curl)
         instance.setopt.side_effect = test_opts
         data = download.do_curl("foo", "testdest")
-        test_open.assert_called_once_with('testdest', 'wb')
+        test_open.assert_called_once_with('testdest.part', 'wb')
         test_open().write.assert_called_once_with(b'foobar')
+        test_replace.assert_called_once_with('testdest.part', 'testdest')
+        self.assertEqual(data, 'testdest')
 
     @patch('download.os.path.exists')
     @patch('download.open', new_callable=mock_open)
@@ -156,9 +166,291 @@ class TestDownload(unittest.TestCase):
         test_open.side_effect = IOError
         test_path.return_value = True
         data = download.do_curl("foo", "testdest")
-        test_path.assert_called_once_with("testdest")
-        test_unlink.assert_called_once_with("testdest")
+        test_path.assert_called_once_with("testdest.part")
+        test_unlink.assert_called_once_with("testdest.part")
 
+    def test_download_stream_dest(self):
+        """
+        Test a dest download is hashed while it is written, and leaves no
+        partial file behind on success or failure
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            src = os.path.join(tmpd, 'src')
+            data = os.urandom(1 << 20)
+            with open(src, 'wb') as f:
+                f.write(data)
+            dest = os.path.join(tmpd, 'dest')
+            digest = hashlib.sha1()
+            self.assertEqual(download.do_curl('file://' + src, dest, digest=digest), dest)
+            self.assertEqual(digest.hexdigest(), hashlib.sha1(data).hexdigest())
+            with open(dest, 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+            self.assertIsNone(download.do_curl('file://' + os.path.join(tmpd, 'missing'),
+                                               os.path.join(tmpd, 'destmissing')))
+            self.assertEqual(sorted(os.listdir(tmpd)), ['dest', 'src'])
+
+
+class TestDownloadMany(unittest.TestCase):
+
+    def test_download_many_order(self):
+        """
+        Test parallel downloads return the do_curl results in request order,
+        with None for a failed transfer
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            downloads = []
+            for idx in range(5):
+                src = os.path.join(tmpd, 'src{}'.format(idx))
+                with open(src, 'w') as f:
+                    f.write('data {}\n'.format(idx))
+                downloads.append(('file://' + src, os.path.join(tmpd, 'dest{}'.format(idx))))
+            downloads.insert(2, ('file://' + os.path.join(tmpd, 'missing'), os.path.join(tmpd, 'destmissing')))
+
+            results = download.do_curl_many(downloads, max_parallel=3)
+            self.assertEqual(results, [dest if 'missing' not in dest else None for _, dest in downloads])
+            for idx in range(5):
+                with open(os.path.join(tmpd, 'dest{}'.format(idx))) as f:
+                    self.assertEqual(f.read(), 'data {}\n'.format(idx))
+            self.assertNotIn('destmissing', os.listdir(tmpd))
+
+    def test_download_many_reuses_handles(self):
+        """
+        Test each worker thread runs all its transfers on a single Curl handle
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            downloads = []
+            for idx in range(6):
+                src = os.path.join(tmpd, 'src{}'.format(idx))
+                with open(src, 'w') as f:
+                    f.write('data {}\n'.format(idx))
+                downloads.append(('file://' + src, os.path.join(tmpd, 'dest{}'.format(idx))))
+            for max_parallel in (1, 2):
+                with patch('download.pycurl.Curl', wraps=pycurl.Curl) as test_curl:
+                    results = download.do_curl_many(downloads, max_parallel=max_parallel)
+                self.assertEqual(results, [dest for _, dest in downloads])
+                self.assertLessEqual(test_curl.call_count, max_parallel)
+
+    @patch('download.do_curl')
+    def test_download_many_fatal(self, test_do_curl):
+        """
+        Test a fatal failure in a worker thread still exits the program
+        """
+        test_do_curl.side_effect = SystemExit(1)
+        with self.assertRaises(SystemExit):
+            download.do_curl_many([('foo', 'foodest'), ('bar', 'bardest')], is_fatal=True)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serve server.payload, honouring Range unless server.ranges is False.
+
+    While server.cut is above zero, a response is cut off halfway through
+    and server.cut is decremented.
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('Range')))
+        if self.path != '/file':
+            self.send_error(server.status)
+            return
+        data = server.payload
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range') or '')
+        start = int(match.group(1)) if match and server.ranges else 0
+        if start >= len(data) and start:
+            self.send_error(416)
+            return
+        if start:
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.cut > 0:
+            server.cut -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.server.payload = os.urandom(1 << 18)
+        self.server.requests = []
+        self.server.ranges = True
+        self.server.cut = 0
+        self.server.status = 404
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        self.tmpd = tempfile.mkdtemp()
+        self.dest = os.path.join(self.tmpd, 'dest')
+        delay = patch('download.RETRY_DELAY', 0)
+        delay.start()
+        self.addCleanup(delay.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        for name in os.listdir(self.tmpd):
+            os.unlink(os.path.join(self.tmpd, name))
+        os.rmdir(self.tmpd)
+
+    def check_dest(self, digest):
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), self.server.payload)
+        self.assertEqual(digest.hexdigest(), hashlib.sha1(self.server.payload).hexdigest())
+        self.assertEqual(os.listdir(self.tmpd), ['dest'])
+
+    def test_resume_after_cut(self):
+        """
+        Test an interrupted transfer is retried from where it stopped
+        """
+        self.server.cut = 2
+        digest = hashlib.sha1()
+        self.assertEqual(download.do_curl(self.url + 'file', self.dest, digest=digest), self.dest)
+        self.check_dest(digest)
+        size = len(self.server.payload)
+        self.assertEqual(self.server.requests, [('/file', None),
+                                                ('/file', 'bytes={}-'.format(size // 2)),
+                                                ('/file', 'bytes={}-'.format(size - size // 4))])
+
+    def test_give_up_keeps_part(self):
+        """
+        Test the .part file is kept after the last retry fails, and resumed
+        by the next call
+        """
+        self.server.cut = 2
+        self.assertIsNone(download.do_curl(self.url + 'file', self.dest, retries=1))
+        self.assertEqual(os.listdir(self.tmpd), ['dest.part'])
+        digest = hashlib.sha1()
+        self.assertEqual(download.do_curl(self.url + 'file', self.dest, digest=digest), self.dest)
+        self.check_dest(digest)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_resume_unsupported(self):
+        """
+        Test a kept .part file is discarded when the server ignores Range
+        """
+        self.server.ranges = False
+        with open(self.dest + '.part', 'wb') as f:
+            f.write(b'stale')
+        digest = hashlib.sha1()
+        self.assertEqual(download.do_curl(self.url + 'file', self.dest, digest=digest), self.dest)
+        self.check_dest(digest)
+
+    def test_resume_unsupported_after_cut(self):
+        """
+        Test a transfer that was cut off starts over when the server ignores
+        Range, with the bytes already hashed counted once
+        """
+        self.server.ranges = False
+        self.server.cut = 1
+        digest = hashlib.sha1()
+        self.assertEqual(download.do_curl(self.url + 'file', self.dest, digest=digest), self.dest)
+        self.check_dest(digest)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_no_retry_not_found(self):
+        """
+        Test a missing file fails at once, and a server error is retried
+        """
+        self.assertIsNone(download.do_curl(self.url + 'missing', self.dest))
+        self.assertEqual(len(self.server.requests), 1)
+        self.server.status = 503
+        self.assertIsNone(download.do_curl(self.url + 'missing', self.dest, retries=2))
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(os.listdir(self.tmpd), [])
+
+
+class TestDownloadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpd.cleanup)
+        os.mkdir(os.path.join(self.tmpd.name, 'cache'))
+        self.cache = download.DownloadCache(os.path.join(self.tmpd.name, 'cache'), max_size=10)
+
+    def make_file(self, name, data):
+        path = os.path.join(self.tmpd.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path, hashlib.sha1(data).hexdigest()
+
+    def test_get_by_url_and_sha1(self):
+        """
+        Test a cached file is found by url or by sha1 and linked to dest
+        """
+        path, sha1 = self.make_file('a.tar.gz', b'aaaa')
+        dest = os.path.join(self.tmpd.name, 'dest.tar.gz')
+        self.assertIsNone(self.cache.get('https://example/a.tar.gz', dest))
+        self.cache.add(path, sha1, 'https://example/a.tar.gz')
+        self.cache.add(path, sha1, 'https://example/a.tar.gz')
+
+        self.assertEqual(self.cache.get('https://example/a.tar.gz', dest), sha1)
+        self.assertEqual(os.stat(dest).st_ino, os.stat(path).st_ino)
+        os.unlink(dest)
+        self.assertEqual(self.cache.get('https://mirror/a.tar.gz', dest, sha1), sha1)
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'aaaa')
+        self.assertIsNone(self.cache.get('https://mirror/a.tar.gz', dest, '0' * 40))
+
+    def test_evict_least_recently_used(self):
+        """
+        Test the least recently used files are evicted once the cache is full
+        """
+        added = []
+        for idx, name in enumerate(['a', 'b']):
+            path, sha1 = self.make_file(name, name.encode() * 4)
+            self.cache.add(path, sha1, 'https://example/' + name)
+            os.utime(self.cache.object_path(sha1), (idx, idx))
+            added.append(sha1)
+        # a is used after b, so b is the one evicted to make room for c
+        self.assertEqual(self.cache.get('https://example/a', os.path.join(self.tmpd.name, 'dest')), added[0])
+        path, sha1 = self.make_file('c', b'cccc')
+        self.cache.add(path, sha1, 'https://example/c')
+        self.assertIsNotNone(self.cache.lookup('https://example/a'))
+        self.assertIsNone(self.cache.lookup('https://example/b'))
+        self.assertEqual(self.cache.lookup('https://example/c'), sha1)
+
+    def test_add_walks_once(self):
+        """
+        Test the size of the cache is only counted on disk once, and again
+        when files are evicted
+        """
+        with patch('download.os.walk', wraps=os.walk) as walk:
+            for name in ['a', 'b']:
+                path, sha1 = self.make_file(name, name.encode() * 4)
+                self.cache.add(path, sha1, 'https://example/' + name)
+                self.cache.add(path, sha1, 'https://mirror/' + name)
+            self.assertEqual(walk.call_count, 1)
+            self.assertEqual(self.cache.size, 8)
+            path, sha1 = self.make_file('c', b'cccc')
+            self.cache.add(path, sha1)
+            self.assertEqual(walk.call_count, 2)
+            self.assertEqual(self.cache.size, 8)
+
+    def test_url_record_expires(self):
+        """
+        Test an old url record is not trusted, while the file is still found
+        by its sha1
+        """
+        path, sha1 = self.make_file('a.tar.gz', b'aaaa')
+        self.cache.add(path, sha1, 'https://example/a.tar.gz')
+        old = time.time() - download.URL_TTL - 1
+        os.utime(self.cache.url_path('https://example/a.tar.gz'), (old, old))
+        self.assertIsNone(self.cache.lookup('https://example/a.tar.gz'))
+        self.assertEqual(self.cache.lookup('https://example/a.tar.gz', sha1), sha1)
 
 if __name__ == '__main__':
     unittest.main(buffer=True)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+import elf
+
+
+LIBTEST = os.path.join(os.path.dirname(__file__), 'testfiles', 'abireport', 'libtest.so.1')
+
+
+class TestElfFile(unittest.TestCase):
+
+    def test_shared_object(self):
+        """
+        Test reading the header, dynamic section and dynamic symbols of a
+        shared object
+        """
+        with elf.ElfFile(LIBTEST) as obj:
+            self.assertEqual(obj.describe(), 'ELF 64-bit LSB shared object,')
+            self.assertEqual(obj.soname(), 'libtest.so.1')
+            self.assertEqual(obj.needed(), ['libc.so.6'])
+            self.assertEqual(sorted(obj.dynamic_symbols()),
+                             [('TEST_1.0', 'A'),
+                              ('TEST_2.0', 'A'),
+                              ('test_data@@TEST_1.0', 'D'),
+                              ('test_init@@TEST_1.0', 'T'),
+                              ('test_run@@TEST_2.0', 'T'),
+                              ('test_weak@@TEST_2.0', 'W')])
+
+    def test_not_elf(self):
+        """
+        Test files without the ELF magic, and truncated ELF files
+        """
+        with self.assertRaises(elf.NotElfError):
+            elf.ElfFile(__file__)
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'truncated')
+            with open(LIBTEST, 'rb') as src, open(path, 'wb') as dst:
+                dst.write(src.read(32))
+            with self.assertRaises(elf.ElfError):
+                elf.ElfFile(path)
+
+    def test_describe_file(self):
+        """
+        Test only the ELF header is read to describe objects that are not
+        shared objects
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'program')
+            with open(LIBTEST, 'rb') as src, open(path, 'wb') as dst:
+                header = bytearray(src.read(elf.HEADER_SIZE))
+                header[16] = elf.ET_EXEC
+                dst.write(header)
+            self.assertEqual(elf.describe_file(path), 'ELF 64-bit LSB executable,')
+            with self.assertRaises(elf.NotElfError):
+                elf.describe_file(__file__)
+        self.assertEqual(elf.describe_file(LIBTEST), 'ELF 64-bit LSB shared object,')
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
@@ -333,5 +333,127 @@ class TestFiles(unittest.TestCase):
                              set(["%doc /directory", "/file1", "/file2"]))
 
 
+class TestFileClassifier(unittest.TestCase):
+
+    def test_literal_prefix(self):
+        """
+        Test literal_prefix for anchored and unanchored patterns
+        """
+        self.assertEqual(files.literal_prefix(r"^/(usr/|usr.*)lib64/"), "/usr")
+        self.assertEqual(files.literal_prefix(r"^/usr/lib64/gcc/x86_64\-generic"), "/usr/lib64/gcc/x86_64-generic")
+        self.assertEqual(files.literal_prefix(r"/usr/lib64/libdb"), "")
+
+    def test_classify_first_match_wins(self):
+        """
+        Test classify returns the first matching rule, including unanchored
+        rules matching after a later anchored one would
+        """
+        classifier = files.FileClassifier([
+            (r"^/usr/lib64/[a-z]*\.so\.", "lib"),
+            (r"libfoo", "foo"),
+            (r"^/usr/lib64/", "dev", "", "", True),
+            (r"^/usr/bin/", "bin", "/usr/bin/*")])
+        self.assertEqual(classifier.classify("/usr/lib64/libbar.so.1"), (r"^/usr/lib64/[a-z]*\.so\.", "lib", "", "", False))
+        self.assertEqual(classifier.classify("/usr/lib64/libfoo.a")[1], "foo")
+        self.assertEqual(classifier.classify("/usr/lib64/libbar.a")[1:], ("dev", "", "", True))
+        self.assertEqual(classifier.classify("/usr/bin/foo")[2], "/usr/bin/*")
+        self.assertIsNone(classifier.classify("/etc/foo"))
+
+    def test_push_file_classified(self):
+        """
+        Test push_file places files with the compiled rules
+        """
+        conf = config.Config("")
+        conf.config_opts['exclude_locales'] = False
+        fm = FileManager(conf, build.Build(), "", None)
+        fm.push_file('/usr/lib64/libfoo.so.1', 'testpkg')
+        fm.push_file('/usr/include/foo/foo.h', 'testpkg')
+        fm.push_file('/usr/share/doc/testpkg/README', 'testpkg')
+        fm.push_file('/usr/share/clear/optimized-elf/bin/foo', 'testpkg')
+        self.assertEqual(fm.packages['lib'], set(['/usr/lib64/libfoo.so.1']))
+        self.assertEqual(fm.packages['dev'], set(['/usr/include/foo/foo.h']))
+        self.assertEqual(fm.packages['doc'], set(['%doc /usr/share/doc/testpkg/*']))
+        self.assertEqual(fm.packages['bin'], set(['/usr/share/clear/optimized-elf/bin*']))
+
+    def test_push_files(self):
+        """
+        Test push_files places a batch like push_file and counts restarts once
+        per new entry, skipping files already known
+        """
+        conf = config.Config("")
+        conf.config_opts['exclude_locales'] = False
+        pkg = build.Build()
+        fm = FileManager(conf, pkg, "", None)
+        fm.push_file('/usr/bin/foo', 'testpkg')
+        self.assertEqual(pkg.file_restart, 1)
+        fm.files_blacklist.add('/usr/bin/bar')
+        fm.push_files(['/usr/bin/foo', '/usr/bin/bar', '/usr/lib64/libfoo.so.1',
+                       '/usr/include/foo.h', '/usr/include/foo.h'], 'testpkg')
+        self.assertEqual(fm.files, set(['/usr/bin/foo', '/usr/lib64/libfoo.so.1', '/usr/include/foo.h']))
+        self.assertEqual(fm.packages['bin'], set(['/usr/bin/foo']))
+        self.assertEqual(fm.packages['lib'], set(['/usr/lib64/libfoo.so.1']))
+        self.assertEqual(fm.packages['dev'], set(['/usr/include/foo.h']))
+        self.assertEqual(pkg.file_restart, 3)
+        fm.push_files(['/usr/bin/foo'], 'testpkg')
+        self.assertEqual(pkg.file_restart, 3)
+
+    def test_push_file_compat_exclude(self):
+        """
+        Test push_file excludes non-library files in compat packages
+        """
+        conf = config.Config("")
+        conf.config_opts['exclude_locales'] = False
+        conf.config_opts['compat'] = True
+        fm = FileManager(conf, build.Build(), "", None)
+        fm.push_file('/usr/lib64/libfoo.so', 'testpkg')
+        fm.push_file('/usr/lib64/libfoo.so.1', 'testpkg')
+        self.assertEqual(fm.excludes, ['/usr/lib64/libfoo.so'])
+        self.assertEqual(fm.packages['lib'], set(['/usr/lib64/libfoo.so.1']))
+
+
+class TestFileIndex(unittest.TestCase):
+
+    def setUp(self):
+        conf = config.Config("")
+        conf.config_opts['exclude_locales'] = False
+        self.pkg = build.Build()
+        self.fm = FileManager(conf, self.pkg, "", None)
+
+    def test_remove_file_indexed(self):
+        """
+        Test remove_file finds the packages a pushed file was placed in
+        """
+        self.fm.push_file('/usr/bin/foo', 'testpkg')
+        self.fm.push_package_file('/usr/bin/foo', 'extra', True)
+        self.assertEqual(self.fm.file_index['/usr/bin/foo'], {(False, 'bin'): True, (True, 'extra'): True})
+        self.fm.remove_file('/usr/bin/foo')
+        self.assertEqual(self.fm.packages['bin'], set())
+        self.assertEqual(self.fm.subpackages['extra'], set())
+        self.assertNotIn('/usr/bin/foo', self.fm.file_index)
+        self.assertIn('/usr/bin/foo', self.fm.files_blacklist)
+        self.assertEqual(self.pkg.must_restart, 1)
+
+    def test_clean_directories_below_symlink(self):
+        """
+        Test clean_directories with a directory reached through a symlinked
+        parent, which the directory snapshot does not descend into
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, "usr"))
+            os.mkdir(os.path.join(tmpd, "usr", "lib"))
+            os.mkdir(os.path.join(tmpd, "usr", "lib", "directory"))
+            with open(os.path.join(tmpd, "usr", "lib", "file1"), "w") as f:
+                f.write(" ")
+            os.symlink("usr/lib", os.path.join(tmpd, "lib"))
+            self.fm.push_package_file("/lib/directory")
+            self.fm.push_package_file("/lib/file1")
+            self.fm.push_package_file("/usr/lib/directory/")
+            self.fm.push_package_file("/usr/lib/file1")
+            self.assertTrue(self.fm.clean_directories(tmpd))
+        self.assertEqual(self.fm.packages["main"], set(["/lib/file1", "/usr/lib/file1"]))
+        self.assertEqual(self.fm.files_blacklist, set(["/lib/directory", "/usr/lib/directory/"]))
+        self.assertNotIn("/lib/directory", self.fm.file_index)
+
+
 if __name__ == '__main__':
     unittest.main(buffer=True)
@@ -112,6 +112,9 @@ class TestLicense(unittest.TestCase):
             def perform(_):
                 raise pycurl.error('Test Exception')
 
+            def reset(_):
+                pass
+
             def close(_):
                 pass
 
@@ -163,6 +166,9 @@ class TestLicense(unittest.TestCase):
             def perform(_):
                 pass
 
+            def reset(_):
+                pass
+
             def close(_):
                 pass
 
@@ -0,0 +1,173 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import download
+import pypidata
+
+
+KNOWN = set(['requests', 'six', 'foo'])
+
+
+class FakePypi(object):
+    """Answer pypi json API queries for the names in KNOWN."""
+
+    def __init__(self, fail=()):
+        self.queries = []
+        self.threads = set()
+        self.fail = fail
+
+    def fetch(self, url, retries=None):
+        name = url.split('/')[-3]
+        self.queries.append(name)
+        self.threads.add(threading.current_thread().name)
+        if name in self.fail:
+            raise download.DownloadError("Unable to fetch {}".format(url))
+        if name not in KNOWN:
+            raise download.DownloadError("Unable to fetch {}".format(url), 404)
+        return url
+
+
+class TestPypiNameCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpd.cleanup)
+        self.cache_file = os.path.join(self.tmpd.name, 'pypi_names.json')
+        patcher = patch('pypidata.name_cache', pypidata.TTLCache(self.cache_file, 3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_pypi_name_cached(self):
+        """
+        Test found and missing names are both answered from the cache, also
+        by the next run, until they expire
+        """
+        pypi = FakePypi()
+        with patch('pypidata.download.fetch', pypi.fetch):
+            self.assertEqual(pypidata.get_pypi_name('Requests', miss=True), 'requests')
+            self.assertEqual(pypidata.get_pypi_name('python-foo', miss=True), 'foo')
+            self.assertEqual(pypidata.get_pypi_name('nope', miss=True), '')
+            self.assertEqual(pypi.queries, ['requests', 'python_foo', 'foo', 'nope'])
+
+            pypidata.name_cache.save()
+            pypidata.name_cache.entries = None
+            self.assertEqual(pypidata.get_pypi_name('requests', miss=True), 'requests')
+            self.assertEqual(pypidata.get_pypi_name('nope'), 'nope')
+            self.assertEqual(len(pypi.queries), 4)
+
+            with patch('pypidata.time.time', return_value=time.time() + 3600):
+                self.assertEqual(pypidata.get_pypi_name('nope', miss=True), '')
+            self.assertEqual(pypi.queries[4:], ['nope'])
+
+    def test_failure_not_cached(self):
+        """
+        Test a name that could not be looked up is not cached as missing
+        """
+        with patch('pypidata.download.fetch', FakePypi(fail=['six']).fetch):
+            self.assertEqual(pypidata.get_pypi_name('six', miss=True), '')
+        with patch('pypidata.download.fetch', FakePypi().fetch):
+            self.assertEqual(pypidata.get_pypi_name('six', miss=True), 'six')
+
+    def test_prefetch_batch(self):
+        """
+        Test prefetching looks up every uncached name once, concurrently, so
+        that get_pypi_name needs no further queries
+        """
+        pypi = FakePypi()
+        names = ['requests', 'six', 'nope', 'pypi-foo', 'requests']
+        with patch('pypidata.download.fetch', pypi.fetch):
+            pypidata.get_pypi_name('six')
+            pypi.threads.clear()
+            pypidata.prefetch_pypi_names(names)
+            self.assertEqual(sorted(pypi.queries), ['foo', 'nope', 'pypi_foo', 'requests', 'six'])
+            self.assertNotIn(threading.current_thread().name, pypi.threads)
+            results = [pypidata.get_pypi_name(name, miss=True) for name in names]
+        self.assertEqual(results, ['requests', 'six', '', 'foo', 'requests'])
+        self.assertEqual(len(pypi.queries), 5)
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'testfiles', 'pypidata')
+EXPECTED = {'name': 'foo_bar', 'summary': 'Frobnicate the bars', 'requires': ['requests', 'typing_extensions']}
+
+
+class TestPypiMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpd.cleanup)
+        patcher = patch('pypidata.metadata_cache',
+                        pypidata.TTLCache(os.path.join(self.tmpd.name, 'pypi_metadata.json'), 3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pypi(self, url, retries=None):
+        self.queries.append(url)
+        if '/foo_bar/' not in url:
+            raise download.DownloadError("Unable to fetch {}".format(url), 404)
+        with open(os.path.join(FIXTURES, 'pypi.json'), 'rb') as f:
+            return io.BytesIO(f.read())
+
+    def test_sdist_pkg_info(self):
+        """
+        Test metadata is read from the PKG-INFO of the extracted sources,
+        without asking pypi
+        """
+        self.queries = []
+        with patch('pypidata.download.fetch', self.pypi):
+            metadata = pypidata.get_pypi_metadata('foo_bar', os.path.join(FIXTURES, 'sdist'))
+        self.assertEqual(json.loads(metadata), EXPECTED)
+        self.assertEqual(self.queries, [])
+
+    def test_egg_info_requires(self):
+        """
+        Test requirements missing from PKG-INFO are read from the egg-info
+        requires.txt
+        """
+        srcdir = os.path.join(self.tmpd.name, 'foo-bar-1.2.0')
+        os.mkdir(srcdir)
+        os.mkdir(os.path.join(srcdir, 'Foo_Bar.egg-info'))
+        shutil.copy(os.path.join(FIXTURES, 'egginfo', 'PKG-INFO'), srcdir)
+        shutil.copy(os.path.join(FIXTURES, 'egginfo', 'requires.txt'), os.path.join(srcdir, 'Foo_Bar.egg-info'))
+        self.queries = []
+        with patch('pypidata.download.fetch', self.pypi):
+            metadata = pypidata.get_pypi_metadata('foo_bar', srcdir)
+        self.assertEqual(json.loads(metadata), EXPECTED)
+        self.assertEqual(self.queries, [])
+
+    def test_requires_from_pypi(self):
+        """
+        Test requirements the sources do not list at all are taken from the
+        pypi json API
+        """
+        srcdir = os.path.join(self.tmpd.name, 'foo-bar-1.2.0')
+        os.mkdir(srcdir)
+        shutil.copy(os.path.join(FIXTURES, 'egginfo', 'PKG-INFO'), srcdir)
+        self.assertIsNone(pypidata.local_metadata(srcdir)['requires'])
+        self.queries = []
+        with patch('pypidata.download.fetch', self.pypi):
+            self.assertEqual(json.loads(pypidata.get_pypi_metadata('foo_bar', srcdir)), EXPECTED)
+            self.assertEqual(json.loads(pypidata.get_pypi_metadata('nope', srcdir))['requires'], [])
+        self.assertEqual(self.queries, ['https://pypi.org/pypi/foo_bar/json', 'https://pypi.org/pypi/nope/json'])
+
+    def test_json_api(self):
+        """
+        Test the pypi json API is used, and cached, when the sources carry no
+        metadata
+        """
+        self.queries = []
+        with patch('pypidata.download.fetch', self.pypi):
+            self.assertEqual(json.loads(pypidata.get_pypi_metadata('foo_bar', self.tmpd.name)), EXPECTED)
+            self.assertEqual(json.loads(pypidata.get_pypi_metadata('foo_bar')), EXPECTED)
+            self.assertEqual(pypidata.get_pypi_metadata('nope'), '')
+        self.assertEqual(self.queries, ['https://pypi.org/pypi/foo_bar/json', 'https://pypi.org/pypi/nope/json'])
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
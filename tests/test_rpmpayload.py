@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+
+import rpmpayload
+
+
+RPM = os.path.join(os.path.dirname(__file__), 'testfiles', 'abireport', 'libtest-1.0-1.x86_64.rpm')
+LIBTEST = os.path.join(os.path.dirname(__file__), 'testfiles', 'abireport', 'libtest.so.1')
+
+
+class TestRpmPayload(unittest.TestCase):
+
+    def test_read_files(self):
+        """
+        Test the regular files of the payload are read, with every name of a
+        hard linked file, and skipped unless they start with magic
+        """
+        names = [name for name, _ in rpmpayload.read_files(RPM)]
+        self.assertEqual(names, ['/usr/lib64/libtest.so.1', '/usr/libexec/test/libtest.so.1',
+                                 '/usr/share/doc/test/README', '/usr/share/doc/test/NEWS'])
+        with open(LIBTEST, 'rb') as f:
+            lib = f.read()
+        files = list(rpmpayload.read_files(RPM, b'\x7fELF'))
+        self.assertEqual(files, [('/usr/lib64/libtest.so.1', lib),
+                                 ('/usr/libexec/test/libtest.so.1', lib),
+                                 ('/usr/share/doc/test/README', b'\x7fELF is not here\n')])
+
+    def test_read_files_bad(self):
+        """
+        Test files that are not RPMs, and truncated RPMs
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'bad.rpm')
+            with open(RPM, 'rb') as src, open(path, 'wb') as dst:
+                data = src.read()
+                dst.write(data[:-100])
+            with self.assertRaises(rpmpayload.RpmError):
+                list(rpmpayload.read_files(path))
+            with self.assertRaises(rpmpayload.RpmError):
+                list(rpmpayload.read_files(LIBTEST))
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import srctree
+
+
+def touch(path):
+    with open(path, 'w') as f:
+        f.write('')
+
+
+class TestSourceTreeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpd.cleanup)
+        self.root = self.tmpd.name
+        for path in ('pkg-1.0', 'pkg-1.0/src', 'pkg-1.0/src/Sub', 'pkg-1.0/tests', 'other'):
+            os.mkdir(os.path.join(self.root, path))
+        for path in ('pkg-1.0/meson.build', 'pkg-1.0/README', 'pkg-1.0/src/meson.build',
+                     'pkg-1.0/src/main.go', 'pkg-1.0/src/Sub/util.GO', 'pkg-1.0/tests/meson.build',
+                     'other/COPYING'):
+            touch(os.path.join(self.root, path))
+        os.symlink(os.path.join(self.root, 'pkg-1.0', 'src'), os.path.join(self.root, 'pkg-1.0', 'link'))
+        self.pkg = os.path.join(self.root, 'pkg-1.0')
+        self.tree = srctree.SourceTreeIndex(self.root)
+
+    def test_walk_same_as_os_walk(self):
+        """
+        Test walk yields what os.walk does, top-down and bottom-up, from the
+        root and from a directory inside it, with a single walk of the tree
+        """
+        cases = [(top, topdown) for top in (self.root, self.pkg, self.pkg + '/') for topdown in (True, False)]
+        expected = [list(os.walk(top, topdown)) for top, topdown in cases]
+        with patch('srctree.os.walk', wraps=os.walk) as walk:
+            self.assertEqual([list(self.tree.walk(top, topdown)) for top, topdown in cases], expected)
+        self.assertEqual(walk.call_count, 1)
+
+    def test_walk_prune(self):
+        """
+        Test pruning dirnames during a top-down walk skips those directories
+        """
+        dirs = []
+        for dirpath, dirnames, _ in self.tree.walk(self.pkg):
+            dirs.append(dirpath)
+            dirnames[:] = [d for d in dirnames if d != 'src']
+        self.assertEqual(sorted(dirs), [self.pkg, os.path.join(self.pkg, 'tests')])
+        # the index itself is unchanged
+        self.assertEqual(len(list(self.tree.walk(self.pkg))), 4)
+
+    def test_walk_outside(self):
+        """
+        Test a directory outside the tree is walked on disk
+        """
+        tree = srctree.SourceTreeIndex(self.pkg)
+        self.assertEqual(list(tree.walk(self.root)), list(os.walk(self.root)))
+
+    def test_files_named(self):
+        """
+        Test files_named finds files in walk order, below the given directory
+        """
+        expected = [os.path.join(dirpath, 'meson.build') for dirpath, _, files in os.walk(self.pkg)
+                    if 'meson.build' in files]
+        self.assertEqual(self.tree.files_named('meson.build', self.pkg), expected)
+        self.assertEqual(self.tree.files_named('meson.build', os.path.join(self.pkg, 'src')),
+                         [os.path.join(self.pkg, 'src', 'meson.build')])
+        self.assertEqual(self.tree.files_named('copying', lower=True), [os.path.join(self.root, 'other', 'COPYING')])
+        self.assertEqual(self.tree.files_named('copying'), [])
+
+    def test_files_with_suffix(self):
+        """
+        Test files_with_suffix, matching case-sensitively or not
+        """
+        self.assertEqual(self.tree.files_with_suffix('.go'), [os.path.join(self.pkg, 'src', 'main.go')])
+        self.assertEqual(self.tree.files_with_suffix('.go', self.pkg, lower=True),
+                         [os.path.join(self.pkg, 'src', 'main.go'), os.path.join(self.pkg, 'src', 'Sub', 'util.GO')])
+
+    def test_listdir(self):
+        """
+        Test listdir matches os.listdir, before and after the tree is indexed
+        """
+        self.assertEqual(sorted(self.tree.listdir(self.pkg)), sorted(os.listdir(self.pkg)))
+        self.assertIsNone(self.tree.dirs)
+        self.tree.build()
+        with patch('srctree.os.listdir', side_effect=AssertionError):
+            self.assertEqual(sorted(self.tree.listdir(self.pkg)),
+                             ['README', 'link', 'meson.build', 'src', 'tests'])
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
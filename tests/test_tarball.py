@@ -1,11 +1,17 @@
 import copy
 import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
 import unittest
 from unittest.mock import MagicMock, Mock, patch
 import build
 import config
+import download
 import files
 import tarball
+import util
 
 
 # Stores all test cases for dynamic tests.
@@ -100,6 +106,13 @@ class MockSrcFile():
         # deep copy because the content is modified by Source
         cls.content = copy.deepcopy(content)
 
+    def __iter__(self):
+        return iter([tarfile.TarInfo(name) for name in self.content])
+
+    def extractall(self, path=None, members=None):
+        for _ in members or self:
+            pass
+
     def getnames(self):
         return self.content
 
@@ -271,6 +284,255 @@ class TestTarball(unittest.TestCase):
         self.assertEqual(tarball.Source.extract.call_count, 3)
 
 
+class TestExtractCache(unittest.TestCase):
+
+    def test_extract_cached(self):
+        """
+        Test a cached extraction is reused instead of extracting again
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, 'src'))
+            os.mkdir(os.path.join(tmpd, 'src', 'pkg-1.0'))
+            with open(os.path.join(tmpd, 'src', 'pkg-1.0', 'configure'), 'w') as f:
+                f.write('#!/bin/sh\n')
+            path = os.path.join(tmpd, 'pkg-1.0.tar.gz')
+            with tarfile.open(path, 'w:gz') as tar:
+                tar.add(os.path.join(tmpd, 'src', 'pkg-1.0'), arcname='pkg-1.0')
+            cache = os.path.join(tmpd, 'cache')
+
+            src = tarball.Source('https://example/pkg-1.0.tar.gz', '', path, sha1='0123abcd', cache_dir=cache)
+            self.assertEqual(src.prefix, 'pkg-1.0')
+            self.assertEqual(os.listdir(cache), ['0123abcd'])
+            src.extract(os.path.join(tmpd, 'first'))
+
+            with patch('tarball.tarfile.open', Mock(side_effect=AssertionError)):
+                src = tarball.Source('https://example/pkg-1.0.tar.gz', '', path, sha1='0123abcd', cache_dir=cache)
+                self.assertEqual(src.prefix, 'pkg-1.0')
+                src.extract(os.path.join(tmpd, 'second'))
+            with open(os.path.join(tmpd, 'second', 'pkg-1.0', 'configure')) as f:
+                self.assertEqual(f.read(), '#!/bin/sh\n')
+            self.assertEqual(os.listdir(os.path.join(tmpd, 'first')), ['pkg-1.0'])
+
+    def test_extract_without_cache(self):
+        """
+        Test the cache is not used when the archive sha1 is unknown
+        """
+        src = tarball.Source('https://example/pkg-1.0.tar', ':', '/tmp/pkg-1.0.tar', cache_dir='/tmp/cache')
+        self.assertIsNone(src.cache_dir)
+        self.assertIsNone(src.cached_tree())
+
+    def test_extract_single_pass(self):
+        """
+        Test a tar is decompressed once, while its prefix is detected, and the
+        staged tree is merged into the extraction path
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, 'src'))
+            os.mkdir(os.path.join(tmpd, 'src', 'pkg-1.0'))
+            with open(os.path.join(tmpd, 'src', 'pkg-1.0', 'configure'), 'w') as f:
+                f.write('#!/bin/sh\n')
+            path = os.path.join(tmpd, 'pkg-1.0.tar.xz')
+            with tarfile.open(path, 'w:xz') as tar:
+                tar.add(os.path.join(tmpd, 'src', 'pkg-1.0'), arcname='pkg-1.0')
+            base = os.path.join(tmpd, 'base')
+            os.mkdir(base)
+            os.mkdir(os.path.join(base, 'pkg-1.0'))
+            with open(os.path.join(base, 'pkg-1.0', 'extra'), 'w') as f:
+                f.write('archive\n')
+
+            src = tarball.Source('https://example/pkg-1.0.tar.xz', '', path, staging_dir=base)
+            self.assertEqual(src.prefix, 'pkg-1.0')
+            with patch('tarball.tarfile.open', Mock(side_effect=AssertionError)):
+                src.extract(base)
+            self.assertEqual(sorted(os.listdir(base)), ['pkg-1.0'])
+            self.assertEqual(sorted(os.listdir(os.path.join(base, 'pkg-1.0'))), ['configure', 'extra'])
+
+
+class TestParallelDecompress(unittest.TestCase):
+
+    def test_parallel_decompressor(self):
+        """
+        Test the decompressor is picked by magic bytes and availability
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'src.tar.bz2')
+            with open(path, 'wb') as f:
+                f.write(b'BZh91AY&SY')
+            with patch('tarball.shutil.which', lambda binary: binary == 'pbzip2'):
+                self.assertEqual(tarball.parallel_decompressor(path), ['pbzip2', '-dc', path])
+            with patch('tarball.shutil.which', Mock(return_value=None)):
+                self.assertIsNone(tarball.parallel_decompressor(path))
+            with open(path, 'wb') as f:
+                f.write(b'ustar')
+            with patch('tarball.shutil.which', Mock(return_value='/usr/bin/true')):
+                self.assertIsNone(tarball.parallel_decompressor(path))
+
+    @unittest.skipUnless(shutil.which('xz'), "xz is not installed")
+    def test_stream_tar_parallel(self):
+        """
+        Test a tar.xz is extracted through the xz pipe
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, 'pkg-1.0'))
+            with open(os.path.join(tmpd, 'pkg-1.0', 'configure'), 'w') as f:
+                f.write('#!/bin/sh\n')
+            path = os.path.join(tmpd, 'pkg-1.0.tar.xz')
+            with tarfile.open(path, 'w:xz') as tar:
+                tar.add(os.path.join(tmpd, 'pkg-1.0'), arcname='pkg-1.0')
+            popen = Mock(wraps=subprocess.Popen)
+            with patch('tarball.subprocess.Popen', popen):
+                src = tarball.Source('https://example/pkg-1.0.tar.xz', '', path, staging_dir=tmpd)
+            self.assertEqual(popen.call_args[0][0], ['xz', '-dc', '-T0', path])
+            self.assertEqual(src.prefix, 'pkg-1.0')
+            src.extract(os.path.join(tmpd, 'base'))
+            with open(os.path.join(tmpd, 'base', 'pkg-1.0', 'configure')) as f:
+                self.assertEqual(f.read(), '#!/bin/sh\n')
+
+
+def make_tar(tmpd, name, files):
+    """Create tmpd/<name>.tar.gz holding files, a dict of path: content."""
+    src = os.path.join(tmpd, 'src-' + name)
+    for path, data in files.items():
+        dirname = src
+        for part in [''] + os.path.dirname(path).split('/'):
+            dirname = os.path.join(dirname, part)
+            if not os.path.isdir(dirname):
+                os.mkdir(dirname)
+        with open(os.path.join(src, path), 'w') as f:
+            f.write(data)
+    tar_path = os.path.join(tmpd, name + '.tar.gz')
+    with tarfile.open(tar_path, 'w:gz') as tar:
+        for entry in sorted(os.listdir(src)):
+            tar.add(os.path.join(src, entry), arcname=entry)
+    return tar_path
+
+
+def read_tree(path):
+    """Return a dict of relative path: content for every file below path."""
+    tree = {}
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename)) as f:
+                tree[os.path.relpath(os.path.join(dirpath, filename), path)] = f.read()
+    return tree
+
+
+class TestConcurrentExtract(unittest.TestCase):
+
+    def test_create_sources_same_as_serial(self):
+        """
+        Test sources staged in a process pool extract to the same tree as a
+        serial extraction, including overlapping archives
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            archives = [
+                make_tar(tmpd, 'main-1.0', {'main-1.0/configure': 'main\n'}),
+                make_tar(tmpd, 'dep-2.0', {'dep-2.0/a.c': 'dep\n', 'dep-2.0/b.c': 'old\n'}),
+                make_tar(tmpd, 'overlay', {'dep-2.0/b.c': 'new\n'}),
+                make_tar(tmpd, 'loose', {'file.c': 'loose\n', 'sub/file.h': 'loose\n'}),
+            ]
+            serial = os.path.join(tmpd, 'serial')
+            os.mkdir(serial)
+            for path in archives:
+                src = tarball.Source('https://example/' + os.path.basename(path), '', path, staging_dir=tmpd)
+                if not os.path.isdir(src.extraction_path(serial)):
+                    os.mkdir(src.extraction_path(serial))
+                with tarfile.open(path) as tar:
+                    tar.extractall(path=src.extraction_path(serial))
+                shutil.rmtree(src.staged)
+
+            parallel = os.path.join(tmpd, 'parallel')
+            os.mkdir(parallel)
+            src_args = [('https://example/' + os.path.basename(path), '', path, None, None, None, parallel)
+                        for path in archives]
+            sources = tarball.create_sources(src_args)
+            self.assertEqual([src.path for src in sources], archives)
+            self.assertEqual([src.prefix for src in sources], ['main-1.0', 'dep-2.0', 'dep-2.0', ''])
+            conflicts = tarball.find_conflicts(sources, parallel)
+            self.assertEqual([(a.path, b.path) for a, b in conflicts], [(archives[1], archives[2])])
+            for src in sources:
+                src.extract(parallel)
+
+            self.assertEqual(read_tree(parallel), read_tree(serial))
+            self.assertEqual(read_tree(parallel)['dep-2.0/b.c'], 'new\n')
+
+
+class TestParallelDownload(unittest.TestCase):
+
+    def test_check_or_get_files(self):
+        """
+        Test batch downloads fetch only missing archives, once each, and write
+        the upstream entries in archive order
+        """
+        def fake_download(downloads, is_fatal=False, max_parallel=None, retries=None):
+            for url, dest, digest in downloads:
+                with open(dest, 'w') as f:
+                    f.write(url)
+                digest.update(url.encode())
+            return [job[1] for job in downloads]
+
+        with tempfile.TemporaryDirectory() as tmpd:
+            conf = config.Config(tmpd)
+            with open(os.path.join(tmpd, 'present.zip'), 'w') as f:
+                f.write('local')
+            content = tarball.Content("", "testpkg", "", [], conf, tmpd, "", False, "", [], False, False)
+            urls = ['https://example/a.info', 'https://example/present.zip',
+                    'https://example/b.mod', 'https://example/a.info']
+            with patch('tarball.download.do_curl_many', side_effect=fake_download) as test_download:
+                paths = content.check_or_get_files(urls)
+            test_download.assert_called_once()
+            self.assertEqual([job[:2] for job in test_download.call_args[0][0]],
+                             [('https://example/a.info', tmpd + '/a.info'),
+                              ('https://example/b.mod', tmpd + '/b.mod')])
+            self.assertEqual(paths, [tmpd + '/' + os.path.basename(url) for url in urls])
+            with open(os.path.join(tmpd, 'upstream')) as f:
+                upstream = f.read().splitlines()
+            self.assertEqual([os.path.basename(line) for line in upstream],
+                             ['a.info', 'present.zip', 'b.mod', 'a.info'])
+            for line, path in zip(upstream, paths):
+                self.assertEqual(line.split('/')[0], util.get_sha1sum(path))
+
+    def test_download_cache(self):
+        """
+        Test a second package gets its archives from the download cache, by
+        url or by the sha1 its upstream file lists, without downloading them
+        """
+        def fake_download(downloads, is_fatal=False, max_parallel=None, retries=None):
+            for url, dest, digest in downloads:
+                with open(dest, 'w') as f:
+                    f.write(url)
+                digest.update(url.encode())
+            return [job[1] for job in downloads]
+
+        with tempfile.TemporaryDirectory() as tmpd:
+            for name in ('cache', 'first', 'second'):
+                os.mkdir(os.path.join(tmpd, name))
+            cache = download.DownloadCache(os.path.join(tmpd, 'cache'))
+            urls = ['https://example/a.tar.gz', 'https://example/b.tar.gz']
+
+            first = tarball.Content("", "first", "", [], config.Config(os.path.join(tmpd, 'first')),
+                                    tmpd, "", False, "", [], False, False)
+            first.download_cache = cache
+            with patch('tarball.download.do_curl_many', side_effect=fake_download):
+                first.check_or_get_files(urls)
+
+            second_dir = os.path.join(tmpd, 'second')
+            with open(os.path.join(second_dir, 'upstream'), 'w') as f:
+                f.write(first.sha1sums[os.path.join(tmpd, 'first', 'b.tar.gz')] + '/b.tar.gz\n')
+            second = tarball.Content("", "second", "", [], config.Config(second_dir),
+                                     tmpd, "", False, "", [], False, False)
+            second.download_cache = cache
+            with patch('tarball.download.do_curl_many', side_effect=fake_download) as test_download:
+                paths = second.check_or_get_files(['https://example/a.tar.gz', 'https://mirror/b.tar.gz'])
+            self.assertEqual(test_download.call_args[0][0], [])
+            for path, url in zip(paths, urls):
+                with open(path) as f:
+                    self.assertEqual(f.read(), url)
+            with open(os.path.join(second_dir, 'upstream')) as f:
+                self.assertEqual([line.split('/')[0] for line in f.read().splitlines()[-2:]],
+                                 [second.sha1sums[path] for path in paths])
+
+
 # Create dynamic tests based on config file
 create_dynamic_tests()
 
@@ -1,3 +1,4 @@
+import hashlib
 import subprocess
 import os
 import tempfile
@@ -64,5 +65,68 @@ class TestUtil(unittest.TestCase):
             self.assertTrue(util.binary_in_path('testbin'))
             self.assertEqual(util.os_paths, [tmpd])
 
+    def test_iter_lines(self):
+        """
+        Test iter_lines yields the file line by line, keeping line endings
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, 'build.log')
+            with open(path, 'w') as f:
+                f.write('line 1\nline 2\n\nline 4')
+            lines = util.iter_lines(path)
+            self.assertEqual(next(lines), 'line 1\n')
+            self.assertEqual(list(lines), ['line 2\n', '\n', 'line 4'])
+
+    def test_scandirs(self):
+        """
+        Test scandirs lists real directories only, without following symlinks
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.mkdir(os.path.join(tmpd, 'usr'))
+            os.mkdir(os.path.join(tmpd, 'usr', 'lib'))
+            os.mkdir(os.path.join(tmpd, 'usr', 'lib', 'foo'))
+            open(os.path.join(tmpd, 'usr', 'lib', 'file'), 'w').close()
+            os.symlink('usr/lib', os.path.join(tmpd, 'lib'))
+            self.assertEqual(util.scandirs(tmpd + '/'), set(['/usr', '/usr/lib', '/usr/lib/foo']))
+            self.assertEqual(util.scandirs(os.path.join(tmpd, 'missing')), set())
+
+    def test_file_digest_memo(self):
+        """
+        Test file_digest hashes in blocks, reuses the remembered digest of an
+        unchanged file across runs and hashes a changed file again
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            memo = os.path.join(tmpd, 'digests.json')
+            path = os.path.join(tmpd, 'file.tar')
+            data = os.urandom(3 * 1024 + 5)
+            with open(path, 'wb') as f:
+                f.write(data)
+            with unittest.mock.patch('util.DIGEST_MEMO', memo), \
+                    unittest.mock.patch('util.HASH_BLOCK_SIZE', 1024), \
+                    unittest.mock.patch('util._digest_memo', None):
+                self.assertEqual(util.file_digest(path), hashlib.sha1(data).hexdigest())
+                self.assertEqual(util.file_digest(path, 'sha256'), hashlib.sha256(data).hexdigest())
+                util.save_digest_memo()
+
+                # same size, mtime and inode: the remembered digest is used,
+                # by a run that keeps the memo
+                st = os.stat(path)
+                with open(path, 'r+b') as f:
+                    f.write(b'x')
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                util._digest_memo = None
+                self.assertEqual(util.file_digest(path), hashlib.sha1(b'x' + data[1:]).hexdigest())
+                util._digest_memo = None
+                with unittest.mock.patch('util.atexit.register') as register:
+                    util.keep_digest_memo()
+                register.assert_called_once_with(util.save_digest_memo)
+                self.assertEqual(util.file_digest(path), hashlib.sha1(data).hexdigest())
+                # get_sha1sum always reads the file, and remembers nothing
+                self.assertEqual(util.get_sha1sum(path), hashlib.sha1(b'x' + data[1:]).hexdigest())
+                self.assertEqual(len(util._digest_memo), 2)
+
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+                self.assertEqual(util.file_digest(path), hashlib.sha1(b'x' + data[1:]).hexdigest())
+
 if __name__ == '__main__':
     unittest.main(buffer=True)